@@ -1,39 +1,34 @@
-import google.generativeai as genai
 import json
-import os
-from django.conf import settings
-from dotenv import load_dotenv
+import re
+import time
+from collections import Counter
 
-# Load environment variables from .env file
-load_dotenv()
+from llm import get_client
+from llm.accounting import tagged
+from llm.fanout import fan_out
+from llm.summarize import condense, condense_async
+from textproc import (DIGIT_RE, KEY_TERM_STOP_WORDS, TECHNICAL_STOP_RE, TECHNICAL_STOP_WORDS, script_counts,
+                      token_stream)
 
-# Initialize Google AI (Gemini) client
-try:
-    # Get API key from environment variables
-    api_key = os.getenv('GOOGLE_AI_API_KEY')
-    
-    if not api_key:
-        # Fallback to Django settings
-        try:
-            api_key = getattr(settings, 'GOOGLE_AI_API_KEY', None)
-        except:
-            pass
-    
-    if not api_key or api_key == 'your-google-ai-key':
-        print("WARNING: Google AI API key not configured properly")
-        print("Please set GOOGLE_AI_API_KEY in your .env file")
-        print("Current .env file should contain: GOOGLE_AI_API_KEY=your_actual_api_key")
-        client = None
-    else:
-        print(f"Initializing Google AI with API key: {api_key[:10]}...")
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        client = model
-        print("Google AI client initialized successfully")
-except Exception as e:
-    print(f"Google AI client initialization error: {e}")
-    print("Make sure you have installed: pip install python-dotenv google-generativeai")
-    client = None
+KEY_TERM_WORDS = frozenset(['programming', 'algorithm', 'function', 'variable', 'loop', 'condition', 'statement'])
+
+# Topic indicators: chapter/unit/section titles and the like
+TOPIC_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in (
+    r'chapter \d+[:\-]?\s*([^\n]+)',
+    r'unit \d+[:\-]?\s*([^\n]+)',
+    r'section \d+[:\-]?\s*([^\n]+)',
+    r'topic[:\-]?\s*([^\n]+)',
+    r'introduction to ([^\n]+)',
+    r'overview of ([^\n]+)',
+)]
+
+# Shared Gemini client (configured lazily, on the first call)
+client = get_client()
+
+def get_analysis(text):
+    """Key terms, topics, type and language of a text, computed once (documents/analysis.py)"""
+    from documents.analysis import get_analysis as stored_analysis
+    return stored_analysis(text)
 
 def detect_language(text):
     """Detect the primary language of the text"""
@@ -41,8 +36,7 @@ def detect_language(text):
         return 'en'
     
     # Check for Devanagari script (Hindi/Marathi)
-    devanagari_chars = sum(1 for char in text if '\u0900' <= char <= '\u097F')
-    total_chars = len([char for char in text if char.isalpha()])
+    devanagari_chars, total_chars = script_counts(text)
     
     if total_chars > 0 and (devanagari_chars / total_chars) > 0.3:
         # Check for Marathi-specific words
@@ -85,59 +79,27 @@ def extract_technical_keywords(text, top_n=5):
     if not text:
         return []
     
-    import re
-    from collections import Counter
-    
-    # Clean text but preserve technical terms
-    text = re.sub(r'[^a-zA-Z0-9\s\-]', ' ', text)
-    
-    # Enhanced stop words (more comprehensive)
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did',
-        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
-        'document', 'summary', 'content', 'material', 'information', 'text', 'study', 'learning',
-        'chapter', 'section', 'page', 'book', 'pdf', 'file', 'contains', 'includes', 'covers',
-        'discusses', 'explains', 'describes', 'shows', 'presents', 'provides', 'important',
-        'key', 'main', 'basic', 'essential', 'fundamental', 'concept', 'concepts', 'topic', 'topics'
-    }
-    
-    # Extract multi-word technical terms (e.g., "pin diagram", "8085 microprocessor")
-    phrases = []
-    words = text.split()
+    # Technical terms are ASCII words (e.g. "8085", "VCC", "pin-diagram")
+    stream = token_stream(text)
+    words = stream.ascii_words
+    lower = stream.lower if words is stream.words else [word.lower() for word in words]
     
-    # Look for technical phrases (2-3 words)
-    for i in range(len(words) - 1):
-        if len(words[i]) > 2 and len(words[i+1]) > 2:
-            phrase = f"{words[i].lower()} {words[i+1].lower()}"
-            if not any(stop in phrase for stop in stop_words):
-                phrases.append(phrase)
+    # Extract multi-word technical terms (e.g., "pin diagram", "8085 microprocessor"): two words longer
+    # than 2 characters, neither containing a stop word
+    phrase_words = {word for word in set(lower) if len(word) > 2 and not TECHNICAL_STOP_RE.search(word)}
+    phrase_counts = Counter(f"{first} {second}" for first, second in zip(lower, lower[1:])
+                            if first in phrase_words and second in phrase_words)
     
     # Extract single technical words
-    single_words = []
-    for word in words:
-        word_clean = word.lower().strip()
-        if (len(word_clean) > 3 and 
-            word_clean not in stop_words and 
-            word_clean.isalnum() and
-            not word_clean.isdigit()):
-            single_words.append(word_clean)
-    
-    # Prioritize technical terms (numbers, technical words)
-    priority_keywords = []
-    for word in words:
-        word_clean = word.strip()
-        # Technical numbers/codes (e.g., 8085, VCC, VSS)
-        if (len(word_clean) >= 2 and 
-            (word_clean.isdigit() or 
-             any(char.isdigit() for char in word_clean) or
-             word_clean.isupper())):
-            priority_keywords.append(word_clean.lower())
-    
-    # Count frequencies
-    phrase_counts = Counter(phrases)
-    word_counts = Counter(single_words)
-    priority_counts = Counter(priority_keywords)
+    word_counts = Counter({word: count for word, count in Counter(lower).items()
+                           if len(word) > 3 and word not in TECHNICAL_STOP_WORDS
+                           and word.isalnum() and not word.isdigit()})
+    
+    # Prioritize technical terms: numbers and codes (e.g., 8085, VCC, VSS)
+    priority_counts = Counter()
+    for word, count in Counter(words).items():
+        if len(word) >= 2 and (word.isupper() or DIGIT_RE.search(word)):
+            priority_counts[word.lower()] += count
     
     # Combine results with priority
     final_keywords = []
@@ -168,10 +130,13 @@ def generate_summary_with_ai(text, length="medium"):
         return "Insufficient text content for summary generation."
     
     try:
-        # Extract key information from document first
-        key_terms = extract_key_terms_from_text(text)
-        main_topics = extract_main_topics(text)
-        document_type = detect_document_type(text)
+        # Key information about the document (computed once per text, see documents/analysis.py)
+        analysis = get_analysis(text)
+        key_terms = analysis.key_terms
+        main_topics = analysis.main_topics
+        document_type = analysis.document_type
+        # Long documents are map-reduced into notes so the summary covers every page
+        content = condense(text)
         
         prompt = f"""
         Create a comprehensive, well-structured summary of this document following these EXACT formatting requirements:
@@ -197,7 +162,7 @@ def generate_summary_with_ai(text, length="medium"):
         - Be precise about what the document teaches
         
         DOCUMENT CONTENT:
-        {text[:5000]}
+        {content}
         
         Generate a summary that clearly shows what specific knowledge this document contains.
         """
@@ -219,9 +184,7 @@ def generate_summary_with_ai(text, length="medium"):
             
     except Exception as e:
         print(f"AI summary error: {e}")
-        key_terms = extract_key_terms_from_text(text)
-        main_topics = extract_main_topics(text)
-        return generate_enhanced_fallback_summary(text, key_terms, main_topics)
+        return generate_enhanced_fallback_summary(text)
 
 def format_structured_summary(summary_text):
     """Format summary with proper structure and bullet points"""
@@ -272,24 +235,17 @@ def is_summary_well_formatted(summary, key_terms):
     
     return has_bullets and has_key_terms and has_good_length
 
-def generate_summary_with_language(text, language, length="medium"):
-    """Generate brief, comprehensive summary in specific language"""
-    if not client:
-        return f"Summary of the document content in {language}. The document contains educational material that can be studied and reviewed."
-    
-    try:
-        language_names = {
-            'en': 'English',
-            'hi': 'Hindi',
-            'mr': 'Marathi', 
-            'es': 'Spanish',
-            'fr': 'French',
-            'de': 'German'
-        }
-        
-        lang_name = language_names.get(language, 'English')
-        
-        prompt = f"""
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'hi': 'Hindi',
+    'mr': 'Marathi', 
+    'es': 'Spanish',
+    'fr': 'French',
+    'de': 'German'
+}
+
+def language_summary_prompt(content, lang_name):
+    return f"""
         Create a comprehensive summary in {lang_name} based on the document content below.
         
         REQUIREMENTS:
@@ -300,44 +256,46 @@ def generate_summary_with_language(text, language, length="medium"):
         - Make it educational and informative
         
         DOCUMENT CONTENT:
-        {text[:3000]}
+        {content}
         
         Write the summary in {lang_name}:
         """
-        
-        response = client.generate_content(prompt)
+
+def generate_summary_with_language(text, language, length="medium"):
+    """Generate brief, comprehensive summary in specific language"""
+    if not client:
+        return f"Summary of the document content in {language}. The document contains educational material that can be studied and reviewed."
+    
+    lang_name = LANGUAGE_NAMES.get(language, 'English')
+    try:
+        content = condense(text)  # Chunk notes are shared with the other languages' summaries
+        with tagged(language=language):
+            response = client.generate_content(language_summary_prompt(content, lang_name))
         result = response.text.strip()
         return result if result else f"Summary generated in {lang_name}"
     except Exception as e:
-        return f"Summary of the document content in {language_names.get(language, 'English')}. The document contains educational material."
+        return f"Summary of the document content in {lang_name}. The document contains educational material."
 
-
-
-def generate_quiz_with_language(text, language='en', difficulty='medium'):
-    """Generate quiz questions in specific language"""
+async def generate_summary_with_language_async(text, language, length="medium"):
+    """generate_summary_with_language for async views"""
     if not client:
-        return [{
-            "stem": f"What is the main topic of this document?",
-            "options": {"A": "Educational content", "B": "Random text", "C": "News article", "D": "Fiction"},
-            "answer_key": "A",
-            "explanation": "This document contains educational material",
-            "difficulty": difficulty,
-            "language": language
-        }]
-    
-    language_names = {
-        'en': 'English',
-        'hi': 'Hindi', 
-        'mr': 'Marathi',
-        'es': 'Spanish',
-        'fr': 'French',
-        'de': 'German'
-    }
-    
-    lang_name = language_names.get(language, 'English')
+        return f"Summary of the document content in {language}. The document contains educational material that can be studied and reviewed."
     
+    lang_name = LANGUAGE_NAMES.get(language, 'English')
     try:
-        prompt = f"""
+        content = await condense_async(text)
+        with tagged(language=language):
+            response = await client.generate_content_async(language_summary_prompt(content, lang_name))
+        result = response.text.strip()
+        return result if result else f"Summary generated in {lang_name}"
+    except Exception as e:
+        return f"Summary of the document content in {lang_name}. The document contains educational material."
+
+
+
+def language_quiz_prompt(text, language, difficulty):
+    lang_name = LANGUAGE_NAMES.get(language, 'English')
+    return f"""
         Create 5 quiz questions in {lang_name} based on the document content.
         
         REQUIREMENTS:
@@ -362,38 +320,73 @@ def generate_quiz_with_language(text, language='en', difficulty='medium'):
             }}
         ]
         """
-        
-        response = client.generate_content(prompt)
-        content = response.text.strip()
-        
-        # Try to extract JSON
-        start = content.find('[')
-        end = content.rfind(']') + 1
-        if start != -1 and end != 0:
-            json_str = content[start:end]
-            result = json.loads(json_str)
-            return result[:5]  # Return up to 5 questions
-        else:
-            # Fallback if JSON parsing fails
-            return [{
-                "stem": f"What is discussed in this document?",
-                "options": {"A": "Educational content", "B": "Random information", "C": "News", "D": "Fiction"},
-                "answer_key": "A", 
-                "explanation": "The document contains educational material",
-                "difficulty": difficulty,
-                "language": language
-            }]
-            
-    except Exception as e:
-        print(f"Quiz generation error: {e}")
+
+def parse_language_quiz(content, language, difficulty):
+    """Up to 5 questions from the reply's JSON array, or a placeholder question"""
+    content = content.strip()
+    
+    # Try to extract JSON
+    start = content.find('[')
+    end = content.rfind(']') + 1
+    if start != -1 and end != 0:
+        json_str = content[start:end]
+        result = json.loads(json_str)
+        return result[:5]  # Return up to 5 questions
+    else:
+        # Fallback if JSON parsing fails
         return [{
-            "stem": f"What type of content is this?",
-            "options": {"A": "Study material", "B": "Entertainment", "C": "News", "D": "Fiction"},
+            "stem": f"What is discussed in this document?",
+            "options": {"A": "Educational content", "B": "Random information", "C": "News", "D": "Fiction"},
+            "answer_key": "A", 
+            "explanation": "The document contains educational material",
+            "difficulty": difficulty,
+            "language": language
+        }]
+
+def fallback_language_quiz(language, difficulty, available=True):
+    if not available:
+        return [{
+            "stem": f"What is the main topic of this document?",
+            "options": {"A": "Educational content", "B": "Random text", "C": "News article", "D": "Fiction"},
             "answer_key": "A",
-            "explanation": "This is educational study material",
+            "explanation": "This document contains educational material",
             "difficulty": difficulty,
             "language": language
         }]
+    return [{
+        "stem": f"What type of content is this?",
+        "options": {"A": "Study material", "B": "Entertainment", "C": "News", "D": "Fiction"},
+        "answer_key": "A",
+        "explanation": "This is educational study material",
+        "difficulty": difficulty,
+        "language": language
+    }]
+
+def generate_quiz_with_language(text, language='en', difficulty='medium'):
+    """Generate quiz questions in specific language"""
+    if not client:
+        return fallback_language_quiz(language, difficulty, available=False)
+    
+    try:
+        with tagged(language=language):
+            response = client.generate_content(language_quiz_prompt(text, language, difficulty))
+        return parse_language_quiz(response.text, language, difficulty)
+    except Exception as e:
+        print(f"Quiz generation error: {e}")
+        return fallback_language_quiz(language, difficulty)
+
+async def generate_quiz_with_language_async(text, language='en', difficulty='medium'):
+    """generate_quiz_with_language for async views"""
+    if not client:
+        return fallback_language_quiz(language, difficulty, available=False)
+    
+    try:
+        with tagged(language=language):
+            response = await client.generate_content_async(language_quiz_prompt(text, language, difficulty))
+        return parse_language_quiz(response.text, language, difficulty)
+    except Exception as e:
+        print(f"Quiz generation error: {e}")
+        return fallback_language_quiz(language, difficulty)
 
 def generate_quiz_with_ai(text, difficulty='medium'):
     """Generate dynamic quiz questions from document content with distinct difficulty levels"""
@@ -402,9 +395,10 @@ def generate_quiz_with_ai(text, difficulty='medium'):
         return generate_fallback_quiz(text, difficulty)
     
     # Extract key information from document
-    key_terms = extract_key_terms_from_text(text)
-    main_topics = extract_main_topics(text)
-    doc_type = detect_document_type(text)
+    analysis = get_analysis(text)
+    key_terms = analysis.key_terms
+    main_topics = analysis.main_topics
+    doc_type = analysis.document_type
     
     # Enhanced difficulty-specific instructions
     difficulty_specs = {
@@ -512,7 +506,7 @@ def generate_dynamic_fallback_quiz(text, difficulty, key_terms, main_topics):
     
     # Extract content-specific information
     sentences = [s.strip() for s in text.replace('\n', ' ').split('.') if len(s.strip()) > 20]
-    doc_type = detect_document_type(text)
+    doc_type = get_analysis(text).document_type
     
     # Generate questions based on difficulty and actual content
     if difficulty == 'easy':
@@ -802,24 +796,9 @@ def validate_quiz_difficulty(questions, difficulty, key_terms):
     
     return validated_questions[:10]
 
-def generate_flashcards_with_language(text, language='en'):
-    """Generate flashcards in specific language"""
-    if not client:
-        return [{"front": "Key concept", "back": "Important information from document", "language": language}]
-    
-    language_names = {
-        'en': 'English',
-        'hi': 'Hindi',
-        'mr': 'Marathi', 
-        'es': 'Spanish',
-        'fr': 'French',
-        'de': 'German'
-    }
-    
-    lang_name = language_names.get(language, 'English')
-    
-    try:
-        prompt = f"""
+def language_flashcards_prompt(text, language):
+    lang_name = LANGUAGE_NAMES.get(language, 'English')
+    return f"""
         Create 5 flashcards in {lang_name} based on the document content.
         
         REQUIREMENTS:
@@ -840,33 +819,59 @@ def generate_flashcards_with_language(text, language='en'):
             }}
         ]
         """
-        
-        response = client.generate_content(prompt)
-        content = response.text.strip()
-        
-        # Try to extract JSON
-        start = content.find('[')
-        end = content.rfind(']') + 1
-        if start != -1 and end != 0:
-            json_str = content[start:end]
-            result = json.loads(json_str)
-            return result[:5]  # Return up to 5 flashcards
-        else:
-            # Fallback
-            return [{
-                "front": "Main topic",
-                "back": "Key educational content from document",
-                "language": language
-            }]
-            
-    except Exception as e:
-        print(f"Flashcard generation error: {e}")
+
+def parse_language_flashcards(content, language):
+    """Up to 5 flashcards from the reply's JSON array, or a placeholder card"""
+    content = content.strip()
+    
+    # Try to extract JSON
+    start = content.find('[')
+    end = content.rfind(']') + 1
+    if start != -1 and end != 0:
+        json_str = content[start:end]
+        result = json.loads(json_str)
+        return result[:5]  # Return up to 5 flashcards
+    else:
+        # Fallback
         return [{
-            "front": "Document content",
-            "back": "Educational material for study",
+            "front": "Main topic",
+            "back": "Key educational content from document",
             "language": language
         }]
 
+def fallback_language_flashcards(language):
+    return [{
+        "front": "Document content",
+        "back": "Educational material for study",
+        "language": language
+    }]
+
+def generate_flashcards_with_language(text, language='en'):
+    """Generate flashcards in specific language"""
+    if not client:
+        return [{"front": "Key concept", "back": "Important information from document", "language": language}]
+    
+    try:
+        with tagged(language=language):
+            response = client.generate_content(language_flashcards_prompt(text, language))
+        return parse_language_flashcards(response.text, language)
+    except Exception as e:
+        print(f"Flashcard generation error: {e}")
+        return fallback_language_flashcards(language)
+
+async def generate_flashcards_with_language_async(text, language='en'):
+    """generate_flashcards_with_language for async views"""
+    if not client:
+        return [{"front": "Key concept", "back": "Important information from document", "language": language}]
+    
+    try:
+        with tagged(language=language):
+            response = await client.generate_content_async(language_flashcards_prompt(text, language))
+        return parse_language_flashcards(response.text, language)
+    except Exception as e:
+        print(f"Flashcard generation error: {e}")
+        return fallback_language_flashcards(language)
+
 def generate_flashcards_with_ai(text):
     """Generate concise, precise flashcards for revision"""
     if not client:
@@ -917,34 +922,25 @@ def generate_flashcards_with_ai(text):
         return generate_fallback_flashcards(text)
 
 def translate_content(text, target_language):
-    """Translate content to target language"""
+    """Translate content to target language, reusing stored sentence translations (documents/translation.py)"""
     if not client or not text:
         return text
     
     try:
-        language_names = {
-            'hi': 'Hindi',
-            'mr': 'Marathi',
-            'es': 'Spanish', 
-            'fr': 'French',
-            'de': 'German',
-            'en': 'English'
-        }
-        
-        lang_name = language_names.get(target_language, 'English')
-        
-        prompt = f"""
-        Translate the following text to {lang_name}. Keep the meaning and educational content intact.
-        
-        Original text:
-        {text[:2000]}
-        
-        Translate to {lang_name}:
-        """
-        
-        response = client.generate_content(prompt)
-        result = response.text.strip()
-        return result if result else text
+        from documents.translation import translate_text
+        return translate_text(text, target_language)
+    except Exception as e:
+        print(f"Translation error: {e}")
+        return text
+
+async def translate_content_async(text, target_language):
+    """translate_content for async views"""
+    if not client or not text:
+        return text
+    
+    try:
+        from documents.translation import translate_text_async
+        return await translate_text_async(text, target_language)
     except Exception as e:
         print(f"Translation error: {e}")
         return text
@@ -958,7 +954,7 @@ def generate_fallback_flashcards(text):
             {"front": "Key principle", "back": "Fundamental rule or concept."}
         ]
     
-    detected_lang = detect_language(text)
+    detected_lang = get_analysis(text).language
     flashcards = []
     
     # Extract concepts from document content
@@ -1032,99 +1028,59 @@ def generate_fallback_flashcards(text):
     return flashcards[:12]  # Return up to 12 flashcards
 
 def generate_multilingual_content(document, target_languages):
-    """Generate content in multiple languages after upload"""
-    results = {}
-    
-    for lang_code in target_languages:
-        try:
-            # Generate summary in target language
-            summary = generate_summary_with_language(document.extracted_text, lang_code)
-            document.set_summary_translation(lang_code, summary)
-            
-            # Generate quiz in target language
-            quiz_data = generate_quiz_with_language(document.extracted_text, lang_code)
-            
-            # Generate flashcards in target language
-            flashcard_data = generate_flashcards_with_language(document.extracted_text, lang_code)
-            
-            results[lang_code] = {
-                'summary': summary,
-                'quiz': quiz_data,
-                'flashcards': flashcard_data,
-                'status': 'success'
-            }
-            
-        except Exception as e:
-            results[lang_code] = {
-                'status': 'error',
-                'error': str(e)
-            }
+    """Generate summary, quiz and flashcards in every target language concurrently
     
-    return results
+    Each result is saved on the document as soon as it arrives, so a slow or
+    failed call doesn't hold back (or lose) the others.
+    """
+    generators = {
+        'summary': generate_summary_with_language,
+        'quiz': generate_quiz_with_language,
+        'flashcards': generate_flashcards_with_language,
+    }
+    text = document.extracted_text
+    # Condense a long document once here rather than once per language
+    summary_source = condense(text)
+    
+    def generate(task):
+        lang_code, kind = task
+        return generators[kind](summary_source if kind == 'summary' else text, lang_code)
+    
+    started = time.perf_counter()
+    results = {lang_code: {'status': 'success'} for lang_code in target_languages}
+    tasks = [(lang_code, kind) for lang_code in target_languages for kind in generators]
+    for (lang_code, kind), content, error in fan_out(generate, tasks):
+        if error:
+            print(f"[ERROR] {kind} in {lang_code} failed: {error}")
+            results[lang_code].update({kind: None, 'status': 'error', 'error': str(error)})
+            continue
+        document.set_language_content(kind, lang_code, content)
+        results[lang_code][kind] = content
+        print(f"[SUCCESS] {kind} in {lang_code} saved after {time.perf_counter() - started:.1f}s")
     
-
-
-
-
-
-
+    return results
 
 def extract_key_terms_from_text(text):
     """Extract specific technical terms and concepts from document"""
-    import re
-    from collections import Counter
-    
     if not text:
         return []
     
-    # Clean text but preserve technical terms
-    text = re.sub(r'[^a-zA-Z0-9\s\-_]', ' ', text)
-    words = text.split()
-    
-    # Enhanced stop words
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did',
-        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
-        'document', 'content', 'material', 'information', 'text', 'chapter', 'section', 'page'
-    }
-    
-    # Extract technical terms (capitalized, numbers, technical patterns)
-    key_terms = []
-    for word in words:
-        word_clean = word.strip().lower()
-        if (len(word_clean) > 2 and 
-            word_clean not in stop_words and
-            (word.isupper() or  # Acronyms like CPU, RAM
-             any(char.isdigit() for char in word) or  # Technical codes like 8085
-             word_clean in ['programming', 'algorithm', 'function', 'variable', 'loop', 'condition', 'statement'])):
-            key_terms.append(word)
-    
-    # Count frequency and return most common
-    term_counts = Counter(key_terms)
-    return [term for term, count in term_counts.most_common(15)]
+    # Technical terms (acronyms like CPU, codes like 8085, programming words), most frequent first
+    key_terms = Counter({
+        word: count for word, count in Counter(token_stream(text).ascii_words).items()
+        if len(word) > 2 and word.lower() not in KEY_TERM_STOP_WORDS
+        and (word.isupper() or DIGIT_RE.search(word) or word.lower() in KEY_TERM_WORDS)
+    })
+    return [term for term, count in key_terms.most_common(15)]
 
 def extract_main_topics(text):
     """Extract main topics and subjects from document"""
     if not text:
         return []
     
-    # Look for topic indicators
-    topic_patterns = [
-        r'chapter \d+[:\-]?\s*([^\n]+)',
-        r'unit \d+[:\-]?\s*([^\n]+)',
-        r'section \d+[:\-]?\s*([^\n]+)',
-        r'topic[:\-]?\s*([^\n]+)',
-        r'introduction to ([^\n]+)',
-        r'overview of ([^\n]+)'
-    ]
-    
     topics = []
-    import re
-    
-    for pattern in topic_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        topics.extend([match.strip()[:50] for match in matches])
+    for pattern in TOPIC_PATTERNS:
+        topics.extend([match.strip()[:50] for match in pattern.findall(text)])
     
     # If no structured topics found, extract from headings and important sentences
     if not topics:
@@ -1188,22 +1144,29 @@ def is_summary_specific(summary, key_terms):
     # Summary is specific if it has key terms and minimal generic phrases
     return specific_terms_found >= 2 and not has_generic_phrases
 
+def generate_smart_fallback_summary(text):
+    """Summary built from the text alone, for when no AI client is configured"""
+    if not text or len(text.strip()) < 10:
+        return "Insufficient text content for summary generation."
+    return generate_enhanced_fallback_summary(text)
+
 def generate_enhanced_fallback_summary(text, key_terms=None, main_topics=None):
     """Generate well-formatted, comprehensive summary with 100-150 words and bullet points"""
     if not text or len(text.strip()) < 50:
         return "This document contains limited readable content for comprehensive analysis."
     
+    analysis = get_analysis(text)
     if not key_terms:
-        key_terms = extract_key_terms_from_text(text)
+        key_terms = analysis.key_terms
     if not main_topics:
-        main_topics = extract_main_topics(text)
+        main_topics = analysis.main_topics
     
     # Clean and process text
     text = text.strip()
     sentences = [s.strip() for s in text.replace('\n', ' ').split('.') if len(s.strip()) > 20]
     
     # Build structured summary with introduction and key points
-    doc_type = detect_document_type(text)
+    doc_type = analysis.document_type
     
     # Introduction paragraph (40-60 words)
     if main_topics and main_topics[0]:
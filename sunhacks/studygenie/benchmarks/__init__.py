@@ -0,0 +1,9 @@
+"""
+End-to-end benchmarks for StudyGenie
+`manage.py bench` replays the PDFs in media/documents/ through every stage of
+an upload (extraction, OCR, analysis, fallback and LLM-generated summaries,
+quizzes and flashcards, tutor retrieval, YouTube ranking) with the fake LLM
+backend and a local YouTube stand-in, and reports per-stage latency,
+throughput, memory and allocations as JSON. `--compare` flags regressions
+between two runs.
+"""
@@ -0,0 +1,141 @@
+import contextlib
+import json
+import os
+import platform
+import sys
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+import llm.client
+from benchmarks import runner, stages
+from fake_youtube import FakeYouTube
+from llm.client import LLMClient
+from llm.fake import DISTRIBUTIONS, FakeLLM
+
+
+class Command(BaseCommand):
+    help = ('Replay the PDFs in media/documents through every upload stage (fake LLM and YouTube) and report '
+            'per-stage latency, throughput, memory and allocations as JSON; --compare flags regressions')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Directory of PDFs (default: MEDIA_ROOT/documents)')
+        parser.add_argument('--limit', type=int, default=0, help='Only use the first N distinct documents')
+        parser.add_argument('--stages', default=','.join(stages.STAGES),
+                            help=f"Comma-separated stages to run (default: all of {', '.join(stages.STAGES)})")
+        parser.add_argument('--output', default='-', help='File for the JSON report (default: stdout)')
+        parser.add_argument('--no-alloc', action='store_true', help='Skip the tracemalloc pass')
+        parser.add_argument('--llm-latency', type=float, default=0.0, help='Median fake LLM latency in seconds')
+        parser.add_argument('--llm-latency-dist', default='lognormal', choices=DISTRIBUTIONS)
+        parser.add_argument('--llm-error-rate', type=float, default=0.0, help='Share of fake LLM calls failing')
+        parser.add_argument('--youtube-latency', type=float, default=0.0, help='Fake YouTube search latency')
+        parser.add_argument('--seed', type=int, default=0, help='Seed for the fake latencies and errors')
+        parser.add_argument('--compare', nargs='+', metavar='RUN',
+                            help='Compare two JSON reports (or one with a fresh run) and fail on regressions')
+        parser.add_argument('--threshold', type=float, default=0.10,
+                            help='Relative change counted as a regression (default: 0.10)')
+
+    def handle(self, *args, **options):
+        # The tables go to stderr so stdout stays valid JSON
+        self.report = self.stderr
+        self.report.style_func = None
+
+        if options['compare'] and len(options['compare']) > 2:
+            raise CommandError("--compare takes one or two reports")
+        if options['compare'] and len(options['compare']) == 2:
+            old, new = (self.load(path) for path in options['compare'])
+        else:
+            with contextlib.redirect_stdout(sys.stderr):  # Progress printed by the pipeline
+                new = self.run(options)
+            self.write(new, options['output'])
+            if not options['compare']:
+                return
+            old = self.load(options['compare'][0])
+        self.compare(old, new, options['threshold'])
+
+    def run(self, options):
+        names = [name.strip() for name in options['stages'].split(',') if name.strip()]
+        unknown = [name for name in names if name not in stages.STAGES]
+        if unknown:
+            raise CommandError(f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(stages.STAGES)})")
+
+        directory = options['path'] or os.path.join(settings.MEDIA_ROOT, 'documents')
+        self.report.write(f"Loading PDFs from {directory}...")
+        samples, skipped = stages.load_corpus(directory, options['limit'])
+        if not samples:
+            raise CommandError(f"No PDFs with extractable text under {directory}")
+        pages = sum(sample.pages for sample in samples)
+        self.report.write(f"{len(samples)} distinct documents, {pages} pages ({len(skipped)} unreadable)\n")
+
+        fake = FakeLLM(latency=options['llm_latency'], distribution=options['llm_latency_dist'],
+                       error_rate=options['llm_error_rate'], seed=options['seed'])
+        client = LLMClient(api_key=None, cache=None, backend=fake, retry_backoff=0)
+        import ai_services
+
+        results = {}
+        self.report.write(f"{'stage':20} {'docs':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'docs/s':>8} "
+                          f"{'RSS MB':>7} {'alloc KB':>9} {'blocks':>7}")
+        previous, llm.client._client = llm.client._client, client
+        try:
+            with FakeYouTube(latency=options['youtube_latency'], seed=options['seed']) as youtube, \
+                    override_settings(LLM_ACCOUNTING_ENABLED=False), \
+                    patch.object(ai_services, 'client', client), \
+                    patch.dict(os.environ, YOUTUBE_API_BASE=youtube.base_url, YOUTUBE_API_KEY='bench'):
+                for name in names:
+                    if name == 'ocr' and stages.ocr_available():
+                        results[name] = {'skipped': stages.ocr_available()}
+                        self.report.write(f"{name:20} skipped: {results[name]['skipped']}")
+                        continue
+                    result = results[name] = runner.run_stage(stages.STAGES[name], samples,
+                                                              trace_allocations=not options['no_alloc'])
+                    self.report.write(
+                        f"{name:20} {result['documents']:5d} {result['errors']:4d} {result['p50_ms']:9.2f} "
+                        f"{result['p95_ms']:9.2f} {result['throughput_per_s']:8.1f} {result['peak_rss_mb']:7.0f} "
+                        f"{result.get('alloc_peak_kb', 0):9.0f} {result.get('alloc_blocks', 0):7d}"
+                    )
+        finally:
+            llm.client._client = previous
+
+        return {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'corpus': {'path': str(directory), 'documents': len(samples), 'pages': pages,
+                       'unreadable': len(skipped)},
+            'llm': {'backend': 'fake', 'latency': options['llm_latency'],
+                    'distribution': options['llm_latency_dist'], 'error_rate': options['llm_error_rate'],
+                    'calls': fake.calls},
+            'youtube': {'latency': options['youtube_latency']},
+            'stages': results,
+        }
+
+    def write(self, report, output):
+        data = json.dumps(report, indent=2)
+        if output == '-':
+            self.stdout.write(data)
+        else:
+            with open(output, 'w') as file:
+                file.write(data + '\n')
+            self.report.write(f"\nReport written to {output}")
+
+    def load(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read report {path}: {e}")
+
+    def compare(self, old, new, threshold):
+        rows = runner.compare(old, new, threshold)
+        self.report.write(f"\n{'stage':20} {'metric':17} {'before':>10} {'after':>10} {'change':>8}")
+        for stage, metric, was, now, change, regressed in rows:
+            flag = '  REGRESSION' if regressed else ''
+            self.report.write(f"{stage:20} {metric:17} {was:10.2f} {now:10.2f} {change:+8.1%}{flag}")
+        regressions = [row for row in rows if row[-1]]
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) over {threshold:.0%}: "
+                               + ', '.join(f"{stage} {metric}" for stage, metric, *_ in regressions))
+        self.report.write(f"\nNo regressions over {threshold:.0%}")
@@ -0,0 +1,176 @@
+"""
+Measuring stages and comparing runs
+Each stage runs over every sample twice: once timed (latency per document,
+throughput and peak RSS, sampled by a background thread) and once under
+tracemalloc for allocations, since tracing slows the code it measures.
+Nothing may write to the database while a stage runs.
+"""
+
+import contextlib
+import io
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+from django.db import connection
+
+from textproc import token_stream
+
+from . import stages
+
+WRITE_STATEMENTS = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER'}
+
+# Metric -> (direction a regression moves it, smallest change worth reporting)
+METRICS = {
+    'p50_ms': (1, 1.0),
+    'p95_ms': (1, 1.0),
+    'throughput_per_s': (-1, 0.0),
+    'peak_rss_mb': (1, 5.0),
+    'alloc_peak_kb': (1, 64.0),
+    'alloc_blocks': (1, 100.0),
+}
+
+
+class DatabaseWriteError(RuntimeError):
+    """A benchmarked stage tried to write to the database"""
+
+
+def reject_writes(execute, sql, params, many, context):
+    statement = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    if statement in WRITE_STATEMENTS:
+        raise DatabaseWriteError(f"Benchmarks must not write to the database: {sql[:80]}")
+    return execute(sql, params, many, context)
+
+
+def current_rss():
+    """Resident memory of this process in bytes (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return 0
+
+
+def max_rss():
+    """Highest RSS of the process so far, for platforms without /proc"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return 0
+
+
+class RssSampler:
+    """Highest RSS seen while the block runs"""
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, current_rss())
+            time.sleep(0.005)
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, current_rss()) or max_rss()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def reset_caches():
+    """Start each stage cold: no token streams or analyses left by the previous one"""
+    token_stream.cache_clear()
+    stages.analysis._recent.clear()
+
+
+def run_stage(function, samples, trace_allocations=True):
+    """Metrics of one stage over the samples"""
+    latencies, errors = [], []
+    quiet = io.StringIO()  # The pipeline prints progress; keep it out of the report
+
+    reset_caches()
+    with connection.execute_wrapper(reject_writes), contextlib.redirect_stdout(quiet), RssSampler() as rss:
+        started = time.perf_counter()
+        for sample in samples:
+            stages.prime(sample)
+            call_started = time.perf_counter()
+            try:
+                function(sample)
+            except DatabaseWriteError:
+                raise
+            except Exception as e:
+                errors.append(f"{sample.name}: {e}")
+                continue
+            latencies.append(time.perf_counter() - call_started)
+        elapsed = time.perf_counter() - started
+
+    result = {
+        'documents': len(samples),
+        'errors': len(errors),
+        'p50_ms': round(statistics.median(latencies) * 1000, 3) if latencies else 0.0,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'mean_ms': round(statistics.mean(latencies) * 1000, 3) if latencies else 0.0,
+        'total_s': round(elapsed, 3),
+        'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'peak_rss_mb': round(rss.peak / 2 ** 20, 1),
+    }
+    if trace_allocations:
+        result.update(trace_stage(function, samples))
+    if errors:
+        result['error_examples'] = errors[:3]
+    return result
+
+
+def trace_stage(function, samples):
+    """Median per document of the peak traced memory and of the blocks still allocated when it returns"""
+    peaks, blocks = [], []
+    reset_caches()
+    with connection.execute_wrapper(reject_writes), contextlib.redirect_stdout(io.StringIO()):
+        for sample in samples:
+            stages.prime(sample)
+            tracemalloc.start()
+            try:
+                output = function(sample)
+                peaks.append(tracemalloc.get_traced_memory()[1])
+                blocks.append(len(tracemalloc.take_snapshot().traces))
+                del output
+            except DatabaseWriteError:
+                raise
+            except Exception:
+                pass
+            finally:
+                tracemalloc.stop()
+    return {
+        'alloc_peak_kb': round(statistics.median(peaks) / 1024, 1) if peaks else 0.0,
+        'alloc_blocks': int(statistics.median(blocks)) if blocks else 0,
+    }
+
+
+def compare(old, new, threshold=0.10):
+    """[(stage, metric, old value, new value, relative change, regressed)] for stages in both runs"""
+    rows = []
+    for stage, after in new['stages'].items():
+        before = old['stages'].get(stage)
+        if not before or 'skipped' in before or 'skipped' in after:
+            continue
+        for metric, (worse, min_change) in METRICS.items():
+            if metric not in before or metric not in after:
+                continue
+            was, now = before[metric], after[metric]
+            change = (now - was) / was if was else 0.0
+            regressed = change * worse > threshold and abs(now - was) > min_change
+            rows.append((stage, metric, was, now, change, regressed))
+    return rows
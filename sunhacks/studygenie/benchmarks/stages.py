@@ -0,0 +1,156 @@
+"""
+The stages of an upload, as benchmark steps
+Each stage takes one Sample (a PDF of the corpus with its extracted text and
+analysis, prepared once and not timed) and does the work the upload pipeline
+does for it. LLM stages call the shared client, which `manage.py bench`
+points at the fake backend; the YouTube stage searches the local stand-in.
+"""
+
+import io
+from pathlib import Path
+
+from documents import analysis
+from documents.extraction import extract_pdf_pages
+
+TUTOR_QUESTIONS = ("What is {}?", "Explain how {} works", "Give an example of {}")
+OCR_IMAGES = 2  # Embedded images OCR'd per document
+
+
+class Sample:
+    """One distinct document of the corpus"""
+
+    def __init__(self, path, text, pages, analysis):
+        self.path = path
+        self.name = Path(path).name
+        self.text = text
+        self.pages = pages
+        self.analysis = analysis
+        self.summary = None  # Fallback summary, for the YouTube stage
+
+
+def load_corpus(directory, limit=0):
+    """Samples for the PDFs under a directory, skipping files without text and duplicate texts"""
+    pdfs = sorted(pdf for pdf in Path(directory).rglob('*.pdf') if '.incoming' not in pdf.parts)
+    samples, seen, skipped = [], set(), []
+    for pdf in pdfs:
+        if limit and len(samples) >= limit:
+            break
+        try:
+            result = extract_pdf_pages(str(pdf), workers=1)
+        except Exception as e:
+            skipped.append((pdf.name, str(e)))
+            continue
+        text = result.text
+        if not text.strip() or text in seen:
+            continue
+        seen.add(text)
+        samples.append(Sample(str(pdf), text, result.page_count, analysis.analyze_text(text)))
+    return samples, skipped
+
+
+def prime(sample):
+    """Put the sample's analysis in memory, as get_analysis finds it after an upload stored it"""
+    analysis._remember(analysis.text_hash(sample.text), sample.analysis)
+
+
+def extract(sample):
+    return extract_pdf_pages(sample.path, workers=1).text
+
+
+def ocr_available():
+    """None if OCR can run here, else the reason it can't"""
+    try:
+        import pytesseract
+        from PIL import Image  # noqa: F401
+        pytesseract.get_tesseract_version()
+    except ImportError:
+        return "pytesseract and Pillow are not installed"
+    except Exception:
+        return "the tesseract binary is not installed"
+    return None
+
+
+def ocr(sample):
+    """OCR of the first embedded images, as extract_text_from_image does for image uploads"""
+    import PyPDF2
+    import pytesseract
+    from PIL import Image
+
+    texts = []
+    reader = PyPDF2.PdfReader(sample.path)
+    for page in reader.pages:
+        for image in page.images:
+            texts.append(pytesseract.image_to_string(Image.open(io.BytesIO(image.data))))
+            if len(texts) >= OCR_IMAGES:
+                return texts
+    return texts
+
+
+def analyze(sample):
+    return analysis.analyze_text(sample.text)
+
+
+def fallback_summary(sample):
+    from ai_services import generate_enhanced_fallback_summary
+    sample.summary = generate_enhanced_fallback_summary(sample.text, sample.analysis.key_terms,
+                                                        sample.analysis.main_topics)
+    return sample.summary
+
+
+def fallback_quiz(sample):
+    from ai_services import generate_dynamic_fallback_quiz
+    return generate_dynamic_fallback_quiz(sample.text, 'medium', sample.analysis.key_terms,
+                                          sample.analysis.main_topics)
+
+
+def fallback_flashcards(sample):
+    from ai_services import generate_fallback_flashcards
+    return generate_fallback_flashcards(sample.text)
+
+
+def summary(sample):
+    from ai_services import generate_summary_with_ai
+    return generate_summary_with_ai(sample.text)
+
+
+def quiz(sample):
+    from ai_services import generate_quiz_with_ai
+    return generate_quiz_with_ai(sample.text, 'medium')
+
+
+def flashcards(sample):
+    from ai_services import generate_flashcards_with_ai
+    return generate_flashcards_with_ai(sample.text)
+
+
+def retrieval(sample):
+    """Build the tutor's BM25 index and answer a few questions about the key terms"""
+    from documents.retrieval import ChunkIndexData
+    index = ChunkIndexData.build(sample.text)
+    terms = sample.analysis.key_terms[:len(TUTOR_QUESTIONS)] or ['this document']
+    return [index.search(question.format(term), k=3) for question, term in zip(TUTOR_QUESTIONS, terms)]
+
+
+def youtube(sample):
+    """Keywords from the summary, search, deduplication and ranking"""
+    from youtube_services import (advanced_video_deduplication, get_video_recommendations_from_summary,
+                                  rank_videos_by_deep_relevance)
+    text = sample.summary or sample.text[:2000]
+    videos, keywords = get_video_recommendations_from_summary(text, sample.name)
+    return rank_videos_by_deep_relevance(advanced_video_deduplication(videos), keywords, text)
+
+
+# In pipeline order; fallback_summary runs before youtube, which searches for its keywords
+STAGES = {
+    'extract': extract,
+    'ocr': ocr,
+    'analysis': analyze,
+    'fallback_summary': fallback_summary,
+    'fallback_quiz': fallback_quiz,
+    'fallback_flashcards': fallback_flashcards,
+    'summary': summary,
+    'quiz': quiz,
+    'flashcards': flashcards,
+    'retrieval': retrieval,
+    'youtube': youtube,
+}
@@ -0,0 +1,79 @@
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+
+from documents.analysis import analyze_text
+
+from . import runner, stages
+
+def report(**stage_metrics):
+    return {'stages': {stage: dict(metrics) for stage, metrics in stage_metrics.items()}}
+
+
+class BenchCommandTests(TestCase):
+
+    def bench(self, *args, **options):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('bench', *args, stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_report_has_metrics_for_each_stage(self):
+        out, err = self.bench(limit=2, stages='analysis,fallback_quiz,quiz,retrieval,youtube')
+        data = json.loads(out)
+        self.assertEqual(data['corpus']['documents'], 2)
+        self.assertEqual(list(data['stages']), ['analysis', 'fallback_quiz', 'quiz', 'retrieval', 'youtube'])
+        for result in data['stages'].values():
+            self.assertEqual(result['errors'], 0)
+            self.assertGreater(result['p95_ms'], 0)
+            self.assertGreaterEqual(result['p95_ms'], result['p50_ms'])
+            self.assertGreater(result['throughput_per_s'], 0)
+            self.assertIn('alloc_peak_kb', result)
+        self.assertGreater(data['llm']['calls'], 0)  # The quiz stage went through the fake backend
+        self.assertIn('retrieval', err)
+
+    def test_compare_fails_on_regressions(self):
+        old = report(analysis={'p50_ms': 10.0, 'p95_ms': 20.0, 'throughput_per_s': 100.0})
+        new = report(analysis={'p50_ms': 10.5, 'p95_ms': 30.0, 'throughput_per_s': 60.0})
+        paths = []
+        for data in (old, new):
+            with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+                json.dump(data, file)
+            paths.append(file.name)
+            self.addCleanup(os.remove, file.name)
+
+        with self.assertRaisesMessage(CommandError, '2 regression(s)'):
+            self.bench(compare=paths)
+        out, err = self.bench(compare=[paths[0], paths[0]])
+        self.assertIn('No regressions', err)
+
+    def test_unknown_stage_is_rejected(self):
+        with self.assertRaisesMessage(CommandError, 'Unknown stages: ocrr'):
+            self.bench(stages='ocrr')
+
+
+class RunnerTests(TestCase):
+
+    def test_small_changes_are_not_regressions(self):
+        rows = runner.compare(report(extract={'p50_ms': 0.2, 'peak_rss_mb': 60.0}),
+                              report(extract={'p50_ms': 0.4, 'peak_rss_mb': 62.0}))
+        self.assertFalse(any(regressed for *_, regressed in rows))
+
+    def test_skipped_stages_are_not_compared(self):
+        self.assertEqual(runner.compare(report(ocr={'skipped': 'no tesseract'}), report(ocr={'p50_ms': 5.0})), [])
+
+    def test_stages_must_not_write_to_the_database(self):
+        with connection.execute_wrapper(runner.reject_writes):
+            User.objects.filter(username='nobody').exists()  # Reads are fine
+            with self.assertRaises(runner.DatabaseWriteError):
+                User.objects.create_user('bench-user')
+
+        text = 'Some text about transistors.'
+        sample = stages.Sample('notes.pdf', text, 1, analyze_text(text))
+        with self.assertRaises(runner.DatabaseWriteError):
+            runner.run_stage(lambda sample: User.objects.create_user('bench-user'), [sample])
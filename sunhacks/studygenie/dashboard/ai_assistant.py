@@ -8,32 +8,56 @@ import os
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
-from dotenv import load_dotenv
-import google.generativeai as genai
-
-# Load environment variables
-load_dotenv()
+from llm import get_client
+from llm.ratelimit import posted_question, rate_limited
+from llm.streaming import HtmlFormatter, sse_response, start_stream, start_stream_async, wants_stream
 
 class AIAssistant:
     def __init__(self):
-        self.api_key = os.getenv('GOOGLE_AI_API_KEY')
         self.model = None
         self.initialize_ai()
     
     def initialize_ai(self):
-        """Initialize the AI model with proper error handling"""
-        try:
-            if not self.api_key:
-                print("ERROR: GOOGLE_AI_API_KEY not found in environment variables")
-                return False
+        """Use the shared LLM client (falsy when no API key is configured)"""
+        self.model = get_client()
+        return bool(self.model)
+    
+    def build_prompt(self, question, context=None):
+        """Prompt for a student question, with optional context"""
+        # Create enhanced prompt based on context
+        if context:
+            prompt = f"""
+            You are StudyGenie's AI Assistant, helping students learn effectively.
             
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            print(f"AI Assistant initialized successfully with key: {self.api_key[:10]}...")
-            return True
-        except Exception as e:
-            print(f"AI initialization error: {e}")
-            return False
+            Context: {context}
+            Student Question: {question}
+            
+            Provide a helpful, educational response that:
+            1. Directly answers the question
+            2. Uses simple, clear language
+            3. Includes practical examples when relevant
+            4. Encourages further learning
+            5. Keeps response under 150 words
+            
+            Response:
+            """
+        else:
+            prompt = f"""
+            You are StudyGenie's AI Assistant, a friendly and knowledgeable study companion.
+            
+            Student Question: {question}
+            
+            Provide a helpful response that:
+            1. Answers the question clearly and concisely
+            2. Uses encouraging and supportive tone
+            3. Includes actionable study tips when relevant
+            4. Suggests using StudyGenie features when appropriate
+            5. Keeps response under 150 words
+            6. Uses emojis sparingly for engagement
+            
+            Response:
+            """
+        return prompt
     
     def generate_response(self, question, context=None):
         """Generate AI response with enhanced prompting"""
@@ -41,47 +65,35 @@ class AIAssistant:
             return self.generate_fallback_response(question)
         
         try:
-            # Create enhanced prompt based on context
-            if context:
-                prompt = f"""
-                You are StudyGenie's AI Assistant, helping students learn effectively.
-                
-                Context: {context}
-                Student Question: {question}
-                
-                Provide a helpful, educational response that:
-                1. Directly answers the question
-                2. Uses simple, clear language
-                3. Includes practical examples when relevant
-                4. Encourages further learning
-                5. Keeps response under 150 words
-                
-                Response:
-                """
-            else:
-                prompt = f"""
-                You are StudyGenie's AI Assistant, a friendly and knowledgeable study companion.
-                
-                Student Question: {question}
-                
-                Provide a helpful response that:
-                1. Answers the question clearly and concisely
-                2. Uses encouraging and supportive tone
-                3. Includes actionable study tips when relevant
-                4. Suggests using StudyGenie features when appropriate
-                5. Keeps response under 150 words
-                6. Uses emojis sparingly for engagement
-                
-                Response:
-                """
+            response = self.model.generate_content(self.build_prompt(question, context))
+            return self.format_response(response.text.strip())
             
-            response = self.model.generate_content(prompt)
+        except Exception as e:
+            print(f"AI response generation error: {e}")
+            return self.generate_fallback_response(question)
+    
+    async def generate_response_async(self, question, context=None):
+        """generate_response for async views"""
+        if not self.model:
+            return self.generate_fallback_response(question)
+        
+        try:
+            response = await self.model.generate_content_async(self.build_prompt(question, context))
             return self.format_response(response.text.strip())
             
         except Exception as e:
             print(f"AI response generation error: {e}")
             return self.generate_fallback_response(question)
     
+    def stream_response(self, question, context=None):
+        """Streamed AI response as server-sent events (llm/streaming.py); raises if the call fails"""
+        return sse_response(start_stream(self.build_prompt(question, context), self.model),
+                            HtmlFormatter(emphasis=True))
+    
+    async def stream_response_async(self, question, context=None):
+        return sse_response(await start_stream_async(self.build_prompt(question, context), self.model),
+                            HtmlFormatter(emphasis=True))
+    
     def format_response(self, response):
         """Format AI response for better HTML display"""
         # Convert newlines to HTML breaks
@@ -203,8 +215,14 @@ class AIAssistant:
 # Global AI assistant instance
 ai_assistant = AIAssistant()
 
+def chat_fallback(request):
+    """Local answer for chat requests over the rate limit"""
+    return JsonResponse({'response': ai_assistant.generate_fallback_response(posted_question(request) or 'help'),
+                         'status': 'success'})
+
 @csrf_exempt
 @login_required
+@rate_limited('chat', fallback=chat_fallback)
 def real_time_chat(request):
     """Handle real-time chat requests with enhanced AI responses"""
     if request.method == 'POST':
@@ -224,8 +242,16 @@ def real_time_chat(request):
                 # Could add user's recent documents or study history as context
                 user_context = f"Student: {request.user.username}"
             
-            # Generate AI response
-            response = ai_assistant.generate_response(question, user_context)
+            # Streamed as it is generated if the client asked for it ("stream": true)
+            if wants_stream(request, data) and ai_assistant.model:
+                try:
+                    return ai_assistant.stream_response(question, user_context)
+                except Exception as e:
+                    print(f"AI response streaming error: {e}")
+                    response = ai_assistant.generate_fallback_response(question)
+            else:
+                # Generate AI response
+                response = ai_assistant.generate_response(question, user_context)
             
             return JsonResponse({
                 'response': response,
@@ -0,0 +1,56 @@
+"""
+Async version of the dashboard chat view, served under ASGI (see documents/async_views.py)
+"""
+
+import json
+import os
+
+from django.http import JsonResponse
+
+from llm.ratelimit import rate_limited
+from llm.streaming import wants_stream
+from studygenie.aio import csrf_exempt, login_required
+
+from .ai_assistant import ai_assistant, chat_fallback
+
+
+@csrf_exempt
+@login_required
+@rate_limited('chat', fallback=chat_fallback)
+async def real_time_chat(request):
+    """Handle real-time chat requests with enhanced AI responses"""
+    if request.method != 'POST':
+        return JsonResponse({'response': 'Invalid request method. Please use POST.', 'status': 'error'})
+
+    question = 'help'
+    try:
+        data = json.loads(request.body)
+        question = data.get('question', '').strip()
+        if not question:
+            return JsonResponse({
+                'response': "Please ask me a question! I'm here to help with your studies. 📚",
+                'status': 'success'
+            })
+
+        # The user was loaded by login_required
+        user_context = f"Student: {request.user.username}"
+
+        if wants_stream(request, data) and ai_assistant.model:
+            try:
+                return await ai_assistant.stream_response_async(question, user_context)
+            except Exception as e:
+                print(f"AI response streaming error: {e}")
+                response = ai_assistant.generate_fallback_response(question)
+        else:
+            response = await ai_assistant.generate_response_async(question, user_context)
+
+        return JsonResponse({
+            'response': response,
+            'status': 'success',
+            'timestamp': json.dumps(str(os.times()))
+        })
+    except json.JSONDecodeError:
+        return JsonResponse({'response': 'Invalid request format. Please try again.', 'status': 'error'})
+    except Exception as e:
+        print(f"Chat error: {e}")
+        return JsonResponse({'response': ai_assistant.generate_fallback_response(question), 'status': 'error'})
@@ -1 +1,82 @@
-from django.test import TestCase
\ No newline at end of file
+import json
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from llm.client import LLMClient
+from llm.tests import FakeModel, make_async_client, read_body, sse_events
+from . import async_views
+from .ai_assistant import ai_assistant
+
+
+@override_settings(RATELIMIT_ENABLED=False)  # Requests of earlier tests would count against these
+class ChatStreamingTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('chat-user', password='pw'))
+        self.model = LLMClient(api_key='test-key', retry_backoff=0)
+        self.model._model = FakeModel(reply="**Spaced repetition**:\n- review after 1 day\n- then 3 days")
+
+    def ask(self, **body):
+        with patch.object(ai_assistant, 'model', self.model):
+            return self.client.post(reverse('ai_chat'), json.dumps(dict(question='How do I revise?', **body)),
+                                    content_type='application/json')
+
+    def test_reply_streams_as_server_sent_events(self):
+        response = self.ask(stream=True)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = sse_events(response)
+        html = ''.join(data['delta'] for event, data in events if event == 'message')
+        self.assertEqual(html, ai_assistant.format_response(self.model._model.reply))
+        self.assertEqual(events[-1][0], 'done')
+        self.assertIn('ttft_ms', events[-1][1])
+
+    def test_without_stream_the_reply_is_json(self):
+        data = self.ask().json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['response'], ai_assistant.format_response(self.model._model.reply))
+
+    def test_failed_stream_falls_back_to_a_json_answer(self):
+        self.model._model.failures = [ValueError("quota")]
+        response = self.ask(stream=True)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['response'], ai_assistant.generate_fallback_response('How do I revise?'))
+
+
+class AsyncChatTests(TestCase):
+    REPLY = "**Spaced repetition**:\n- review after 1 day\n- then 3 days"
+
+    def setUp(self):
+        self.user = User.objects.create_user('async-chat-user', password='pw')
+        self.model = make_async_client(reply=self.REPLY)
+
+    async def ask(self, **body):
+        request = AsyncRequestFactory().post(reverse('ai_chat'), json.dumps(dict(question='How do I revise?', **body)),
+                                             content_type='application/json')
+        request.user = self.user
+        with patch.object(ai_assistant, 'model', self.model):
+            response = await async_views.real_time_chat(request)
+            return response, (await read_body(response) if response.streaming else response.content)
+
+    def test_reply_streams_from_an_async_iterator(self):
+        response, body = async_to_sync(self.ask)(stream=True)
+        self.assertTrue(response.is_async)
+        events = sse_events(response, body)
+        html = ''.join(data['delta'] for event, data in events if event == 'message')
+        self.assertEqual(html, ai_assistant.format_response(self.REPLY))
+        self.assertEqual(events[-1][0], 'done')
+
+    def test_without_stream_the_reply_is_json(self):
+        response, body = async_to_sync(self.ask)()
+        data = json.loads(body)
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['response'], ai_assistant.format_response(self.REPLY))
+        self.assertIn('Student: async-chat-user', self.model.http_transport.prompts[0])
+
+    def test_failed_call_falls_back(self):
+        self.model.http_transport.failures = [400]
+        response, body = async_to_sync(self.ask)(stream=True)
+        self.assertEqual(json.loads(body)['response'], ai_assistant.generate_fallback_response('How do I revise?'))
@@ -1,10 +1,15 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from . import ai_assistant
+from . import async_views
+
+# Under ASGI the chat view runs as a coroutine (async_views.py)
+chat_views = async_views if settings.ASYNC_VIEWS else ai_assistant
 
 urlpatterns = [
     path('', views.dashboard_view, name='dashboard'),
     path('profile/', views.profile_view, name='profile'),
-    path('ai-chat/', ai_assistant.real_time_chat, name='ai_chat'),
+    path('ai-chat/', chat_views.real_time_chat, name='ai_chat'),
     path('quick-help/', ai_assistant.quick_help, name='quick_help'),
-]
\ No newline at end of file
+]
@@ -1,7 +1,29 @@
 from django.contrib import admin
-from .models import Document
+from .models import ChunkIndex, Document, DocumentAnalysis, ExtractedContent, TranslationSegment
 
 @admin.register(Document)
 class DocumentAdmin(admin.ModelAdmin):
     list_display = ['title', 'user', 'status', 'created_at']
-    list_filter = ['status', 'created_at']
\ No newline at end of file
+    list_filter = ['status', 'created_at']
+@admin.register(ExtractedContent)
+class ExtractedContentAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'summary_language', 'detected_language', 'updated_at']
+    search_fields = ['content_hash']
+
+@admin.register(ChunkIndex)
+class ChunkIndexAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'chunk_count', 'version', 'updated_at']
+    search_fields = ['content_hash']
+    exclude = ['data']
+
+@admin.register(DocumentAnalysis)
+class DocumentAnalysisAdmin(admin.ModelAdmin):
+    list_display = ['content_hash', 'document_type', 'language', 'cpu_ms', 'updated_at']
+    list_filter = ['document_type', 'language']
+    search_fields = ['content_hash']
+
+@admin.register(TranslationSegment)
+class TranslationSegmentAdmin(admin.ModelAdmin):
+    list_display = ['source_text', 'translation', 'language', 'created_at']
+    list_filter = ['language']
+    search_fields = ['source_text', 'translation']
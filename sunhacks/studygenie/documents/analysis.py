@@ -0,0 +1,102 @@
+"""
+Precomputed text analysis of a document
+Key terms, main topics, document type and language used to be recomputed
+from the full extracted text by every summary, quiz, flashcard and fallback
+path. analyze_text() computes them all together, once per text: the
+result is stored in a DocumentAnalysis row keyed by the document's content
+hash (and found again by a hash of the text), with a small in-process LRU in
+front of the table.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+ANALYSIS_VERSION = 1
+
+_recent = OrderedDict()  # text hash -> Analysis, most recently used last
+_recent_lock = threading.Lock()
+RECENT_ANALYSES = 64
+
+
+class Analysis:
+    """Text features shared by the summary, quiz, flashcard and fallback code"""
+
+    FIELDS = ('key_terms', 'main_topics', 'document_type', 'language')
+
+    def __init__(self, key_terms, main_topics, document_type, language):
+        self.key_terms = key_terms  # Acronyms, codes and technical words, most frequent first
+        self.main_topics = main_topics  # Chapter/unit/section titles or heading-like lines
+        self.document_type = document_type  # e.g. "Engineering Material"
+        self.language = language  # 'en', 'hi' or 'mr'
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+
+def text_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def analyze_text(text):
+    """Compute every feature of a text"""
+    from ai_services import detect_document_type, detect_language, extract_key_terms_from_text, extract_main_topics
+
+    return Analysis(
+        key_terms=extract_key_terms_from_text(text),
+        main_topics=extract_main_topics(text),
+        document_type=detect_document_type(text),
+        language=detect_language(text),
+    )
+
+
+def _remember(key, analysis):
+    with _recent_lock:
+        _recent[key] = analysis
+        _recent.move_to_end(key)
+        while len(_recent) > RECENT_ANALYSES:
+            _recent.popitem(last=False)
+
+
+def _stored(key):
+    try:
+        from .models import DocumentAnalysis
+        row = DocumentAnalysis.objects.filter(text_hash=key, version=ANALYSIS_VERSION).first()
+    except Exception:
+        return None  # No database (standalone script): just compute
+    if row is None:
+        return None
+    return Analysis(**{field: getattr(row, field) for field in Analysis.FIELDS})
+
+
+def get_analysis(text):
+    """Analysis of a text: from memory, else from the table, else computed now (and kept in memory only)"""
+    text = text or ''
+    key = text_hash(text)
+    with _recent_lock:
+        analysis = _recent.get(key)
+        if analysis is not None:
+            _recent.move_to_end(key)
+            return analysis
+
+    analysis = _stored(key) or analyze_text(text)
+    _remember(key, analysis)
+    return analysis
+
+
+def analyze_document(doc):
+    """Analyze a document's extracted text once and store it under the document's content hash"""
+    from .models import DocumentAnalysis
+
+    text = doc.extracted_text or ''
+    key = text_hash(text)
+    analysis = _stored(key)
+    if analysis is None:
+        started = time.process_time()
+        analysis = analyze_text(text)
+        DocumentAnalysis.objects.update_or_create(content_hash=doc.content_hash or key, defaults=dict(
+            analysis.as_dict(), text_hash=key, version=ANALYSIS_VERSION,
+            cpu_ms=(time.process_time() - started) * 1000))
+    _remember(key, analysis)
+    return analysis
@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 class DocumentsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'documents'
\ No newline at end of file
+    name = 'documents'
+
+    def ready(self):
+        from . import signals  # noqa: F401
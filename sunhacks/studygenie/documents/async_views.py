@@ -0,0 +1,215 @@
+"""
+Async versions of the LLM-bound document views
+Under ASGI (studygenie/asgi.py sets ASYNC_VIEWS) these replace their
+namesakes in views.py: a request waiting for Gemini is a suspended coroutine
+rather than a blocked worker thread. Gemini is called through the client's
+async methods, database work runs in sync_to_async, and prompts, formatting
+and fallbacks are shared with the sync views.
+"""
+
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import render
+
+from llm import get_client
+from llm.ratelimit import rate_limited
+from llm.streaming import HtmlFormatter, sse_response, start_stream_async, wants_stream
+from studygenie.aio import csrf_exempt, get_object_or_404, get_user, login_required
+
+from .language_content import (GENERATORS, content_response, flashcard_items, generator, quiz_items, read_request,
+                               stored_content, stored_summary, summary_response, untranslated_cards,
+                               untranslated_questions)
+from .models import Document
+from .views import (chatbot_fallback, chatbot_prompt, format_ai_response, generate_fallback_response, mcq_prompt, plain_html,
+                    rag_prompt, tutor_fallback_response, tutor_footer, tutor_material)
+
+
+async def user_document(request, doc_id):
+    return await get_object_or_404(Document, id=doc_id, user=await get_user(request))
+
+
+@login_required
+@rate_limited('chat')
+async def tutor_view(request, doc_id):
+    doc = await user_document(request, doc_id)
+
+    if request.method != 'POST':
+        return await sync_to_async(render)(request, 'documents/tutor.html', {'doc': doc})
+
+    data = json.loads(request.body)
+    question = data.get('question', '')
+    stream = wants_stream(request, data)
+    document_content, document_summary, is_mcq_request = tutor_material(doc, question)
+
+    try:
+        model = get_client()
+        if not model:
+            raise Exception("API key not found")
+
+        if is_mcq_request:
+            prompt = mcq_prompt(doc, document_content)
+            if stream:
+                return sse_response(await start_stream_async(prompt, model), HtmlFormatter(markdown=False))
+            ai_response = plain_html((await model.generate_content_async(prompt)).text)
+        else:
+            from .retrieval import search_document
+            passages = await sync_to_async(search_document)(doc, question, k=3, mode=data.get('retrieval'))
+            prompt = rag_prompt(doc, question, passages, document_content)
+            if stream:
+                return sse_response(await start_stream_async(prompt, model), HtmlFormatter(markdown=False),
+                                    tutor_footer(doc))
+            ai_response = plain_html((await model.generate_content_async(prompt)).text) + tutor_footer(doc)
+    except Exception as e:
+        ai_response = tutor_fallback_response(doc, question, document_content, document_summary,
+                                              is_mcq_request, str(e))
+
+    return JsonResponse({'response': ai_response})
+
+
+@csrf_exempt
+@rate_limited('chat', fallback=chatbot_fallback)
+async def chatbot_api(request):
+    if request.method != 'POST':
+        return JsonResponse({'response': 'Invalid request method. Please use POST.'})
+
+    question = ''
+    try:
+        data = json.loads(request.body)
+        question = data.get('question', '').strip()
+        if not question:
+            return JsonResponse({'response': 'Please ask me a question! I\'m here to help with your studies. 📚'})
+
+        model = get_client()
+        if not model:
+            return JsonResponse({'response': generate_fallback_response(question)})
+
+        if wants_stream(request, data):
+            return sse_response(await start_stream_async(chatbot_prompt(question), model), HtmlFormatter())
+
+        response = await model.generate_content_async(chatbot_prompt(question))
+        ai_response = format_ai_response(response.text.strip())
+        print(f"AI Response generated successfully: {len(ai_response)} characters")
+        return JsonResponse({'response': ai_response})
+    except Exception as e:
+        print(f"Chatbot AI Error: {e}")
+        return JsonResponse({'response': generate_fallback_response(question)})
+
+
+@login_required
+@rate_limited('generate')
+async def translate_summary(request, doc_id):
+    """Translate summary to requested language"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    doc = await user_document(request, doc_id)
+    try:
+        _, target_language = read_request(request)
+
+        existing = stored_summary(doc, target_language)
+        if existing:
+            return summary_response(existing, target_language, cached=True)
+
+        from ai_services import translate_content_async
+        translation = await translate_content_async(doc.summary, target_language)
+        await sync_to_async(doc.set_summary_translation)(target_language, translation)
+        return summary_response(translation, target_language, cached=False)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+@rate_limited('generate')
+async def get_quiz_in_language(request, doc_id):
+    """Get the document's quiz in a specific language (translated once, then from Question.translations)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    doc = await user_document(request, doc_id)
+    try:
+        started = time.perf_counter()
+        data, target_language = read_request(request)
+        difficulty = data.get('difficulty', 'medium')
+
+        from quizzes.models import Quiz
+        quiz = await Quiz.objects.filter(document=doc, difficulty=difficulty).afirst()
+        questions = [q async for q in quiz.question_set.select_related('quiz').order_by('id')] if quiz else []
+
+        if questions:
+            missing = untranslated_questions(quiz, questions, target_language)
+            if missing:
+                from .translation import translate_questions_async
+                await translate_questions_async(missing, target_language)
+            quiz_data, cached = quiz_items(questions, target_language, difficulty), not missing
+        else:
+            quiz_data = stored_content(doc, 'quiz', target_language)
+            cached = bool(quiz_data)
+            if not cached:
+                quiz_data = await generator('quiz', asynchronous=True)(doc.extracted_text, target_language, difficulty)
+                await sync_to_async(doc.set_language_content)('quiz', target_language, quiz_data)
+
+        return content_response('quiz', quiz_data, target_language, cached, started, difficulty=difficulty)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+@rate_limited('generate')
+async def get_flashcards_in_language(request, doc_id):
+    """Get the document's flashcards in a specific language (translated once, then from Flashcard.translations)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    doc = await user_document(request, doc_id)
+    try:
+        started = time.perf_counter()
+        data, target_language = read_request(request)
+
+        from flashcards.models import Flashcard
+        cards = [card async for card in Flashcard.objects.filter(document=doc).order_by('id')]
+
+        if cards:
+            missing = untranslated_cards(cards, target_language)
+            if missing:
+                from .translation import translate_flashcards_async
+                await translate_flashcards_async(missing, target_language)
+            flashcard_data, cached = flashcard_items(cards, target_language), not missing
+        else:
+            flashcard_data = stored_content(doc, 'flashcards', target_language)
+            cached = bool(flashcard_data)
+            if not cached:
+                flashcard_data = await generator('flashcards', asynchronous=True)(doc.extracted_text, target_language)
+                await sync_to_async(doc.set_language_content)('flashcards', target_language, flashcard_data)
+
+        return content_response('flashcards', flashcard_data, target_language, cached, started)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+
+@login_required
+@rate_limited('generate')
+async def generate_multilang_content(request, doc_id):
+    """Generate content in multiple languages"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Invalid request method'}, status=405)
+
+    doc = await user_document(request, doc_id)
+    try:
+        data, target_language = read_request(request)
+        content_type = data.get('type', 'summary')  # summary, quiz, flashcards
+        if content_type not in GENERATORS:
+            return JsonResponse({'error': 'Invalid content type'}, status=400)
+
+        result = None if content_type == 'summary' else stored_content(doc, content_type, target_language)
+        if not result:
+            result = await generator(content_type, asynchronous=True)(doc.extracted_text, target_language)
+            await sync_to_async(doc.set_language_content)(content_type, target_language, result)
+
+        return JsonResponse({'success': True, 'content': result, 'language': target_language})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
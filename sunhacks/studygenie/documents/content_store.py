@@ -0,0 +1,93 @@
+"""
+Content-addressed store of processing results
+Uploads are hashed by the storage while they are written to disk (see
+storage.py); byte-identical files then share one ExtractedContent row, so
+re-uploads skip extraction and LLM calls.
+
+Quiz, flashcards and videos are generated from the summary, so they are only
+valid for the summary language they were made with (summary_language).
+"""
+
+import hashlib
+
+from .models import ExtractedContent
+
+SUMMARY_VERSION = 1  # Bump when the summary prompts or fallbacks change: manage.py regenerate redoes older summaries
+
+
+def effective_language(language_preference):
+    """Language the summary stage actually writes in for a preference ('auto' means English)"""
+    return language_preference if language_preference in ['hi', 'mr', 'es', 'fr', 'de'] else 'en'
+
+
+def summary_key(doc, text, language, local=False):
+    """'<content hash>:<language>:<kind><SUMMARY_VERSION>', stored with a summary so regenerate can skip it"""
+    content_hash = doc.content_hash or hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"{content_hash}:{language}:{'local' if local else 'ai'}{SUMMARY_VERSION}"
+
+
+def get_cached(content_hash):
+    if not content_hash:
+        return None
+    return ExtractedContent.objects.filter(content_hash=content_hash).first()
+
+
+DERIVED_FIELDS = {'quiz': [], 'flashcards': [], 'youtube_videos': ''}
+
+
+def remember(content_hash, **fields):
+    """Store (or update) results for a content hash"""
+    if not content_hash:
+        return
+    if 'summary_language' in fields:
+        # A summary in another language makes the results derived from the old one stale
+        stale = ExtractedContent.objects.filter(content_hash=content_hash).exclude(
+            summary_language=fields['summary_language'])
+        stale.update(**DERIVED_FIELDS)
+    ExtractedContent.objects.update_or_create(content_hash=content_hash, defaults=fields)
+
+
+def cached_for_language(content_hash, language):
+    """Cached results whose summary (and so quiz, flashcards, videos) is in this language"""
+    cached = get_cached(content_hash)
+    return cached if cached and cached.summary_language == language else None
+
+
+def remember_derived(content_hash, language, **fields):
+    """Store results generated from a summary, unless the cached summary has changed language since"""
+    if not content_hash:
+        return
+    ExtractedContent.objects.filter(content_hash=content_hash, summary_language=language).update(**fields)
+
+
+def restore_document(doc, cached):
+    """Fill a new Document from cached results without any extraction or LLM call"""
+    from quizzes.models import Quiz, Question
+    from flashcards.models import Flashcard
+
+    doc.extracted_text = cached.extracted_text
+    doc.page_offsets = cached.page_offsets
+    doc.detected_language = cached.detected_language
+    doc.summary = cached.summary
+    doc.language = cached.summary_language
+    doc.summary_key = summary_key(doc, cached.extracted_text, cached.summary_language)  # Current, like its source's
+    doc.youtube_videos = cached.youtube_videos
+    doc.status = 'processed'
+    doc.save(update_fields=['extracted_text', 'page_offsets', 'detected_language', 'summary', 'summary_key',
+                            'language', 'youtube_videos', 'status'])
+
+    language = cached.summary_language  # Quiz and cards were made from the summary, in its language
+    quiz = Quiz.objects.create(document=doc, difficulty='medium', title=f'Medium Quiz for {doc.title}',
+                               language=language)
+    Question.objects.bulk_create([
+        Question(quiz=quiz, stem=q['stem'], options=q['options'],
+                 answer_key=q['answer_key'], explanation=q['explanation'])
+        for q in cached.quiz
+    ])
+    Flashcard.objects.bulk_create([
+        Flashcard(document=doc, front=card['front'], back=card['back'], language=language)
+        for card in cached.flashcards
+    ])
+
+    doc.set_stages(['extract', 'summary', 'quiz', 'flashcards', 'videos'], 'done')
+    print(f"[SUCCESS] Restored {doc.title} from content cache {cached}")
@@ -0,0 +1,127 @@
+"""
+Parallel PDF text extraction for StudyGenie
+Page ranges are sharded across a process pool (each worker opens its own
+PdfReader) and the per-page results are joined once, keeping page numbers so
+later stages can cite them.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+from django.conf import settings
+
+from studygenie.metrics import EXTRACTION_SECONDS, timer
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ExtractionResult:
+    """Per-page text of a PDF plus timing information"""
+
+    def __init__(self, pages, page_count, elapsed, workers):
+        self.pages = pages  # [(page_number, text), ...] for pages that had text
+        self.page_count = page_count
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def text(self):
+        # Pages are stripped on extraction, so offsets below line up with this string
+        return "\n".join(text for page_number, text in self.pages)
+
+    @property
+    def page_offsets(self):
+        """[(page_number, character offset of that page in .text), ...]"""
+        offsets = []
+        position = 0
+        for page_number, text in self.pages:
+            offsets.append((page_number, position))
+            position += len(text) + 1
+        return offsets
+
+    @property
+    def pages_per_second(self):
+        return self.page_count / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def default_workers():
+    return getattr(settings, 'PDF_EXTRACTION_WORKERS', None) or min(os.cpu_count() or 1, 4)
+
+
+def get_pool():
+    """Process pool shared by all extractions in this process (created once, default_workers() wide)
+    
+    Workers are spawned rather than forked: the pool is created inside
+    threaded processes (run_workers, the dev server), where forking can
+    copy a lock some other thread holds and deadlock the child.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=default_workers(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def extract_page_range(file_path, start, stop):
+    """Extract pages [start, stop) of a PDF; runs inside a pool worker"""
+    pages = []
+    with open(file_path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        for index in range(start, stop):
+            try:
+                page_text = reader.pages[index].extract_text()
+            except Exception:
+                continue
+            page_text = (page_text or '').strip()
+            if page_text:
+                pages.append((index + 1, page_text))
+    return pages
+
+
+def shard_pages(page_count, shards):
+    """Split range(page_count) into at most `shards` contiguous (start, stop) ranges"""
+    shards = max(1, min(shards, page_count))
+    size, extra = divmod(page_count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        stop = start + size + (1 if i < extra else 0)
+        ranges.append((start, stop))
+        start = stop
+    return ranges
+
+
+@timer(EXTRACTION_SECONDS, kind='pdf')
+def extract_pdf_pages(file_path, workers=None):
+    """Extract text from every page of a PDF, in parallel for long documents
+    
+    `workers` sets how many shards the pages are split into; they all run on
+    the one shared pool, which never has more than default_workers() processes.
+    """
+    started = time.perf_counter()
+    workers = workers or default_workers()
+
+    with open(file_path, 'rb') as file:
+        page_count = len(PyPDF2.PdfReader(file).pages)
+
+    min_pages = getattr(settings, 'PDF_PARALLEL_MIN_PAGES', 16)
+    if workers <= 1 or page_count < min_pages:
+        # Spreading a handful of pages over processes costs more than it saves
+        pages = extract_page_range(file_path, 0, page_count)
+        workers = 1
+    else:
+        pool = get_pool()
+        # A few shards per worker so one slow (image-heavy) range doesn't stall the rest
+        ranges = shard_pages(page_count, workers * 2)
+        futures = [pool.submit(extract_page_range, file_path, start, stop) for start, stop in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+
+    return ExtractionResult(pages, page_count, time.perf_counter() - started, workers)
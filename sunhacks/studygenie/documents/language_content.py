@@ -0,0 +1,76 @@
+"""
+Shared logic of the language endpoints
+The translate, quiz-lang, flashcards-lang and multilang endpoints exist as
+sync views (views.py) and async views (async_views.py). What is already
+stored, what still needs translating or generating and what the reply looks
+like is decided here; the views only do the database and LLM calls.
+"""
+
+import json
+import time
+
+from django.http import JsonResponse
+
+from .content_store import effective_language
+
+GENERATORS = {  # Content type -> ai_services function writing it directly in a language
+    'summary': 'generate_summary_with_language',
+    'quiz': 'generate_quiz_with_language',
+    'flashcards': 'generate_flashcards_with_language',
+}
+
+
+def read_request(request):
+    """(JSON body, target language) of a language endpoint request"""
+    data = json.loads(request.body)
+    return data, data.get('language', 'en')
+
+
+def stored_summary(doc, language):
+    """The summary in a language if there is one: the original or a saved translation"""
+    if language == effective_language(doc.language):
+        return doc.summary
+    return (doc.summary_translations or {}).get(language)
+
+
+def stored_content(doc, kind, language):
+    """A quiz or flashcard set saved after being generated directly in a language, or None"""
+    return (getattr(doc, doc.LANGUAGE_CONTENT_FIELDS[kind]) or {}).get(language)
+
+
+def generator(kind, asynchronous=False):
+    import ai_services
+    return getattr(ai_services, GENERATORS[kind] + ('_async' if asynchronous else ''))
+
+
+def untranslated_questions(quiz, questions, language):
+    return [q for q in questions if language != quiz.language and language not in q.translations]
+
+
+def untranslated_cards(cards, language):
+    return [card for card in cards if language != card.language and language not in card.translations]
+
+
+def quiz_items(questions, language, difficulty):
+    return [dict(q.get_translation(language), answer_key=q.answer_key, difficulty=difficulty, language=language)
+            for q in questions]
+
+
+def flashcard_items(cards, language):
+    return [card.get_translation(language) for card in cards]
+
+
+def summary_response(translation, language, cached):
+    return JsonResponse({'success': True, 'translation': translation, 'language': language, 'cached': cached})
+
+
+def content_response(key, content, language, cached, started, **extra):
+    """Reply of the quiz and flashcard endpoints, with whether it came from the database and how long it took"""
+    return JsonResponse({
+        'success': True,
+        key: content,
+        'language': language,
+        **extra,
+        'cached': cached,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
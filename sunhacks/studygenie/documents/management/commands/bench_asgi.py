@@ -0,0 +1,144 @@
+import asyncio
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+
+import llm.client
+from documents import async_views, views
+from llm.client import LLMClient
+
+# Both versions of the chatbot endpoint (no login or database needed), mounted for the benchmark only
+urlpatterns = [
+    path('wsgi/chatbot/', views.chatbot_api),
+    path('asgi/chatbot/', async_views.chatbot_api),
+]
+
+REPLY = "Spaced repetition: review after 1 day, then 3 days, then a week."
+
+
+class SlowModel:
+    """GenerativeModel answering after a fixed delay, as a slow Gemini call would"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return type('Reply', (), {'text': REPLY})()
+
+
+def slow_gemini(latency):
+    """httpx transport answering generateContent after the same delay"""
+    async def respond(request):
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={'candidates': [{'content': {'parts': [{'text': REPLY}]}}]})
+    return httpx.MockTransport(respond)
+
+
+class ThreadSampler:
+    """Highest thread count seen while the block runs"""
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count() - 1)
+            time.sleep(0.005)
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+
+
+def summary(latencies, elapsed):
+    ordered = sorted(latencies)
+    return {
+        'rps': len(ordered) / elapsed,
+        'p50': statistics.median(ordered) * 1000,
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'elapsed': elapsed,
+    }
+
+
+class Command(BaseCommand):
+    help = 'Load test of the chat endpoint: sync view on WSGI-style worker threads vs async view on one event loop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Concurrent requests sent at once')
+        parser.add_argument('--latency', type=float, default=0.5, help='Simulated Gemini response time (seconds)')
+        parser.add_argument('--workers', type=int, default=8, help='WSGI worker threads (e.g. gunicorn --threads)')
+
+    def handle(self, *args, **options):
+        count, latency, workers = options['requests'], options['latency'], options['workers']
+        body = json.dumps({'question': 'How should I revise for an exam?'})
+
+        # Concurrency caps as large as the test, so only the serving model limits throughput
+        bench_client = LLMClient(api_key='bench-key', cache=None, max_concurrency=max(workers, 1),
+                                 max_async_concurrency=count, http_transport=slow_gemini(latency))
+        bench_client._model = SlowModel(latency)
+        previous, llm.client._client = llm.client._client, bench_client
+
+        try:
+            with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=['testserver']):
+                wsgi, wsgi_threads = self.run_wsgi(count, workers, body)
+                asgi, asgi_threads = self.run_asgi(count, body)
+        finally:
+            llm.client._client = previous
+
+        self.stdout.write(f"{count} chat requests at once, Gemini answering in {latency * 1000:.0f} ms\n")
+        self.stdout.write(f"{'setup':28} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'wall s':>8} {'threads':>8}")
+        for name, result, threads in ((f"WSGI, {workers} worker threads", wsgi, wsgi_threads),
+                                      ("ASGI, one event loop", asgi, asgi_threads)):
+            self.stdout.write(f"{name:28} {result['rps']:8.1f} {result['p50']:9.0f} {result['p95']:9.0f} "
+                              f"{result['elapsed']:8.2f} {threads:8}")
+        self.stdout.write(self.style.SUCCESS(
+            f"\n  ASGI served {asgi['rps'] / wsgi['rps']:.1f}x the requests per second; "
+            f"p95 latency {wsgi['p95']:.0f} -> {asgi['p95']:.0f} ms"
+        ))
+
+    # Latency is counted from when the burst arrives, so it includes time queued for a worker
+
+    def run_wsgi(self, count, workers, body):
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            response = local.client.post('/wsgi/chatbot/', body, content_type='application/json')
+            assert response.status_code == 200 and 'Spaced repetition' in response.json()['response']
+            return time.perf_counter() - started
+
+        with ThreadSampler() as threads:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                latencies = list(pool.map(one, range(count)))
+            elapsed = time.perf_counter() - started
+        return summary(latencies, elapsed), threads.peak
+
+    def run_asgi(self, count, body):
+        async def one(client, started):
+            response = await client.post('/asgi/chatbot/', body, content_type='application/json')
+            assert response.status_code == 200 and 'Spaced repetition' in response.json()['response']
+            return time.perf_counter() - started
+
+        async def load():
+            client = AsyncClient()
+            started = time.perf_counter()
+            latencies = await asyncio.gather(*(one(client, started) for _ in range(count)))
+            return latencies, time.perf_counter() - started
+
+        with ThreadSampler() as threads:
+            latencies, elapsed = asyncio.run(load())
+        return summary(latencies, elapsed), threads.peak
@@ -0,0 +1,58 @@
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.extraction import default_workers, extract_pdf_pages
+
+
+class Command(BaseCommand):
+    help = 'Benchmark serial vs. parallel PDF extraction on the PDFs in media/documents/'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Directory of PDFs (default: MEDIA_ROOT/documents)')
+        parser.add_argument('--workers', type=int, default=0, help='Parallel worker count (default: PDF_EXTRACTION_WORKERS)')
+        parser.add_argument('--limit', type=int, default=0, help='Only benchmark the first N PDFs')
+
+    def handle(self, *args, **options):
+        directory = Path(options['path'] or os.path.join(settings.MEDIA_ROOT, 'documents'))
+        # Content-addressed blobs live in documents/<aa>/; .incoming only holds partial uploads
+        pdfs = sorted(pdf for pdf in directory.rglob('*.pdf') if '.incoming' not in pdf.parts)
+        if options['limit']:
+            pdfs = pdfs[:options['limit']]
+
+        workers = options['workers'] or default_workers()
+        totals = {'pages': 0, 'serial': 0.0, 'parallel': 0.0}
+
+        # Warm the pool so process start-up isn't charged to the first PDF
+        if pdfs:
+            extract_pdf_pages(str(pdfs[0]), workers=workers)
+
+        self.stdout.write(f"{'file':45} {'pages':>5} {'serial p/s':>11} {'parallel p/s':>13} {'speedup':>8}")
+        for pdf in pdfs:
+            try:
+                serial = extract_pdf_pages(str(pdf), workers=1)
+                parallel = extract_pdf_pages(str(pdf), workers=workers)
+            except Exception as e:
+                self.stdout.write(f"{pdf.name[:45]:45} error: {e}")
+                continue
+
+            if serial.text != parallel.text:
+                self.stdout.write(self.style.WARNING(f"{pdf.name}: parallel text differs from serial text"))
+
+            totals['pages'] += serial.page_count
+            totals['serial'] += serial.elapsed
+            totals['parallel'] += parallel.elapsed
+            speedup = serial.elapsed / parallel.elapsed if parallel.elapsed else 0
+            self.stdout.write(
+                f"{pdf.name[:45]:45} {serial.page_count:5d} {serial.pages_per_second:11.1f} "
+                f"{parallel.pages_per_second:13.1f} {speedup:7.2f}x"
+            )
+
+        if totals['pages']:
+            self.stdout.write(self.style.SUCCESS(
+                f"Total: {totals['pages']} pages, serial {totals['pages'] / totals['serial']:.1f} pages/sec, "
+                f"parallel {totals['pages'] / totals['parallel']:.1f} pages/sec ({workers} workers)"
+            ))
@@ -0,0 +1,176 @@
+import os
+import random
+import re
+import statistics
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from documents.extraction import extract_pdf_pages
+from documents import vectors
+from documents.retrieval import ChunkIndexData, fuse
+from textproc import SEARCH_STOP_WORDS
+
+
+def keyword_overlap_search(text, question, k=5):
+    """The tutor's previous retrieval: word-set overlap against every sentence, per question"""
+    sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 20]
+    question_words = set(question.lower().split())
+    scored = []
+    for sentence in sentences:
+        overlap = len(question_words.intersection(set(sentence.lower().split())))
+        if overlap > 0:
+            scored.append((sentence, overlap))
+    scored.sort(key=lambda x: x[1], reverse=True)
+    return [sentence for sentence, overlap in scored[:k]]
+
+
+def make_queries(text, count, rng):
+    """(question, offset of the sentence it was drawn from) pairs sampled from the text"""
+    sentences = [(m.start(), m.group()) for m in re.finditer(r'[^.]{60,400}', text)]
+    rng.shuffle(sentences)
+    queries = []
+    for offset, sentence in sentences:
+        words = [w for w in re.findall(r'[A-Za-z]{4,}', sentence) if w.lower() not in SEARCH_STOP_WORDS]
+        if len(words) < 5:
+            continue
+        # A question uses a handful of the passage's words, in lower case and shuffled
+        picked = rng.sample(words, 4)
+        queries.append((' '.join(w.lower() for w in picked), offset + len(sentence) - len(sentence.lstrip()),
+                        sentence.strip()))
+        if len(queries) == count:
+            break
+    return queries
+
+
+def morph(word):
+    """A different inflection of a word, as a student might phrase it"""
+    for suffix, replacement in (('ation', 'ate'), ('ing', 'e'), ('ies', 'y'), ('es', ''), ('s', ''), ('e', 'ing')):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[:-len(suffix)] + replacement
+    return word + 's'
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))] if ordered else 0.0
+
+
+class Command(BaseCommand):
+    help = ('Compare the tutor\'s retrieval modes (and the old sentence keyword overlap) '
+            'on the PDFs in media/documents/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Directory of PDFs (default: MEDIA_ROOT/documents)')
+        parser.add_argument('--limit', type=int, default=0, help='Only benchmark the first N PDFs')
+        parser.add_argument('--queries', type=int, default=20, help='Questions sampled per PDF')
+        parser.add_argument('--k', type=int, default=3, help='Passages retrieved per question')
+        parser.add_argument('--seed', type=int, default=7)
+        parser.add_argument('--inflect', action='store_true',
+                            help='Ask with different word forms than the passage uses (e.g. "photosynthetic")')
+
+    def handle(self, *args, **options):
+        directory = Path(options['path'] or os.path.join(settings.MEDIA_ROOT, 'documents'))
+        pdfs = sorted(pdf for pdf in directory.rglob('*.pdf') if '.incoming' not in pdf.parts)
+        if options['limit']:
+            pdfs = pdfs[:options['limit']]
+
+        rng = random.Random(options['seed'])
+        k = options['k']
+        modes = ['bm25', 'vector', 'hybrid'] if vectors.available() else ['bm25']
+        seen_texts = set()
+        old_latency, build_times, embed_times = [], [], []
+        latency = {mode: [] for mode in modes}
+        hits = {mode: 0 for mode in modes}
+        reciprocal_ranks = {mode: [] for mode in modes}
+        old_hits = total = 0
+        index_bytes = vector_bytes = text_bytes = 0
+
+        self.stdout.write(f"{'file':45} {'chunks':>6} {'build ms':>9} {'old hit':>8} "
+                          + ' '.join(f"{mode + ' hit':>11}" for mode in modes))
+        for pdf in pdfs:
+            try:
+                text = extract_pdf_pages(str(pdf), workers=1).text
+            except Exception as e:
+                self.stdout.write(f"{pdf.name[:45]:45} error: {e}")
+                continue
+            if not text or text in seen_texts:
+                continue  # Duplicate uploads of the same file
+            seen_texts.add(text)
+
+            started = time.perf_counter()
+            index = ChunkIndexData.build(text)
+            build_times.append(time.perf_counter() - started)
+            index_bytes += len(index.to_bytes())
+            text_bytes += len(text.encode('utf-8'))
+
+            if vectors.available():
+                started = time.perf_counter()
+                matrix, idf = vectors.embed_passages([text[start:end] for start, end in index.spans])
+                embed_times.append(time.perf_counter() - started)
+                vector_bytes += matrix.nbytes + idf.nbytes
+
+            search = {
+                'bm25': lambda question: index.search(question, k),
+                'vector': lambda question: vectors.rank(matrix, idf, question, k),
+                'hybrid': lambda question: fuse([index.search(question, k * 4),
+                                                 vectors.rank(matrix, idf, question, k * 4)], k),
+            }
+
+            file_old = 0
+            file_hits = {mode: 0 for mode in modes}
+            queries = make_queries(text, options['queries'], rng)
+            for question, offset, sentence in queries:
+                if options['inflect']:
+                    question = ' '.join(morph(word) for word in question.split())
+
+                started = time.perf_counter()
+                old = keyword_overlap_search(text, question, k)
+                old_latency.append(time.perf_counter() - started)
+                if any(sentence[:60] in found or found in sentence for found in old):
+                    file_old += 1
+
+                for mode in modes:
+                    started = time.perf_counter()
+                    results = search[mode](question)
+                    latency[mode].append(time.perf_counter() - started)
+                    rank = next((i for i, (chunk_id, score) in enumerate(results, 1)
+                                 if index.spans[chunk_id][0] <= offset < index.spans[chunk_id][1]), None)
+                    if rank:
+                        file_hits[mode] += 1
+                    reciprocal_ranks[mode].append(1 / rank if rank else 0.0)
+
+            old_hits += file_old
+            for mode in modes:
+                hits[mode] += file_hits[mode]
+            total += len(queries)
+            self.stdout.write(
+                f"{pdf.name[:45]:45} {len(index.spans):6d} {build_times[-1] * 1000:9.1f} "
+                f"{file_old:4d}/{len(queries):<3d} "
+                + ' '.join(f"{file_hits[mode]:7d}/{len(queries):<3d}" for mode in modes)
+            )
+
+        if not total:
+            self.stdout.write(self.style.WARNING("No PDFs with extractable text found"))
+            return
+
+        ms = lambda seconds: seconds * 1000
+        lines = [
+            f"\n{len(seen_texts)} distinct documents, {total} questions, top-{k}"
+            + (" (inflected questions)" if options['inflect'] else ""),
+            f"  {'keyword overlap':16} hit rate {old_hits / total:6.1%},            "
+            f"p50 {ms(statistics.median(old_latency)):.3f} ms, p95 {ms(percentile(old_latency, 0.95)):.3f} ms",
+        ]
+        for mode in modes:
+            lines.append(
+                f"  {mode:16} hit rate {hits[mode] / total:6.1%}, MRR {statistics.mean(reciprocal_ranks[mode]):.3f}, "
+                f"p50 {ms(statistics.median(latency[mode])):.3f} ms, p95 {ms(percentile(latency[mode], 0.95)):.3f} ms"
+            )
+        lines.append(f"  index build p50 {ms(statistics.median(build_times)):.1f} ms, "
+                     f"size {index_bytes / 1024:.0f} KB for {text_bytes / 1024:.0f} KB of text")
+        if embed_times:
+            lines.append(f"  vector build p50 {ms(statistics.median(embed_times)):.1f} ms, "
+                         f"size {vector_bytes / 1024:.0f} KB ({vectors.dimensions()} dimensions)")
+        self.stdout.write(self.style.SUCCESS('\n'.join(lines)))
@@ -0,0 +1,189 @@
+import os
+import re
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ai_services import extract_key_terms_from_text, extract_technical_keywords
+from documents.extraction import extract_pdf_pages
+from textproc import token_stream
+from youtube_services import extract_keywords, extract_keywords_from_summary
+
+
+# The extractors as they were before textproc: each builds its own stop words and re-scans the text
+
+def legacy_key_terms(text):
+    if not text:
+        return []
+    text = re.sub(r'[^a-zA-Z0-9\s\-_]', ' ', text)
+    words = text.split()
+    stop_words = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did',
+        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
+        'document', 'content', 'material', 'information', 'text', 'chapter', 'section', 'page'
+    }
+    key_terms = []
+    for word in words:
+        word_clean = word.strip().lower()
+        if (len(word_clean) > 2 and
+                word_clean not in stop_words and
+                (word.isupper() or
+                 any(char.isdigit() for char in word) or
+                 word_clean in ['programming', 'algorithm', 'function', 'variable', 'loop', 'condition', 'statement'])):
+            key_terms.append(word)
+    return [term for term, count in Counter(key_terms).most_common(15)]
+
+
+def legacy_technical_keywords(text, top_n=5):
+    if not text:
+        return []
+    text = re.sub(r'[^a-zA-Z0-9\s\-]', ' ', text)
+    stop_words = {
+        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did',
+        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
+        'document', 'summary', 'content', 'material', 'information', 'text', 'study', 'learning',
+        'chapter', 'section', 'page', 'book', 'pdf', 'file', 'contains', 'includes', 'covers',
+        'discusses', 'explains', 'describes', 'shows', 'presents', 'provides', 'important',
+        'key', 'main', 'basic', 'essential', 'fundamental', 'concept', 'concepts', 'topic', 'topics'
+    }
+    phrases = []
+    words = text.split()
+    for i in range(len(words) - 1):
+        if len(words[i]) > 2 and len(words[i + 1]) > 2:
+            phrase = f"{words[i].lower()} {words[i + 1].lower()}"
+            if not any(stop in phrase for stop in stop_words):
+                phrases.append(phrase)
+    single_words = []
+    for word in words:
+        word_clean = word.lower().strip()
+        if len(word_clean) > 3 and word_clean not in stop_words and word_clean.isalnum() and not word_clean.isdigit():
+            single_words.append(word_clean)
+    priority_keywords = []
+    for word in words:
+        word_clean = word.strip()
+        if (len(word_clean) >= 2 and
+                (word_clean.isdigit() or any(char.isdigit() for char in word_clean) or word_clean.isupper())):
+            priority_keywords.append(word_clean.lower())
+    phrase_counts, word_counts, priority_counts = Counter(phrases), Counter(single_words), Counter(priority_keywords)
+    final_keywords = []
+    for keyword, count in priority_counts.most_common(2):
+        if keyword not in final_keywords:
+            final_keywords.append(keyword)
+    for phrase, count in phrase_counts.most_common(2):
+        if phrase not in final_keywords and len(final_keywords) < top_n:
+            final_keywords.append(phrase)
+    for word, count in word_counts.most_common(top_n):
+        if word not in final_keywords and len(final_keywords) < top_n:
+            final_keywords.append(word)
+    return final_keywords[:top_n]
+
+
+def legacy_keywords(text, top_n=5):
+    if not text:
+        return []
+    words = re.findall(r'\w+', text.lower())
+    stopwords = {
+        'the', 'is', 'and', 'of', 'in', 'a', 'to', 'for', 'with', 'on', 'at', 'by', 'from', 'as', 'an', 'are', 'was', 'were',
+        'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might',
+        'can', 'this', 'that', 'these', 'those', 'but', 'or', 'if', 'when', 'where', 'why', 'how', 'what', 'which', 'who',
+        'document', 'covers', 'includes', 'provides', 'explains', 'discusses', 'material', 'content', 'information'
+    }
+    filtered = [w for w in words if w not in stopwords and len(w) > 3]
+    return [word for word, _ in Counter(filtered).most_common(top_n)]
+
+
+def legacy_keywords_from_summary(summary_text):
+    if not summary_text:
+        return []
+    text = summary_text.replace('•', '').replace('\n', ' ').lower()
+    stop_words = {
+        'this', 'that', 'these', 'those', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
+        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
+        'should', 'may', 'might', 'can', 'document', 'covers', 'includes', 'provides', 'explains', 'discusses', 'material',
+        'content', 'information', 'key', 'points', 'main', 'important', 'essential', 'basic', 'fundamental'
+    }
+    words = [word.strip('.,!?;:()[]{}"') for word in text.split() if len(word) > 3 and word not in stop_words]
+    word_freq = {}
+    for word in words:
+        word_freq[word] = word_freq.get(word, 0) + 1
+    top_keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:5]
+    return [keyword for keyword, count in top_keywords if count > 1 or len(top_keywords) < 3][:5]
+
+
+EXTRACTORS = [
+    ('key terms', legacy_key_terms, extract_key_terms_from_text),
+    ('technical', legacy_technical_keywords, extract_technical_keywords),
+    ('keywords', legacy_keywords, extract_keywords),
+    ('summary kw', legacy_keywords_from_summary, extract_keywords_from_summary),
+]
+
+
+def cpu_ms(function, repeat):
+    started = time.process_time()
+    for _ in range(repeat):
+        function()
+    return (time.process_time() - started) * 1000 / repeat
+
+
+class Command(BaseCommand):
+    help = 'Throughput of the keyword extractors before and after the shared textproc tokenizer'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=None, help='Directory of PDFs (default: MEDIA_ROOT/documents)')
+        parser.add_argument('--limit', type=int, default=0, help='Only benchmark the first N PDFs')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement')
+
+    def handle(self, *args, **options):
+        directory = Path(options['path'] or os.path.join(settings.MEDIA_ROOT, 'documents'))
+        pdfs = sorted(pdf for pdf in directory.rglob('*.pdf') if '.incoming' not in pdf.parts)
+        if options['limit']:
+            pdfs = pdfs[:options['limit']]
+        repeat = options['repeat']
+
+        texts = []
+        for pdf in pdfs:
+            try:
+                text = extract_pdf_pages(str(pdf), workers=1).text
+            except Exception as e:
+                self.stdout.write(f"{pdf.name[:45]:45} error: {e}")
+                continue
+            if text and text not in texts:
+                texts.append(text)
+        if not texts:
+            self.stdout.write(self.style.WARNING("No PDFs with extractable text found"))
+            return
+        megabytes = sum(len(text.encode('utf-8')) for text in texts) / 1e6
+
+        self.stdout.write(f"{len(texts)} distinct documents, {megabytes:.2f} MB of text\n")
+        self.stdout.write(f"{'extractor':12} {'before ms':>10} {'after ms':>9} {'before MB/s':>12} "
+                          f"{'after MB/s':>11} {'same output':>12}")
+        old_total = new_total = 0
+        for name, legacy, current in EXTRACTORS:
+            old = sum(cpu_ms(lambda: legacy(text), repeat) for text in texts)
+            new = sum(cpu_ms(lambda: (token_stream.cache_clear(), current(text)), repeat) for text in texts)
+            same = sum(legacy(text) == current(text) for text in texts)
+            old_total += old
+            new_total += new
+            self.stdout.write(f"{name:12} {old:10.1f} {new:9.1f} {megabytes / old * 1000:12.1f} "
+                              f"{megabytes / new * 1000:11.1f} {same:>7}/{len(texts)}")
+
+        # An upload runs several extractors on the same text; after, they share one token stream
+        def shared(text):
+            token_stream.cache_clear()
+            for _, _, current in EXTRACTORS:
+                current(text)
+        legacy_all = sum(cpu_ms(lambda: [legacy(text) for _, legacy, _ in EXTRACTORS], repeat) for text in texts)
+        shared_all = sum(cpu_ms(lambda: shared(text), repeat) for text in texts)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\n  each extractor tokenizing for itself: {old_total:.1f} -> {new_total:.1f} ms CPU for the corpus "
+            f"({old_total / new_total:.1f}x)\n"
+            f"  all four over one shared token stream: {legacy_all:.1f} -> {shared_all:.1f} ms "
+            f"({legacy_all / shared_all:.1f}x, {megabytes / legacy_all * 1000:.1f} -> "
+            f"{megabytes / shared_all * 1000:.1f} MB/s)"
+        ))
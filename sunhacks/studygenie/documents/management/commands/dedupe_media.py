@@ -0,0 +1,111 @@
+import hashlib
+import os
+
+from django.core.management.base import BaseCommand
+
+from documents.models import Document
+from documents.storage import document_storage
+
+
+def sha256_of_path(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+class Command(BaseCommand):
+    help = 'Move uploaded documents into content-addressed storage, keeping one copy per distinct file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without touching anything')
+        parser.add_argument('--prune', action='store_true', help='Also delete files under documents/ that no Document references')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        storage = document_storage
+        moved = repointed = missing = 0
+        freed = 0
+        legacy_names = set()
+        seen_hashes = set()
+
+        for doc in Document.objects.exclude(file='').only('id', 'file', 'content_hash').iterator():
+            name = doc.file.name
+            if storage.content_hash(name):
+                continue
+
+            path = storage.path(name)
+            if not os.path.exists(path):
+                missing += 1
+                self.stdout.write(self.style.WARNING(f"Document {doc.id}: file missing ({name})"))
+                continue
+
+            content_hash = sha256_of_path(path)
+            blob_name = storage.blob_name(content_hash, name)
+            blob_path = storage.path(blob_name)
+            legacy_names.add(name)
+
+            if content_hash in seen_hashes or os.path.exists(blob_path):
+                repointed += 1
+                freed += os.path.getsize(path)
+            else:
+                moved += 1
+                seen_hashes.add(content_hash)
+                if not dry_run:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    # Copy-then-rename keeps the legacy file until every row has been repointed
+                    with open(path, 'rb') as src, open(blob_path + '.part', 'wb') as dst:
+                        for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                            dst.write(chunk)
+                    os.replace(blob_path + '.part', blob_path)
+
+            if not dry_run:
+                Document.objects.filter(pk=doc.pk).update(
+                    file=blob_name,
+                    content_hash=doc.content_hash or content_hash,
+                )
+
+        # Legacy files are safe to remove once no Document points at them
+        removed = 0
+        for name in sorted(legacy_names):
+            if Document.objects.filter(file=name).exists() and not dry_run:
+                continue
+            removed += 1
+            if not dry_run:
+                storage.delete(name)
+
+        if options['prune']:
+            removed += self.prune(storage, dry_run)
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{moved} blobs created, {repointed} duplicates re-pointed, "
+            f"{removed} files removed, {freed / (1024 * 1024):.1f} MB of duplicates freed, {missing} missing"
+        ))
+
+    def prune(self, storage, dry_run):
+        """Delete unreferenced files under documents/, including orphaned blobs
+        
+        Blobs stored or re-used within RECENT_USE_GRACE are kept: an upload writes
+        its blob before it creates the Document that references it.
+        """
+        referenced = set(Document.objects.exclude(file='').values_list('file', flat=True))
+        removed = 0
+        root = storage.path('documents')
+        if not os.path.isdir(root):
+            return 0
+
+        for directory, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace('\\', '/')
+                if name not in referenced:
+                    if storage.recently_used(name):
+                        self.stdout.write(f"Unreferenced but recently used, kept: {name}")
+                        continue
+                    removed += 1
+                    self.stdout.write(f"Unreferenced: {name}")
+                    if not dry_run:
+                        os.remove(path)
+        return removed
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from fake_youtube import FakeYouTube
+
+
+class Command(BaseCommand):
+    help = 'Serve a local stand-in for the YouTube search API (set YOUTUBE_API_BASE to the printed URL)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+        parser.add_argument('--latency', type=float, default=0.2, help='Seconds before each response')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 503')
+        parser.add_argument('--seed', type=int, default=None, help='Seed for repeatable errors')
+
+    def handle(self, *args, **options):
+        server = FakeYouTube(port=options['port'], latency=options['latency'],
+                             error_rate=options['error_rate'], seed=options['seed'])
+        self.stdout.write(f"Fake YouTube search API on {server.base_url}/search")
+        self.stdout.write(f"  export YOUTUBE_API_BASE={server.base_url} YOUTUBE_API_KEY=fake")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            self.stdout.write(f"Served {server.requests} search requests")
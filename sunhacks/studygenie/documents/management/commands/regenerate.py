@@ -0,0 +1,155 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Length
+
+from documents.content_store import summary_key
+from documents.models import Document, ExtractedContent
+from documents.tasks import generate_document_summary
+from llm import cache_bypass, lane
+from llm.accounting import tagged
+from llm.fanout import fan_out
+from llm.ratelimit import get_limiter
+from llm.summarize import estimate_calls
+
+GENERIC_MARKERS = ('approximately', 'this document contains')  # Phrases of the old template summaries
+
+
+def regenerate_summary(doc, local):
+    """New summary for one document (runs on a pool thread)"""
+    from ai_services import generate_enhanced_fallback_summary
+    with tagged(document=doc, user=doc.user_id, stage='regenerate'):
+        if local:
+            return generate_enhanced_fallback_summary(doc.extracted_text)
+        return generate_document_summary(doc.extracted_text, doc.new_language)
+
+
+class Command(BaseCommand):
+    help = ('Regenerate document summaries on a worker pool in the backfill lane, skipping those already '
+            'made from the same content and summary version; resumes where an interrupted run stopped')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=0, help='Regenerate at most N summaries')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Concurrent documents (default: LLM_FANOUT_WORKERS)')
+        parser.add_argument('--batch-size', type=int, default=20, help='Documents read and written per batch')
+        parser.add_argument('--local', action='store_true',
+                            help='Content-based summaries only, no LLM calls')
+        parser.add_argument('--generic-only', action='store_true',
+                            help='Only documents whose summary is an old template ("approximately ...")')
+        parser.add_argument('--force', action='store_true', help='Also redo summaries that are up to date')
+        parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint of an interrupted run')
+        parser.add_argument('--checkpoint', default=os.path.join(settings.BASE_DIR, '.regenerate-checkpoint.json'),
+                            help='Progress file, removed when a run completes')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        local, path = options['local'], options['checkpoint']
+        run = {'local': local, 'generic_only': options['generic_only'], 'force': options['force']}
+        after = 0
+        checkpoint = None if options['restart'] else self.load_checkpoint(path)
+        if checkpoint and checkpoint.get('run') == run:
+            after = checkpoint['after']
+            self.stdout.write(f"Resuming after document {after} (--restart to start over)")
+
+        documents = (Document.objects.filter(pk__gt=after)
+                     .annotate(text_length=Length('extracted_text')).filter(text_length__gt=50)
+                     .only('id', 'user_id', 'title', 'extracted_text', 'content_hash', 'language', 'summary_key')
+                     .order_by('pk'))
+        if options['generic_only']:
+            generic = Document.objects.none()
+            for marker in GENERIC_MARKERS:
+                generic = generic | Document.objects.filter(summary__icontains=marker)
+            documents = documents.filter(pk__in=generic.values('pk'))
+
+        limiter = None if local else get_limiter()
+        self.summaries = {}  # summary key -> summary made this run, for documents sharing a file
+        updated = skipped = 0
+        started = time.perf_counter()
+        batch = []
+        finished = True
+        # Regenerating means asking again, not reading back the cached answer; chat goes first
+        with cache_bypass(), lane('backfill'):
+            for doc in documents.iterator(chunk_size=options['batch_size']):
+                doc.new_language = 'en' if doc.language == 'auto' else doc.language
+                doc.new_key = summary_key(doc, doc.extracted_text, doc.new_language, local)
+                if doc.summary_key == doc.new_key and not options['force']:
+                    skipped += 1
+                    continue
+                batch.append(doc)
+                if options['limit'] and updated + len(batch) >= options['limit']:
+                    finished = False
+                    break
+                if len(batch) >= options['batch_size']:
+                    updated += self.run_batch(batch, local, limiter, options['workers'])
+                    self.save_checkpoint(path, run, batch[-1].pk)
+                    batch = []
+            if batch:
+                updated += self.run_batch(batch, local, limiter, options['workers'])
+
+        if not finished:
+            self.save_checkpoint(path, run, batch[-1].pk)  # The next run carries on from here
+        elif os.path.exists(path):
+            os.remove(path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Regenerated {updated} summaries, {skipped} already up to date ({time.perf_counter() - started:.1f}s)"))
+
+    def run_batch(self, batch, local, limiter, workers):
+        """Regenerate a batch concurrently and write it back with two bulk updates
+        
+        Documents with the same file and language share one summary: it is
+        generated for the first of them only (in this run) and copied to the rest.
+        """
+        todo = {}
+        for doc in batch:
+            if doc.new_key not in self.summaries:
+                todo.setdefault(doc.new_key, doc)
+        if limiter is not None:
+            # Shares the LLM budget with the chat endpoints; long documents take a call per chunk
+            calls = sum(estimate_calls(doc.extracted_text) for doc in todo.values())
+            waited = sum(limiter.spend_budget() for _ in range(calls))
+            if waited:
+                self.stdout.write(f"  waited {waited:.1f}s for the LLM budget")
+        for doc, summary, error in fan_out(lambda doc: regenerate_summary(doc, local), todo.values(), workers):
+            if error or not summary:
+                self.stderr.write(f"  {doc.title}: {error or 'empty summary'}")
+                continue
+            self.summaries[doc.new_key] = summary
+            self.stdout.write(f"  {doc.title}: {len(summary)} chars")
+
+        done = []
+        for doc in batch:
+            if doc.new_key in self.summaries:
+                doc.summary, doc.summary_key = self.summaries[doc.new_key], doc.new_key
+                done.append(doc)
+        Document.objects.bulk_update(done, ['summary', 'summary_key'])
+
+        # Later uploads of the same file restore the new summary, if the cached one is in the same language
+        cached = ExtractedContent.objects.in_bulk([doc.content_hash for doc in done if doc.content_hash],
+                                                  field_name='content_hash')
+        refreshed = {}
+        for doc in done:
+            entry = cached.get(doc.content_hash)
+            if entry is not None and entry.summary_language == doc.new_language:
+                entry.summary = doc.summary
+                refreshed[entry.pk] = entry
+        ExtractedContent.objects.bulk_update(refreshed.values(), ['summary'])
+        return len(done)
+
+    def load_checkpoint(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read checkpoint {path}: {e} (--restart to ignore it)")
+
+    def save_checkpoint(self, path, run, after):
+        with open(path + '.part', 'w') as file:
+            json.dump({'run': run, 'after': after}, file)
+        os.replace(path + '.part', path)  # Never a half-written checkpoint
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:39
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0003_document_detected_language_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentStage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(choices=[('extract', 'Extracting text'), ('summary', 'Generating summary'), ('quiz', 'Creating quiz'), ('flashcards', 'Building flashcards'), ('translations', 'Translating content'), ('videos', 'Finding videos')], max_length=20)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('retrying', 'Retrying'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='documents.document')),
+            ],
+            options={
+                'unique_together': {('document', 'name')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0004_documentstage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='page_offsets',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0005_document_page_offsets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExtractedContent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('extracted_text', models.TextField(blank=True)),
+                ('page_offsets', models.JSONField(blank=True, default=list)),
+                ('detected_language', models.CharField(default='en', max_length=5)),
+                ('key_terms', models.JSONField(blank=True, default=list)),
+                ('summary', models.TextField(blank=True)),
+                ('summary_language', models.CharField(blank=True, max_length=5)),
+                ('quiz', models.JSONField(blank=True, default=list)),
+                ('flashcards', models.JSONField(blank=True, default=list)),
+                ('youtube_videos', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:43
+
+from django.db import migrations, models
+import documents.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0006_extractedcontent'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=documents.storage.get_document_storage, upload_to='documents/'),
+        ),
+    ]
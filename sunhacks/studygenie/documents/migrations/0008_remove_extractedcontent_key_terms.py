@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0007_document_file_storage'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='extractedcontent',
+            name='key_terms',
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0008_remove_extractedcontent_key_terms'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('version', models.IntegerField(default=1)),
+                ('chunk_count', models.IntegerField(default=0)),
+                ('data', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0009_chunkindex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='flashcard_translations',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='quiz_translations',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0010_language_content'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_hash', models.CharField(max_length=64)),
+                ('language', models.CharField(max_length=5)),
+                ('source_text', models.TextField()),
+                ('translation', models.TextField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('source_hash', 'language')},
+            },
+        ),
+    ]
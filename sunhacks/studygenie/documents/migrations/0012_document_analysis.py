@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0011_translation_segment'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentAnalysis',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('text_hash', models.CharField(db_index=True, max_length=64)),
+                ('version', models.IntegerField(default=1)),
+                ('key_terms', models.JSONField(blank=True, default=list)),
+                ('main_topics', models.JSONField(blank=True, default=list)),
+                ('document_type', models.CharField(blank=True, max_length=100)),
+                ('language', models.CharField(default='en', max_length=5)),
+                ('cpu_ms', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('documents', '0012_document_analysis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='summary_key',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
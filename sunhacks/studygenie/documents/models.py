@@ -1,5 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
+from studygenie.db import set_json_keys
+from .storage import get_document_storage
 import json
 
 class Document(models.Model):
@@ -15,10 +17,15 @@ class Document(models.Model):
     
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=get_document_storage)  # Deduplicated by content hash
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # SHA-256 of the uploaded file
     extracted_text = models.TextField(blank=True)
+    page_offsets = models.JSONField(default=list, blank=True)  # [[page_number, offset in extracted_text], ...]
     summary = models.TextField(blank=True)
+    summary_key = models.CharField(max_length=100, blank=True)  # What the summary was made from, see documents/tasks.summary_key
     summary_translations = models.JSONField(default=dict, blank=True)  # Store translations
+    quiz_translations = models.JSONField(default=dict, blank=True)  # {lang: [question dicts]} generated in that language
+    flashcard_translations = models.JSONField(default=dict, blank=True)  # {lang: [card dicts]} generated in that language
     youtube_videos = models.TextField(blank=True)  # Store as JSON
     created_at = models.DateTimeField(auto_now_add=True)
     language = models.CharField(max_length=5, choices=LANGUAGE_CHOICES, default='auto')
@@ -41,6 +48,15 @@ class Document(models.Model):
         """Set YouTube videos from Python list"""
         self.youtube_videos = json.dumps(videos)
     
+    def get_page_number(self, offset):
+        """Get the PDF page number that a character offset in extracted_text falls on"""
+        page_number = None
+        for number, start in self.page_offsets:
+            if start > offset:
+                break
+            page_number = number
+        return page_number
+    
     def get_summary_in_language(self, lang_code):
         """Get summary in specific language"""
         if lang_code == self.detected_language:
@@ -49,7 +65,132 @@ class Document(models.Model):
     
     def set_summary_translation(self, lang_code, translation):
         """Set summary translation for specific language"""
-        if not self.summary_translations:
-            self.summary_translations = {}
-        self.summary_translations[lang_code] = translation
-        self.save()
\ No newline at end of file
+        self.set_language_content('summary', lang_code, translation)
+    
+    LANGUAGE_CONTENT_FIELDS = {
+        'summary': 'summary_translations',
+        'quiz': 'quiz_translations',
+        'flashcards': 'flashcard_translations',
+    }
+    
+    def set_language_content(self, kind, lang_code, content):
+        """Save a summary, quiz or flashcard set generated in a language (only that key is written)"""
+        field = self.LANGUAGE_CONTENT_FIELDS[kind]
+        setattr(self, field, dict(getattr(self, field) or {}, **{lang_code: content}))
+        set_json_keys(Document, field, lang_code, {self.pk: content})  # Keeps languages saved meanwhile
+    
+    def set_stage(self, name, state, error=''):
+        """Record the state of one processing stage for this document"""
+        DocumentStage.objects.update_or_create(
+            document=self,
+            name=name,
+            defaults={'state': state, 'error': error[:1000]},
+        )
+
+    def set_stages(self, names, state):
+        """Record the same state for several stages at once (one query)"""
+        DocumentStage.objects.bulk_create(
+            [DocumentStage(document=self, name=name, state=state) for name in names],
+            update_conflicts=True, unique_fields=['document', 'name'], update_fields=['state', 'error', 'updated_at'],
+        )
+
+    def get_stages(self):
+        """Get processing stage states as a {name: state} dict"""
+        return dict(self.stages.values_list('name', 'state'))
+
+class DocumentStage(models.Model):
+    STAGE_CHOICES = [
+        ('extract', 'Extracting text'),
+        ('summary', 'Generating summary'),
+        ('quiz', 'Creating quiz'),
+        ('flashcards', 'Building flashcards'),
+        ('translations', 'Translating content'),
+        ('videos', 'Finding videos'),
+    ]
+
+    STATE_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('retrying', 'Retrying'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='stages')
+    name = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default='pending')
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['document', 'name']
+
+    def __str__(self):
+        return f"{self.document_id}:{self.name}={self.state}"
+
+class ExtractedContent(models.Model):
+    """Processing results shared by every Document whose file has the same SHA-256"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    extracted_text = models.TextField(blank=True)
+    page_offsets = models.JSONField(default=list, blank=True)
+    detected_language = models.CharField(max_length=5, default='en')
+    summary = models.TextField(blank=True)
+    summary_language = models.CharField(max_length=5, blank=True)  # Language preference the summary was made for
+    quiz = models.JSONField(default=list, blank=True)  # Medium difficulty questions
+    flashcards = models.JSONField(default=list, blank=True)
+    youtube_videos = models.TextField(blank=True)  # Same JSON format as Document.youtube_videos
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.content_hash[:12]
+    
+    def is_complete_for(self, language):
+        """Whether every stage can be restored from here for the given summary language"""
+        return bool(self.extracted_text and self.summary and self.summary_language == language
+                    and self.quiz and self.flashcards)
+
+
+class ChunkIndex(models.Model):
+    """Pickled BM25 passage index of an extracted text (see documents/retrieval.py)"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    version = models.IntegerField(default=1)
+    chunk_count = models.IntegerField(default=0)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.chunk_count} chunks)"
+
+
+class DocumentAnalysis(models.Model):
+    """Key terms, topics, type and language of an extracted text (see documents/analysis.py)"""
+    content_hash = models.CharField(max_length=64, unique=True)
+    text_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 of the analyzed text
+    version = models.IntegerField(default=1)
+    key_terms = models.JSONField(default=list, blank=True)
+    main_topics = models.JSONField(default=list, blank=True)
+    document_type = models.CharField(max_length=100, blank=True)
+    language = models.CharField(max_length=5, default='en')
+    cpu_ms = models.FloatField(default=0)  # Time the analysis took
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} ({self.document_type})"
+
+
+class TranslationSegment(models.Model):
+    """Translation memory: one sentence or bullet and its translation (see documents/translation.py)"""
+    source_hash = models.CharField(max_length=64)  # SHA-256 of the whitespace-normalized source
+    language = models.CharField(max_length=5)
+    source_text = models.TextField()
+    translation = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ['source_hash', 'language']
+
+    def __str__(self):
+        return f"{self.language}: {self.source_text[:50]}"
@@ -0,0 +1,215 @@
+"""
+BM25 passage index for the AI tutor
+The extracted text is cut into overlapping word windows once, at extraction
+time. Each window is tokenized (textproc.search_terms: casefolded words in
+any script; English stop words dropped and light suffix stemming) into a
+compact postings table that is pickled
+into a ChunkIndex row keyed by content hash. Answering a question is then a
+postings lookup plus BM25 scoring of the few chunks that share a term with it.
+
+The same passages can also be searched by vector similarity (vectors.py) or
+by a fusion of both rankings; see search_document().
+"""
+
+import hashlib
+import heapq
+import math
+import pickle
+import re
+import threading
+import zlib
+from array import array
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+from textproc import search_terms as tokenize
+
+INDEX_VERSION = 2  # 2: terms in every script, not just ASCII
+
+WORD_RE = re.compile(r'\S+')
+
+# BM25 parameters (the usual defaults)
+K1 = 1.5
+B = 0.75
+
+MODES = ('bm25', 'vector', 'hybrid')
+RRF_K = 60  # Reciprocal rank fusion constant
+
+_loaded = OrderedDict()  # index key -> ChunkIndexData, most recently used last
+_loaded_lock = threading.Lock()
+LOADED_INDEXES = 32
+
+
+def chunk_spans(text, size=None, overlap=None):
+    """(start, end) character spans of overlapping windows of `size` words"""
+    size = size or getattr(settings, 'RETRIEVAL_CHUNK_WORDS', 80)
+    overlap = overlap if overlap is not None else getattr(settings, 'RETRIEVAL_CHUNK_OVERLAP', 20)
+    words = [match.span() for match in WORD_RE.finditer(text)]
+    if not words:
+        return []
+
+    step = max(1, size - overlap)
+    starts = list(range(0, max(len(words) - size, 0) + 1, step))
+    if starts[-1] + size < len(words):
+        # End on a full-size window rather than a short tail that BM25 would over-score
+        starts.append(len(words) - size)
+
+    spans = []
+    for first in starts:
+        last = min(first + size, len(words)) - 1
+        spans.append((words[first][0], words[last][1]))
+    return spans
+
+
+class ChunkIndexData:
+    """In-memory form of a ChunkIndex: chunk spans, lengths and postings"""
+
+    def __init__(self, text_length, spans, lengths, postings):
+        self.text_length = text_length  # Guards against an index of a different extraction
+        self.spans = spans  # [(start, end), ...] into extracted_text
+        self.lengths = lengths  # array('I') of token counts per chunk
+        self.postings = postings  # term -> (array('I') chunk ids, array('H') term frequencies)
+        self.average_length = (sum(lengths) / len(lengths)) if lengths else 0.0
+
+    @classmethod
+    def build(cls, text):
+        spans = chunk_spans(text)
+        lengths = array('I')
+        ids = {}
+        for chunk_id, (start, end) in enumerate(spans):
+            counts = Counter(tokenize(text[start:end]))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                entry = ids.get(term)
+                if entry is None:
+                    entry = ids[term] = (array('I'), array('H'))
+                entry[0].append(chunk_id)
+                entry[1].append(min(tf, 65535))
+        return cls(len(text), spans, lengths, ids)
+
+    def to_bytes(self):
+        return zlib.compress(pickle.dumps((INDEX_VERSION, self.text_length, self.spans, self.lengths, self.postings),
+                                          protocol=pickle.HIGHEST_PROTOCOL))
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = pickle.loads(zlib.decompress(data))
+        if payload[0] != INDEX_VERSION:
+            return None
+        return cls(*payload[1:])
+
+    def search(self, question, k=3):
+        """Top-k [(chunk_id, score), ...] for a question, best first"""
+        chunk_count = len(self.spans)
+        if not chunk_count:
+            return []
+
+        scores = {}
+        for term in set(tokenize(question)):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            chunk_ids, tfs = entry
+            df = len(chunk_ids)
+            idf = math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+            for chunk_id, tf in zip(chunk_ids, tfs):
+                norm = K1 * (1 - B + B * self.lengths[chunk_id] / self.average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+def index_key(doc):
+    """Indexes are shared by content: the file hash, or a hash of the text for older uploads"""
+    if doc.content_hash:
+        return doc.content_hash
+    return hashlib.sha256(doc.extracted_text.encode('utf-8')).hexdigest()
+
+
+def _remember_loaded(key, index):
+    with _loaded_lock:
+        _loaded[key] = index
+        _loaded.move_to_end(key)
+        while len(_loaded) > LOADED_INDEXES:
+            _loaded.popitem(last=False)
+
+
+def build_index(doc):
+    """Build and store the passage index for a document's extracted text"""
+    from .models import ChunkIndex
+
+    key = index_key(doc)
+    index = ChunkIndexData.build(doc.extracted_text or '')
+    ChunkIndex.objects.update_or_create(content_hash=key, defaults={
+        'version': INDEX_VERSION,
+        'chunk_count': len(index.spans),
+        'data': index.to_bytes(),
+    })
+    _remember_loaded(key, index)
+
+    from . import vectors
+    if vectors.available() and getattr(settings, 'TUTOR_RETRIEVAL_MODE', 'bm25') != 'bm25':
+        vectors.build_vectors(doc, index)  # Otherwise built on the first vector search
+    return index
+
+
+def get_index(doc):
+    """The document's index: from memory, else from the database, else built now"""
+    from .models import ChunkIndex
+
+    key = index_key(doc)
+    text_length = len(doc.extracted_text or '')
+    with _loaded_lock:
+        index = _loaded.get(key)
+        if index is not None and index.text_length == text_length:
+            _loaded.move_to_end(key)
+            return index
+
+    data = (ChunkIndex.objects.filter(content_hash=key, version=INDEX_VERSION)
+            .values_list('data', flat=True).first())
+    index = ChunkIndexData.from_bytes(bytes(data)) if data is not None else None
+    if index is None or index.text_length != text_length:
+        return build_index(doc)
+    _remember_loaded(key, index)
+    return index
+
+
+def fuse(rankings, k):
+    """Reciprocal rank fusion of several [(chunk_id, score), ...] rankings"""
+    fused = {}
+    for ranking in rankings:
+        for rank, (chunk_id, score) in enumerate(ranking, 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank)
+    return heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+
+
+def search_document(doc, question, k=3, mode=None):
+    """Top-k passages for a question as [(text, score, offset), ...], best first
+    
+    mode is 'bm25' (keyword), 'vector' (dense) or 'hybrid' (both, fused);
+    it defaults to TUTOR_RETRIEVAL_MODE. Without numpy every mode is BM25.
+    """
+    if not doc.extracted_text:
+        return []
+    mode = mode if mode in MODES else getattr(settings, 'TUTOR_RETRIEVAL_MODE', 'bm25')
+    index = get_index(doc)
+
+    from . import vectors
+    if mode != 'bm25' and not vectors.available():
+        mode = 'bm25'
+
+    if mode == 'vector':
+        ranking = vectors.search(doc, index, question, k)
+    elif mode == 'hybrid':
+        # Fuse deeper lists than we return so each side can promote the other's near misses
+        depth = k * 4
+        ranking = fuse([index.search(question, depth), vectors.search(doc, index, question, depth)], k)
+    else:
+        ranking = index.search(question, k)
+
+    results = []
+    for chunk_id, score in ranking:
+        start, end = index.spans[chunk_id]
+        results.append((doc.extracted_text[start:end], score, start))
+    return results
@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Document
+from .storage import RECENT_USE_GRACE, document_storage
+
+
+def release_blob(name):
+    """Delete a blob if nothing uses it, retrying after the grace period if it was just re-used"""
+    if document_storage.release(name) == 'recent':
+        from jobs.queue import enqueue
+        enqueue('release_blob', payload={'name': name}, delay=RECENT_USE_GRACE)
+
+
+@receiver(post_delete, sender=Document)
+def release_document_file(sender, instance, **kwargs):
+    """Delete the stored blob when the last Document using it is deleted"""
+    if instance.file and instance.file.storage is document_storage:
+        # Only once the delete is committed: a rolled-back delete still needs its file
+        name = instance.file.name
+        transaction.on_commit(lambda: release_blob(name))
@@ -0,0 +1,103 @@
+"""
+Content-addressed storage for uploaded documents
+Every distinct file is stored once as documents/<aa>/<sha256><ext>, no matter
+how many Documents point at it. A blob is deleted only when the last Document
+referencing it goes away.
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+import time
+
+from django.core.files.storage import FileSystemStorage
+
+BLOB_NAME_RE = re.compile(r'^(?P<prefix>.*/)?(?P<shard>[0-9a-f]{2})/(?P<hash>[0-9a-f]{64})(?P<ext>\.[a-z0-9]+)?$')
+
+# Blobs re-used by an upload this recently are not deleted yet, so a delete can't
+# race with an upload of the same file that hasn't created its Document yet.
+# Their release is retried once the grace period is over (see signals.py).
+RECENT_USE_GRACE = 60
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def blob_name(self, content_hash, original_name):
+        directory = os.path.dirname(original_name)
+        ext = os.path.splitext(original_name)[1].lower()
+        return os.path.join(directory, content_hash[:2], content_hash + ext).replace('\\', '/')
+
+    def content_hash(self, name):
+        """SHA-256 encoded in a blob name, or None for legacy (pre-dedup) names"""
+        match = BLOB_NAME_RE.match(name or '')
+        return match.group('hash') if match else None
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed in _save()
+        return name
+
+    def _save(self, name, content):
+        incoming_dir = self.path('.incoming')
+        os.makedirs(incoming_dir, exist_ok=True)
+
+        # Stream to a temp file while hashing, then move it into place
+        hasher = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=incoming_dir)
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks():
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+
+            final_name = self.blob_name(hasher.hexdigest(), name)
+            final_path = self.path(final_name)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+
+            if os.path.exists(final_path):
+                os.utime(final_path)  # Mark as recently used (see RECENT_USE_GRACE)
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, final_path)
+                if self.file_permissions_mode is not None:
+                    os.chmod(final_path, self.file_permissions_mode)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return final_name
+
+    def reference_count(self, name):
+        """Number of Documents whose file is this blob"""
+        from .models import Document
+        return Document.objects.filter(file=name).count()
+
+    def recently_used(self, name):
+        """Whether an upload stored or re-used this blob within RECENT_USE_GRACE seconds"""
+        try:
+            return time.time() - os.path.getmtime(self.path(name)) < RECENT_USE_GRACE
+        except OSError:
+            return False
+
+    def release(self, name):
+        """Delete a blob once no Document references it any more
+        
+        Returns 'deleted', 'kept' (still referenced, or already gone) or 'recent'
+        (unreferenced but inside the grace period; the caller retries later).
+        """
+        if not name or self.reference_count(name) > 0 or not self.exists(name):
+            return 'kept'
+        if self.recently_used(name):
+            return 'recent'
+        self.delete(name)
+        return 'deleted'
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
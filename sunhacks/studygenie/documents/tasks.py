@@ -0,0 +1,289 @@
+"""
+Background processing stages for uploaded documents
+Each stage is its own retryable job: extract -> summary -> (quiz, flashcards, translations, videos)
+"""
+
+import functools
+
+from jobs.queue import enqueue, job_handler
+from llm.accounting import tagged
+from llm.scheduler import lane
+from studygenie.metrics import STAGE_SECONDS, timed
+from .content_store import (cached_for_language, effective_language, get_cached, remember,
+                            remember_derived, restore_document, summary_key)
+from .models import Document
+from .analysis import analyze_document, get_analysis
+from .retrieval import build_index, get_index
+from .views import extract_pdf_with_pages, extract_text_from_image, generate_ai_summary, pdf_error_text
+
+
+
+def document_stage(name):
+    """Register a job handler for a document stage and keep its DocumentStage row in sync"""
+    def give_up(job):
+        # The worker died on the last attempt, so the wrapper below never saw it fail
+        if job.document_id:
+            fail_stage(job.document, name, job.last_error)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(job):
+            doc = job.document
+            doc.set_stage(name, 'running')
+            try:
+                with tagged(document=doc, user=doc.user_id, stage=name), lane('pipeline'), \
+                        timed(STAGE_SECONDS, stage=name):
+                    func(job, doc)
+            except Exception as e:
+                # The queue decides whether to retry; mirror that on the stage
+                if job.attempts >= job.max_attempts:
+                    fail_stage(doc, name, str(e))
+                else:
+                    doc.set_stage(name, 'retrying', error=str(e))
+                raise
+            doc.set_stage(name, 'done')
+        return job_handler(name, on_give_up=give_up)(wrapper)
+    return decorator
+
+
+def fail_stage(doc, name, error):
+    doc.set_stage(name, 'failed', error=error)
+    if name in ('extract', 'summary'):
+        Document.objects.filter(pk=doc.pk).update(status='error')
+
+
+def start_processing(doc, multilang_languages=None):
+    """Queue the processing pipeline for a freshly uploaded document
+    
+    Returns True when the document was restored entirely from the content
+    cache and there is nothing left to wait for.
+    """
+    cached = get_cached(doc.content_hash)
+    if cached and cached.is_complete_for(effective_language(doc.language)):
+        restore_document(doc, cached)
+        if multilang_languages:
+            doc.set_stage('translations', 'pending')
+            enqueue('translations', document=doc, payload={'multilang': multilang_languages})
+        return True
+
+    # Every stage the pipeline will run gets its row now, so progress never goes backwards
+    stages = ['extract', 'summary', 'quiz', 'flashcards', 'videos']
+    if multilang_languages:
+        stages.append('translations')
+    doc.set_stages(stages, 'pending')
+    Document.objects.filter(pk=doc.pk).update(status='processing')
+    enqueue('extract', document=doc, payload={'multilang': multilang_languages or []})
+    return False
+
+
+@document_stage('extract')
+def extract_stage(job, doc):
+    # STEP 1: Extract Text
+    cached = get_cached(doc.content_hash)
+    if cached and cached.extracted_text:
+        doc.extracted_text = cached.extracted_text
+        doc.page_offsets = cached.page_offsets
+        doc.save(update_fields=['extracted_text', 'page_offsets'])
+        get_index(doc)  # Shared by content hash, so normally already built
+        analyze_document(doc)
+        print(f"[SUCCESS] Reused extracted text for {doc.title} from content cache")
+        enqueue('summary', document=doc, payload=job.payload)
+        return
+
+    file_path = doc.file.path
+    name = doc.title.lower()
+    page_offsets = []
+    cacheable = True
+
+    if name.endswith('.pdf'):
+        try:
+            extracted_text, page_offsets = extract_pdf_with_pages(file_path, raise_errors=True)
+        except Exception as e:
+            if job.attempts < job.max_attempts:
+                raise  # Possibly transient (e.g. a broken process pool): let the queue retry
+            # Out of retries: carry on with the error text, but never cache it
+            extracted_text = pdf_error_text(e)
+            cacheable = False
+    elif name.endswith(('.png', '.jpg', '.jpeg')):
+        extracted_text = extract_text_from_image(file_path)
+        cacheable = not extracted_text.startswith(('Error processing image', 'OCR functionality requires'))
+    else:
+        extracted_text = "Unsupported file format."
+
+    if len(extracted_text.strip()) < 10:
+        extracted_text += " This document may contain images or formatting issues."
+
+    doc.extracted_text = extracted_text
+    doc.page_offsets = page_offsets
+    doc.save(update_fields=['extracted_text', 'page_offsets'])
+    if cacheable:
+        remember(doc.content_hash, extracted_text=extracted_text, page_offsets=page_offsets)
+        build_index(doc)  # Passage index for the tutor
+        analyze_document(doc)  # Key terms, topics, type and language, read by every later stage
+    print(f"[SUCCESS] Text extracted for {doc.title}: {len(extracted_text)} characters")
+
+    enqueue('summary', document=doc, payload=job.payload)
+
+
+@document_stage('summary')
+def summary_stage(job, doc):
+    # STEP 2: Generate Enhanced AI Summary (CRITICAL - Must work independently)
+    print(f"Generating enhanced AI summary for {doc.title}")
+    extracted_text = doc.extracted_text
+    language_preference = doc.language
+
+    # Detect language if auto-detect is selected
+    if language_preference == 'auto':
+        try:
+            doc.detected_language = get_analysis(extracted_text).language
+        except Exception:
+            doc.detected_language = 'en'
+        language_preference = 'en'  # Default to English for processing
+
+    cached = get_cached(doc.content_hash)
+    if cached and cached.summary and cached.summary_language == effective_language(language_preference):
+        summary = cached.summary
+        print(f"[SUCCESS] Reused summary for {doc.title} from content cache")
+    else:
+        summary = generate_document_summary(extracted_text, language_preference)
+        remember(doc.content_hash, summary=summary, summary_language=effective_language(language_preference),
+                 detected_language=doc.detected_language)
+
+    # STEP 3: Save Core Document Data FIRST (before other processing)
+    doc.summary = summary
+    doc.summary_key = summary_key(doc, extracted_text, language_preference)
+    doc.language = language_preference
+    doc.status = 'processed'
+    doc.save(update_fields=['summary', 'summary_key', 'language', 'detected_language', 'status'])
+    print(f"[SUCCESS] Document saved with summary: {doc.id}")
+
+    # Remaining stages only depend on the summary and run independently of each other
+    follow_up = ['quiz', 'flashcards', 'videos']
+    if job.payload.get('multilang'):
+        follow_up.append('translations')
+
+    for stage in follow_up:
+        enqueue(stage, document=doc, payload=job.payload)
+
+
+def generate_document_summary(extracted_text, language_preference):
+    """Summary in the preferred language, falling back to content-based summaries"""
+    try:
+        # Generate summary in preferred language
+        if language_preference in ['hi', 'mr', 'es', 'fr', 'de']:
+            try:
+                from ai_services import generate_summary_with_language
+                summary = generate_summary_with_language(extracted_text, language_preference)
+            except Exception:
+                summary = generate_ai_summary(extracted_text)
+        else:
+            summary = generate_ai_summary(extracted_text)
+
+        # Additional validation for quality
+        if not summary or len(summary.strip()) < 80:
+            print("Summary too short, regenerating with enhanced fallback")
+            from ai_services import generate_enhanced_fallback_summary
+            summary = generate_enhanced_fallback_summary(extracted_text)
+    except Exception as e:
+        print(f"[ERROR] Summary generation error: {e}")
+        from ai_services import generate_enhanced_fallback_summary
+        summary = generate_enhanced_fallback_summary(extracted_text)
+
+    return summary
+
+
+@document_stage('quiz')
+def quiz_stage(job, doc):
+    # STEP 4: Generate Quiz using enhanced content
+    from ai_services import generate_quiz_with_ai
+    from quizzes.models import Quiz, Question
+
+    language = effective_language(doc.language)
+    cached = cached_for_language(doc.content_hash, language)
+    if cached and cached.quiz:
+        quiz_data = cached.quiz
+    else:
+        quiz_content = f"{doc.summary}\n\n{doc.extracted_text[:2000]}" if doc.summary else doc.extracted_text
+        quiz_data = generate_quiz_with_ai(quiz_content)
+        remember_derived(doc.content_hash, language, quiz=quiz_data)
+
+    # Same quiz the quiz page would otherwise generate on first visit
+    quiz, created = Quiz.objects.get_or_create(
+        document=doc,
+        difficulty='medium',
+        defaults={'title': f'Medium Quiz for {doc.title}', 'language': language}
+    )
+    if not quiz.question_set.exists():
+        Question.objects.bulk_create([
+            Question(
+                quiz=quiz,
+                stem=q['stem'],
+                options=q['options'],
+                answer_key=q['answer_key'],
+                explanation=q['explanation']
+            )
+            for q in quiz_data
+        ])
+    print(f"[SUCCESS] Quiz generated: {len(quiz_data)} questions")
+
+
+@document_stage('flashcards')
+def flashcards_stage(job, doc):
+    # STEP 5: Generate Flashcards using enhanced content
+    from ai_services import generate_flashcards_with_ai
+    from flashcards.models import Flashcard
+
+    language = effective_language(doc.language)
+    cached = cached_for_language(doc.content_hash, language)
+    if cached and cached.flashcards:
+        flashcard_data = cached.flashcards
+    else:
+        flashcard_content = f"{doc.summary}\n\n{doc.extracted_text[:2000]}" if doc.summary else doc.extracted_text
+        flashcard_data = generate_flashcards_with_ai(flashcard_content)
+        remember_derived(doc.content_hash, language, flashcards=flashcard_data)
+
+    if not Flashcard.objects.filter(document=doc).exists():
+        Flashcard.objects.bulk_create([
+            Flashcard(document=doc, front=card['front'], back=card['back'], language=language)
+            for card in flashcard_data
+        ])
+    print(f"[SUCCESS] Flashcards generated: {len(flashcard_data)} cards")
+
+
+@document_stage('translations')
+def translations_stage(job, doc):
+    # STEP 6: Generate Multilingual Content (if requested)
+    from ai_services import generate_multilingual_content
+
+    selected_languages = job.payload.get('multilang', [])
+    generate_multilingual_content(doc, selected_languages)
+    print(f"[SUCCESS] Multilingual content generated for {len(selected_languages)} languages")
+
+
+@document_stage('videos')
+def videos_stage(job, doc):
+    # STEP 7: Generate YouTube Videos
+    from youtube_services import get_video_recommendations_from_summary
+
+    language = effective_language(doc.language)
+    cached = cached_for_language(doc.content_hash, language)
+    if cached and cached.youtube_videos:
+        doc.youtube_videos = cached.youtube_videos
+        doc.save(update_fields=['youtube_videos'])
+        return
+
+    videos, keywords = get_video_recommendations_from_summary(doc.summary, doc.title)
+    if videos:
+        doc.set_youtube_videos({'videos': videos, 'keywords': keywords})
+        doc.save(update_fields=['youtube_videos'])
+        remember_derived(doc.content_hash, language, youtube_videos=doc.youtube_videos)
+        print(f"[SUCCESS] YouTube videos saved: {len(videos)} videos")
+    else:
+        print("[INFO] No YouTube videos found")
+
+
+@job_handler('release_blob')
+def release_blob_job(job):
+    # Deferred delete of a blob whose last Document went away during its grace period
+    from .signals import release_blob
+    release_blob(job.payload['name'])
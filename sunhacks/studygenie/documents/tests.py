@@ -1 +1,985 @@
-from django.test import TestCase
\ No newline at end of file
+import json
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from fake_youtube import FakeYouTube
+from flashcards.models import Flashcard
+from jobs.models import Job
+from jobs.queue import claim_next, enqueue, run_job
+from llm.summarize import split_text
+from .extraction import ExtractionResult, shard_pages
+from .content_store import (SUMMARY_VERSION, cached_for_language, get_cached, remember, remember_derived,
+                            restore_document)
+from . import analysis, async_views, retrieval, translation, vectors
+from .models import ChunkIndex, Document, DocumentAnalysis, ExtractedContent, TranslationSegment
+from .storage import RECENT_USE_GRACE, document_storage
+from .tasks import document_stage, fail_stage, start_processing
+
+
+@document_stage('test_stage')
+def passing_stage(job, doc):
+    pass
+
+
+@document_stage('test_failing_stage')
+def failing_stage(job, doc):
+    raise RuntimeError('stage broke')
+
+
+@override_settings(JOBS_EAGER=False)
+class DocumentStageTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('stage-user', password='pw')
+        self.doc = Document.objects.create(user=self.user, title='notes.pdf', status='processing')
+
+    def test_stage_is_done_after_success(self):
+        enqueue('test_stage', document=self.doc)
+        run_job(claim_next('worker-1'))
+        self.assertEqual(self.doc.get_stages(), {'test_stage': 'done'})
+
+    def test_stage_is_retrying_until_last_attempt(self):
+        job = enqueue('test_failing_stage', document=self.doc, max_attempts=2)
+        run_job(claim_next('worker-1'))
+        self.assertEqual(self.doc.get_stages(), {'test_failing_stage': 'retrying'})
+        self.assertEqual(self.doc.stages.get().error, 'stage broke')
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        run_job(claim_next('worker-1'))
+        self.assertEqual(self.doc.get_stages(), {'test_failing_stage': 'failed'})
+
+    def test_quiz_and_cards_are_in_the_documents_language(self):
+        from flashcards.models import Flashcard
+        from quizzes.models import Quiz
+        doc = Document.objects.create(user=self.user, title='hi.pdf', language='hi', content_hash=CONTENT_HASH,
+                                      summary='सारांश')
+        remember(CONTENT_HASH, summary='सारांश', summary_language='hi')
+        remember_derived(CONTENT_HASH, 'hi', quiz=QUIZ, flashcards=CARDS)  # So the stages make no LLM call
+        for stage in ('quiz', 'flashcards'):
+            enqueue(stage, document=doc)
+            run_job(claim_next('worker-1'))
+        self.assertEqual(Quiz.objects.get(document=doc).language, 'hi')
+        self.assertEqual(set(Flashcard.objects.filter(document=doc).values_list('language', flat=True)), {'hi'})
+
+    def test_failed_core_stage_marks_document_as_error(self):
+        fail_stage(self.doc, 'summary', 'no summary')
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.status, 'error')
+
+    def test_failed_optional_stage_keeps_document_usable(self):
+        fail_stage(self.doc, 'videos', 'no videos')
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.status, 'processing')
+
+    @override_settings(JOBS_LOCK_TIMEOUT=600)
+    def test_abandoned_stage_is_marked_failed(self):
+        job = enqueue('test_stage', document=self.doc, max_attempts=1)
+        claim_next('dead-worker')
+        self.doc.set_stage('test_stage', 'running')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=601))
+
+        self.assertIsNone(claim_next('worker-2'))
+        self.assertEqual(self.doc.get_stages(), {'test_stage': 'failed'})
+
+
+@override_settings(JOBS_EAGER=False, PROGRESS_POLL_INTERVAL=2)
+class DocumentProgressTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('progress-user', password='pw')
+        self.client.force_login(self.user)
+        self.doc = Document.objects.create(user=self.user, title='notes.pdf')
+        self.url = reverse('document_progress', args=[self.doc.id])
+
+    def test_all_stage_rows_exist_from_the_start(self):
+        start_processing(self.doc, ['hi'])
+        data = self.client.get(self.url).json()
+        self.assertEqual([stage['name'] for stage in data['stages']],
+                         ['extract', 'summary', 'quiz', 'flashcards', 'translations', 'videos'])
+        self.assertEqual(data['progress'], 0)
+
+    def test_progress_never_goes_backwards(self):
+        start_processing(self.doc)
+        seen = []
+        for stage in ['extract', 'summary', 'quiz', 'flashcards', 'videos']:
+            self.doc.set_stage(stage, 'done')
+            seen.append(self.client.get(self.url).json()['progress'])
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(seen[-1], 100)
+
+    def test_unchanged_state_returns_304_immediately(self):
+        start_processing(self.doc)
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Retry-After'], '2')
+
+        again = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['Retry-After'], '2')
+
+        self.doc.set_stage('extract', 'running')
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_finished_document_has_no_retry_after(self):
+        for stage in ['extract', 'summary']:
+            self.doc.set_stage(stage, 'done')
+        Document.objects.filter(pk=self.doc.pk).update(status='processed')
+        response = self.client.get(self.url)
+        self.assertTrue(response.json()['summary_ready'])
+        self.assertFalse(response.has_header('Retry-After'))
+
+    def test_other_users_document_is_not_found(self):
+        other = User.objects.create_user('someone-else', password='pw')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class ExtractionTests(TestCase):
+
+    def test_page_offsets_point_at_page_starts(self):
+        result = ExtractionResult([(1, 'First page'), (3, 'Third page')], page_count=3, elapsed=0.1, workers=1)
+        for (page_number, text), (offset_page, offset) in zip(result.pages, result.page_offsets):
+            self.assertEqual(page_number, offset_page)
+            self.assertTrue(result.text[offset:].startswith(text))
+
+    def test_page_number_for_offset(self):
+        result = ExtractionResult([(1, 'First page'), (2, 'Second page')], page_count=2, elapsed=0.1, workers=1)
+        doc = Document(extracted_text=result.text, page_offsets=result.page_offsets)
+        self.assertEqual(doc.get_page_number(0), 1)
+        self.assertEqual(doc.get_page_number(result.text.index('Second')), 2)
+        self.assertIsNone(Document(page_offsets=[]).get_page_number(5))
+
+    def test_shards_cover_every_page_once(self):
+        ranges = shard_pages(10, 4)
+        self.assertEqual([page for start, stop in ranges for page in range(start, stop)], list(range(10)))
+        self.assertEqual(shard_pages(2, 8), [(0, 1), (1, 2)])
+
+
+@override_settings(RETRIEVAL_CHUNK_WORDS=9, RETRIEVAL_CHUNK_OVERLAP=0, RATELIMIT_ENABLED=False)
+class TutorCitationTests(TestCase):
+
+    def test_answer_cites_source_pages(self):
+        from rag_tutor import RAGTutor
+        result = ExtractionResult([
+            (1, 'Photosynthesis converts light energy into chemical energy in plants.'),
+            (2, 'Mitochondria are the organelles that produce energy for the cell.'),
+        ], page_count=2, elapsed=0.1, workers=1)
+        doc = Document(title='bio.pdf', extracted_text=result.text, page_offsets=result.page_offsets)
+
+        tutor = RAGTutor()
+        chunks = tutor.rank_passages('what do mitochondria produce', doc)
+        self.assertEqual(tutor.cited_pages(chunks, doc), [2])
+        self.assertIn('bio.pdf, p. 2', tutor.format_response('Energy.', doc.title, [2]))
+
+    def test_tutor_answer_streams_with_its_source(self):
+        from llm.client import LLMClient
+        from llm.tests import FakeModel, sse_events
+        user = User.objects.create_user('tutor-user', password='pw')
+        self.client.force_login(user)
+        doc = Document.objects.create(user=user, title='bio.pdf',
+                                      extracted_text='Mitochondria produce energy for the cell. ' * 20)
+        llm = LLMClient(api_key='test-key', retry_backoff=0)
+        llm._model = FakeModel(reply="Mitochondria make ATP.\nThey are the cell's power plants.")
+
+        with patch('llm.get_client', return_value=llm):
+            response = self.client.post(reverse('tutor', args=[doc.id]),
+                                        json.dumps({'question': 'What do mitochondria do?', 'stream': True}),
+                                        content_type='application/json')
+            events = sse_events(response)
+        html = ''.join(data['delta'] for event, data in events if event == 'message')
+        self.assertEqual(html, "Mitochondria make ATP.<br>They are the cell's power plants."
+                               "<br><small class='text-muted'>Based on: bio.pdf</small>")
+        self.assertEqual(events[-1][0], 'done')
+
+        # Accounted to the user, document and view, although the stream was read after the view returned
+        from llm import accounting
+        from llm.models import LLMCall
+        accounting.flush()
+        call = LLMCall.objects.get(document_id=doc.id)
+        self.assertEqual((call.user_id, call.stage, call.mode, call.outcome), (user.id, 'tutor', 'stream', 'ok'))
+        self.assertGreater(call.response_tokens, 0)
+
+
+CONTENT_HASH = 'ab' * 32
+QUIZ = [{'stem': 'What is 2 + 2?', 'options': ['3', '4', '5', '6'], 'answer_key': 'B', 'explanation': 'Sum'}]
+CARDS = [{'front': 'Term', 'back': 'Definition'}]
+
+
+@override_settings(JOBS_EAGER=False)
+class ContentCacheTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('cache-user', password='pw')
+
+    def make_document(self, language='auto'):
+        return Document.objects.create(user=self.user, title='notes.pdf', language=language,
+                                       file=f'documents/ab/{CONTENT_HASH}.pdf', content_hash=CONTENT_HASH)
+
+    def test_known_file_is_restored_without_jobs(self):
+        remember(CONTENT_HASH, extracted_text='Cached text', summary='Cached summary', summary_language='en')
+        remember_derived(CONTENT_HASH, 'en', quiz=QUIZ, flashcards=CARDS)
+        doc = self.make_document()
+
+        self.assertTrue(start_processing(doc))
+        doc.refresh_from_db()
+        self.assertEqual(doc.summary, 'Cached summary')
+        self.assertEqual(doc.status, 'processed')
+        self.assertEqual(doc.quiz_set.get().question_set.count(), 1)
+        self.assertEqual(doc.flashcard_set.count(), 1)
+        self.assertEqual(set(doc.get_stages().values()), {'done'})
+        self.assertFalse(Job.objects.exists())
+
+    def test_cache_in_another_language_is_not_restored(self):
+        remember(CONTENT_HASH, extracted_text='Cached text', summary='सारांश', summary_language='hi')
+        remember_derived(CONTENT_HASH, 'hi', quiz=QUIZ, flashcards=CARDS)
+        self.assertFalse(start_processing(self.make_document(language='en')))
+        self.assertIsNone(cached_for_language(CONTENT_HASH, 'en'))
+
+    def test_new_summary_language_drops_derived_results(self):
+        remember(CONTENT_HASH, summary='सारांश', summary_language='hi')
+        remember_derived(CONTENT_HASH, 'hi', quiz=QUIZ, flashcards=CARDS, youtube_videos='{"videos": []}')
+
+        remember(CONTENT_HASH, summary='Summary', summary_language='en')
+        cached = ExtractedContent.objects.get(content_hash=CONTENT_HASH)
+        self.assertEqual((cached.quiz, cached.flashcards, cached.youtube_videos), ([], [], ''))
+
+    def test_derived_results_for_a_replaced_summary_are_not_stored(self):
+        remember(CONTENT_HASH, summary='Summary', summary_language='en')
+        remember_derived(CONTENT_HASH, 'hi', quiz=QUIZ)
+        self.assertEqual(ExtractedContent.objects.get(content_hash=CONTENT_HASH).quiz, [])
+
+    def test_failed_extraction_is_retried_and_never_cached(self):
+        doc = self.make_document()  # The blob doesn't exist, so reading the PDF fails
+        job = enqueue('extract', document=doc, max_attempts=2)
+
+        run_job(claim_next('worker-1'))
+        self.assertEqual(doc.get_stages()['extract'], 'retrying')
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        run_job(claim_next('worker-1'))
+        doc.refresh_from_db()
+        self.assertTrue(doc.extracted_text.startswith('Error processing PDF'))
+        self.assertFalse(ExtractedContent.objects.filter(content_hash=CONTENT_HASH).exclude(extracted_text='').exists())
+
+
+@override_settings(JOBS_EAGER=False)
+class RegenerateCommandTests(TestCase):
+    TEXT = 'The 8085 microprocessor has an 8-bit data bus and a 16-bit address bus. ' * 3
+
+    def setUp(self):
+        self.user = User.objects.create_user('regen-user', password='pw')
+        self.docs = [Document.objects.create(user=self.user, title=f'notes{i}.pdf', extracted_text=self.TEXT,
+                                             content_hash=f'{i:064x}', summary='Old summary', language='en')
+                     for i in range(5)]
+        Document.objects.create(user=self.user, title='empty.pdf', extracted_text='Too short')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.checkpoint = os.path.join(directory, 'checkpoint.json')
+
+    def regenerate(self, *args):
+        with patch('documents.management.commands.regenerate.generate_document_summary',
+                   side_effect=lambda text, language: f'New {language} summary') as generate:
+            call_command('regenerate', '--batch-size', '2', '--checkpoint', self.checkpoint, *args, stdout=StringIO())
+        return generate.call_count
+
+    def test_up_to_date_summaries_are_skipped(self):
+        self.assertEqual(self.regenerate(), 5)
+        doc = Document.objects.get(pk=self.docs[0].pk)
+        self.assertEqual(doc.summary, 'New en summary')
+        self.assertEqual(doc.summary_key, f'{doc.content_hash}:en:ai{SUMMARY_VERSION}')
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        self.assertEqual(self.regenerate(), 0)
+        self.assertEqual(self.regenerate('--force'), 5)
+
+    def test_stopped_run_resumes_after_its_checkpoint(self):
+        self.assertEqual(self.regenerate('--limit', '3'), 3)
+        with open(self.checkpoint) as file:
+            self.assertEqual(json.load(file)['after'], self.docs[2].pk)
+
+        Document.objects.filter(pk=self.docs[0].pk).update(summary_key='')  # Before the checkpoint: not revisited
+        self.assertEqual(self.regenerate(), 2)
+        self.assertEqual(self.regenerate('--restart'), 1)
+
+    def test_results_are_written_in_bulk(self):
+        remember(self.docs[0].content_hash, summary='Old summary', summary_language='en')
+        with self.assertNumQueries(4):  # Read the batch, write the documents, read and write the content cache
+            self.regenerate('--limit', '2')
+        self.assertEqual(ExtractedContent.objects.get().summary, 'New en summary')
+
+    def test_local_summaries_make_no_llm_calls(self):
+        with patch('ai_services.generate_enhanced_fallback_summary', return_value='Local summary'), \
+                patch('llm.ratelimit.RateLimiter.spend_budget') as spend_budget:
+            self.assertEqual(self.regenerate('--local'), 0)
+        spend_budget.assert_not_called()
+        self.assertEqual(Document.objects.filter(summary='Local summary').count(), 5)
+        self.assertEqual(self.regenerate(), 5)  # A local summary isn't an up-to-date AI one
+
+    def test_copies_of_a_file_share_one_summary(self):
+        copies = [Document.objects.create(user=self.user, title=f'copy{i}.pdf', extracted_text=self.TEXT,
+                                          content_hash=self.docs[i].content_hash, language='en') for i in (0, 4)]
+        self.assertEqual(self.regenerate(), 5)
+        self.assertEqual(set(Document.objects.filter(pk__in=[copy.pk for copy in copies])
+                             .values_list('summary', flat=True)), {'New en summary'})
+
+    def test_restored_documents_are_up_to_date(self):
+        remember(self.docs[0].content_hash, extracted_text=self.TEXT, summary='Cached summary', summary_language='en')
+        restored = Document.objects.create(user=self.user, title='again.pdf', content_hash=self.docs[0].content_hash)
+        restore_document(restored, get_cached(restored.content_hash))
+        self.regenerate()
+        self.assertEqual(Document.objects.get(pk=restored.pk).summary, 'Cached summary')
+
+    @override_settings(SUMMARY_INPUT_TOKENS=200, SUMMARY_CHUNK_TOKENS=200)
+    def test_llm_budget_is_charged_per_call(self):
+        Document.objects.exclude(pk=self.docs[0].pk).delete()
+        Document.objects.filter(pk=self.docs[0].pk).update(extracted_text=self.TEXT * 20)  # About 4 chunks
+        with patch('llm.ratelimit.RateLimiter.spend_budget', return_value=0.0) as spend_budget:
+            self.regenerate()
+        self.assertEqual(spend_budget.call_count, len(split_text(self.TEXT * 20, 200)) + 1)
+
+    def test_generic_only_picks_template_summaries(self):
+        Document.objects.filter(pk=self.docs[1].pk).update(summary='This document contains approximately 300 words.')
+        self.assertEqual(self.regenerate('--generic-only'), 1)
+
+
+class WriteVolumeTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user('writes-user', password='pw')
+        self.client.force_login(self.user)
+
+    def writes(self, queries, table):
+        return [query['sql'] for query in queries
+                if query['sql'].startswith(('INSERT', 'UPDATE')) and f'"{table}"' in query['sql'].split('(')[0]]
+
+    def test_upload_writes_the_document_twice(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('upload_document'), {'file': SimpleUploadedFile('notes.pdf', b'%PDF-1.4 bytes')})
+        writes = self.writes(queries, 'documents_document')
+        self.assertEqual(len(writes), 2)  # The row with its hash, then status = 'processing'
+        self.assertTrue(writes[1].startswith('UPDATE'))
+        self.assertNotIn('extracted_text', writes[1])
+        self.assertEqual(len(self.writes(queries, 'documents_documentstage')), 1)
+        doc = Document.objects.get()
+        self.assertEqual(doc.content_hash, document_storage.content_hash(doc.file.name))
+        self.assertEqual(len(doc.get_stages()), 5)
+
+    def test_translations_only_write_their_field(self):
+        doc = Document.objects.create(user=self.user, title='notes.pdf', extracted_text='x' * 100000)
+        with CaptureQueriesContext(connection) as queries:
+            doc.set_summary_translation('hi', 'सारांश')
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('extracted_text', queries[0]['sql'])
+
+    def test_concurrent_translations_keep_each_others_keys(self):
+        doc = Document.objects.create(user=self.user, title='notes.pdf', summary_translations={'fr': 'Résumé'})
+        stale = Document.objects.get(pk=doc.pk)
+        doc.set_summary_translation('hi', 'सारांश')
+        stale.set_summary_translation('mr', 'सारांश (mr)')  # Loaded before 'hi' was saved
+        doc.refresh_from_db()
+        self.assertEqual(doc.summary_translations, {'fr': 'Résumé', 'hi': 'सारांश', 'mr': 'सारांश (mr)'})
+
+        cards = [Flashcard.objects.create(document=doc, front=f'Front {i}', back='Back') for i in range(2)]
+        stale = list(Flashcard.objects.filter(document=doc))
+        translation.save_flashcards(cards, ['F0', 'B0', 'F1', 'B1'], 'hi')
+        translation.save_flashcards(stale, ['G0', 'C0', 'G1', 'C1'], 'de')
+        self.assertEqual(Flashcard.objects.get(pk=cards[1].pk).translations,
+                         {'hi': {'front': 'F1', 'back': 'B1'}, 'de': {'front': 'G1', 'back': 'C1'}})
+
+    def test_summary_page_does_not_write(self):
+        doc = Document.objects.create(user=self.user, title='notes.pdf', summary='Summary')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('summary', args=[doc.pk]))
+        self.assertEqual(self.writes(queries, 'documents_document'), [])
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user('storage-user', password='pw')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def upload(self, content=b'%PDF-1.4 same bytes', name='notes.pdf'):
+        self.client.post(reverse('upload_document'), {'file': SimpleUploadedFile(name, content)})
+        return Document.objects.latest('id')
+
+    def age_blob(self, name):
+        old = time.time() - RECENT_USE_GRACE - 1
+        os.utime(document_storage.path(name), (old, old))
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload()
+        second = self.upload(name='copy.pdf')
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertEqual(first.content_hash, document_storage.content_hash(first.file.name))
+        blobs = [files for directory, dirs, files in os.walk(self.media_root) if files and '.incoming' not in directory]
+        self.assertEqual(sum(len(files) for files in blobs), 1)
+
+    def test_blob_deleted_with_last_document(self):
+        first, second = self.upload(), self.upload(name='copy.pdf')
+        name = first.file.name
+        self.age_blob(name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(document_storage.exists(name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(document_storage.exists(name))
+
+    def test_recently_used_blob_is_released_later(self):
+        doc = self.upload()
+        name = doc.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.delete()
+        self.assertTrue(document_storage.exists(name))
+
+        job = Job.objects.get(kind='release_blob')
+        self.assertEqual(job.payload, {'name': name})
+        self.age_blob(name)
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        run_job(claim_next('worker-1'))
+        self.assertFalse(document_storage.exists(name))
+
+    def test_prune_keeps_blobs_of_uploads_in_progress(self):
+        doc = self.upload()
+        name = doc.file.name
+        Document.objects.filter(pk=doc.pk).delete()  # As if the blob were written but the row not created yet
+        call_command('dedupe_media', '--prune', stdout=StringIO())
+        self.assertTrue(document_storage.exists(name))
+
+        self.age_blob(name)
+        call_command('dedupe_media', '--prune', stdout=StringIO())
+        self.assertFalse(document_storage.exists(name))
+
+    def test_deferred_release_keeps_blob_uploaded_again(self):
+        doc = self.upload()
+        name = doc.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            doc.delete()
+        self.upload()  # Same file comes back before the deferred release runs
+        Job.objects.exclude(kind='release_blob').delete()
+
+        Job.objects.filter(kind='release_blob').update(run_after=timezone.now())
+        self.age_blob(name)
+        run_job(claim_next('worker-1'))
+        self.assertTrue(document_storage.exists(name))
+
+
+BIOLOGY = (
+    "Photosynthesis converts light energy into chemical energy inside chloroplasts. "
+    "Mitochondria are the organelles that produce most of the energy a cell uses. "
+    "Ribosomes translate messenger RNA into proteins. "
+    "Transistors switch and amplify electronic signals in circuits."
+)
+
+
+@override_settings(RETRIEVAL_CHUNK_WORDS=12, RETRIEVAL_CHUNK_OVERLAP=2)
+class RetrievalTests(TestCase):
+
+    def setUp(self):
+        retrieval._loaded.clear()
+        vectors._loaded.clear()
+        self.vector_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(RETRIEVAL_VECTOR_DIR=self.vector_dir)
+        self.settings_override.enable()
+        self.user = User.objects.create_user('retrieval-user', password='pw')
+        self.doc = Document.objects.create(user=self.user, title='bio.pdf', extracted_text=BIOLOGY)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.vector_dir, ignore_errors=True)
+
+    def test_chunks_overlap_and_cover_the_text(self):
+        spans = retrieval.chunk_spans(BIOLOGY)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(BIOLOGY))
+        for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+            self.assertLess(next_start, end)
+
+    def test_stemming_and_stop_words(self):
+        self.assertEqual(retrieval.tokenize('The transistors are switching'), ['transistor', 'switch'])
+
+    def test_best_passage_answers_the_question(self):
+        text, score, offset = retrieval.search_document(self.doc, 'how do transistors amplify signals?', k=1)[0]
+        self.assertIn('Transistors', text)
+        self.assertEqual(BIOLOGY[offset:offset + len(text)], text)
+
+    def test_unrelated_question_finds_nothing(self):
+        self.assertEqual(retrieval.search_document(self.doc, 'medieval poetry', k=3), [])
+
+    def test_index_is_persisted_and_reloaded(self):
+        retrieval.build_index(self.doc)
+        row = ChunkIndex.objects.get(content_hash=retrieval.index_key(self.doc))
+        self.assertEqual(row.chunk_count, len(retrieval.chunk_spans(BIOLOGY)))
+
+        retrieval._loaded.clear()
+        with self.assertNumQueries(1):
+            index = retrieval.get_index(self.doc)
+        start, end = index.spans[index.search('ribosomes proteins', 1)[0][0]]
+        self.assertIn('Ribosomes', BIOLOGY[start:end])
+        with self.assertNumQueries(0):
+            retrieval.get_index(self.doc)
+
+    @override_settings(RETRIEVAL_CHUNK_WORDS=8, RETRIEVAL_CHUNK_OVERLAP=0)
+    def test_hindi_and_marathi_passages_are_found(self):
+        self.assertEqual(retrieval.tokenize('प्रकाश संश्लेषण क्या है?'), ['प्रकाश', 'संश्लेषण', 'क्या', 'है'])
+        self.assertEqual(retrieval.tokenize('Mémoire café'), ['mémoire', 'café'])
+        text = ("प्रकाश संश्लेषण में पौधे सूर्य के प्रकाश से भोजन बनाते हैं। "
+                "माइटोकॉन्ड्रिया कोशिका को ऊर्जा देते हैं और श्वसन करते हैं। "
+                "राइबोसोम प्रथिने तयार करतात आणि पेशीला मदत करतात।")
+        doc = Document.objects.create(user=self.user, title='hi.pdf', extracted_text=text)
+        for mode in retrieval.MODES:
+            passage = retrieval.search_document(doc, 'प्रकाश संश्लेषण क्या है?', k=1, mode=mode)[0][0]
+            self.assertIn('प्रकाश संश्लेषण', passage, mode)
+        self.assertIn('राइबोसोम', retrieval.search_document(doc, 'राइबोसोम काय करतात?', k=1, mode='bm25')[0][0])
+
+    def test_documents_with_the_same_file_share_an_index(self):
+        self.doc.content_hash = CONTENT_HASH
+        other = Document(user=self.user, title='copy.pdf', extracted_text=BIOLOGY, content_hash=CONTENT_HASH)
+        retrieval.build_index(self.doc)
+        retrieval.get_index(other)
+        self.assertEqual(ChunkIndex.objects.count(), 1)
+
+
+@skipUnless(vectors.available(), 'numpy is not installed')
+@override_settings(RETRIEVAL_CHUNK_WORDS=12, RETRIEVAL_CHUNK_OVERLAP=2)
+class VectorRetrievalTests(TestCase):
+
+    def setUp(self):
+        retrieval._loaded.clear()
+        vectors._loaded.clear()
+        self.vector_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(RETRIEVAL_VECTOR_DIR=self.vector_dir)
+        self.settings_override.enable()
+        self.user = User.objects.create_user('vector-user', password='pw')
+        self.doc = Document.objects.create(user=self.user, title='bio.pdf', extracted_text=BIOLOGY)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.vector_dir, ignore_errors=True)
+
+    def test_vector_mode_matches_other_word_forms(self):
+        # The text only says "Photosynthesis", which the keyword index treats as a different word
+        self.assertEqual(retrieval.search_document(self.doc, 'photosynthetic', k=1, mode='bm25'), [])
+        text, score, offset = retrieval.search_document(self.doc, 'photosynthetic', k=1, mode='vector')[0]
+        self.assertIn('Photosynthesis', text)
+
+    def test_hybrid_mode_fuses_both_rankings(self):
+        results = retrieval.search_document(self.doc, 'how do transistors amplify signals?', k=2, mode='hybrid')
+        self.assertIn('Transistors', results[0][0])
+        self.assertLessEqual(len(results), 2)
+
+    def test_unknown_mode_uses_the_setting(self):
+        with override_settings(TUTOR_RETRIEVAL_MODE='vector'):
+            with patch.object(vectors, 'search', wraps=vectors.search) as search:
+                retrieval.search_document(self.doc, 'ribosomes', k=1, mode='nonsense')
+        search.assert_called_once()
+
+    def test_vectors_are_saved_and_memory_mapped(self):
+        with override_settings(TUTOR_RETRIEVAL_MODE='hybrid'):
+            retrieval.build_index(self.doc)
+        vectors_path, idf_path = vectors.paths(retrieval.index_key(self.doc))
+        self.assertTrue(os.path.exists(vectors_path) and os.path.exists(idf_path))
+
+        vectors._loaded.clear()
+        matrix, idf = vectors.load_vectors(self.doc, retrieval.get_index(self.doc))
+        self.assertIsInstance(matrix, vectors.np.memmap)
+        self.assertEqual(matrix.shape, (len(retrieval.chunk_spans(BIOLOGY)), vectors.dimensions()))
+
+    def test_stale_vectors_are_rebuilt(self):
+        vectors.build_vectors(self.doc)
+        vectors_path, idf_path = vectors.paths(retrieval.index_key(self.doc))
+        vectors.np.save(vectors_path, vectors.np.zeros((1, vectors.dimensions()), dtype=vectors.np.float32))
+        vectors._loaded.clear()
+        results = retrieval.search_document(self.doc, 'ribosomes proteins', k=1, mode='vector')
+        self.assertIn('Ribosomes', results[0][0])
+
+
+def slow(result, delay=0.1):
+    def generate(text, language):
+        time.sleep(delay)
+        if isinstance(result, Exception):
+            raise result
+        return f"{result} {language}" if isinstance(result, str) else result
+    return generate
+
+
+@override_settings(LLM_FANOUT_WORKERS=6)
+class MultilingualContentTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user('multilang-user', password='pw')
+        self.doc = Document.objects.create(user=self.user, title='bio.pdf', extracted_text=BIOLOGY)
+
+    def generate(self, summary=slow('summary'), quiz=slow([{'stem': 'Q'}]), flashcards=slow([{'front': 'F'}])):
+        import ai_services
+        with patch.object(ai_services, 'generate_summary_with_language', summary), \
+                patch.object(ai_services, 'generate_quiz_with_language', quiz), \
+                patch.object(ai_services, 'generate_flashcards_with_language', flashcards):
+            return ai_services.generate_multilingual_content(self.doc, ['hi', 'es'])
+
+    def test_calls_run_concurrently_and_are_saved(self):
+        started = time.perf_counter()
+        results = self.generate()
+        self.assertLess(time.perf_counter() - started, 6 * 0.1 / 2)
+        self.assertEqual(results['es']['summary'], 'summary es')
+
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.summary_translations, {'hi': 'summary hi', 'es': 'summary es'})
+        self.assertEqual(self.doc.quiz_translations['hi'], [{'stem': 'Q'}])
+        self.assertEqual(self.doc.flashcard_translations['es'], [{'front': 'F'}])
+
+    def test_failed_call_keeps_the_other_results(self):
+        results = self.generate(quiz=slow(RuntimeError('quota')))
+        self.assertEqual(results['hi']['status'], 'error')
+        self.assertEqual(results['hi']['error'], 'quota')
+
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.quiz_translations, {})
+        self.assertEqual(set(self.doc.summary_translations), {'hi', 'es'})
+        self.assertEqual(set(self.doc.flashcard_translations), {'hi', 'es'})
+
+    def test_results_are_saved_as_they_finish(self):
+        # The summaries finish long before the quizzes and are saved without waiting for them
+        saved = []
+        save = Document.set_language_content
+
+        def record(doc, kind, language, content):
+            saved.append((kind, time.perf_counter()))
+            save(doc, kind, language, content)
+
+        started = time.perf_counter()
+        with patch.object(Document, 'set_language_content', record):
+            self.generate(summary=slow('summary', 0), quiz=slow([], 0.3))
+        self.assertEqual([kind for kind, at in saved[-2:]], ['quiz', 'quiz'])
+        self.assertTrue(all(at - started < 0.2 for kind, at in saved if kind == 'summary'))
+
+
+class FakeTranslator:
+    """Translates the JSON array in a batch prompt by tagging each string; counts calls"""
+
+    def __init__(self, broken=False):
+        self.calls = 0
+        self.prompts = []
+        self.broken = broken
+
+    def generate_content(self, prompt, **kwargs):
+        self.calls += 1
+        self.prompts.append(prompt)
+        strings = json.loads(prompt[prompt.index('['):prompt.rindex(']') + 1])
+        if self.broken:
+            strings = strings[:-1]
+        return type('Reply', (), {'text': json.dumps([f"ES<{s}>" for s in strings])})()
+
+    async def generate_content_async(self, prompt, **kwargs):
+        return self.generate_content(prompt, **kwargs)
+
+
+class TranslationMemoryTests(TestCase):
+
+    def setUp(self):
+        self.llm = FakeTranslator()
+
+    def test_layout_is_kept_and_segments_translated(self):
+        text = "Cells divide. They grow!\n\n• Mitosis has 4 phases\n  2) Meiosis halves chromosomes\n42"
+        self.assertEqual(translation.translate_text(text, 'es', self.llm),
+                         "ES<Cells divide.> ES<They grow!>\n\n• ES<Mitosis has 4 phases>\n"
+                         "  2) ES<Meiosis halves chromosomes>\n42")
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(TranslationSegment.objects.filter(language='es').count(), 4)
+
+    def test_known_segments_are_not_sent_again(self):
+        translation.translate_text("• Mitosis has 4 phases\n• Meiosis halves chromosomes", 'es', self.llm)
+        result = translation.translate_text("Meiosis   halves chromosomes. Ribosomes make proteins.", 'es', self.llm)
+        self.assertEqual(result, "ES<Meiosis halves chromosomes.> ES<Ribosomes make proteins.>")
+        self.assertEqual(self.llm.calls, 2)
+        self.assertNotIn('Mitosis', self.llm.prompts[1])
+        translation.translate_text("• Mitosis has 4 phases", 'es', self.llm)
+        self.assertEqual(self.llm.calls, 2)
+        translation.translate_text("• Mitosis has 4 phases", 'hi', self.llm)
+        self.assertEqual(self.llm.calls, 3)
+
+    def test_misses_are_batched_into_one_prompt(self):
+        text = '\n'.join(f"• Fact number {i} about cells" for i in range(30))
+        translation.translate_text(text, 'es', self.llm)
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_misaligned_reply_is_not_stored(self):
+        llm = FakeTranslator(broken=True)
+        self.assertEqual(translation.translate_text("One fact. Another fact.", 'es', llm), "One fact. Another fact.")
+        self.assertEqual(translation.translate_texts(["One fact."], 'es', llm, partial=False), [None])
+        self.assertFalse(TranslationSegment.objects.exists())
+
+    def test_questions_and_flashcards_share_the_memory(self):
+        from flashcards.models import Flashcard
+        from quizzes.models import Question, Quiz
+
+        user = User.objects.create_user('translate-user', password='pw')
+        doc = Document.objects.create(user=user, title='bio.pdf')
+        quiz = Quiz.objects.create(document=doc, title='Quiz')
+        question = Question.objects.create(quiz=quiz, stem='What do ribosomes make?', answer_key='A',
+                                           options={'A': 'Proteins', 'B': 'Lipids'},
+                                           explanation='Ribosomes make proteins.')
+        card = Flashcard.objects.create(document=doc, front='Ribosomes', back='Ribosomes make proteins.')
+
+        self.assertEqual(translation.translate_questions([question], 'es', self.llm), 1)
+        self.assertEqual(translation.translate_flashcards([card], 'es', self.llm), 1)
+        self.assertNotIn('make proteins', self.llm.prompts[1])
+
+        question.refresh_from_db()
+        card.refresh_from_db()
+        self.assertEqual(question.translations['es']['options'], {'A': 'ES<Proteins>', 'B': 'ES<Lipids>'})
+        self.assertEqual(card.get_translation('es'), {'front': 'ES<Ribosomes>', 'back': 'ES<Ribosomes make proteins.>'})
+        self.assertEqual(translation.translate_questions([question], 'es', self.llm), 0)
+
+
+@override_settings(RATELIMIT_ENABLED=False)  # Requests of earlier tests would count against these
+class LanguageEndpointTests(TestCase):
+
+    def setUp(self):
+        from flashcards.models import Flashcard
+        from quizzes.models import Question, Quiz
+
+        self.user = User.objects.create_user('lang-user', password='pw')
+        self.client.force_login(self.user)
+        self.doc = Document.objects.create(user=self.user, title='bio.pdf', extracted_text=BIOLOGY)
+        quiz = Quiz.objects.create(document=self.doc, title='Quiz')
+        for stem in ['What do ribosomes make?', 'Where does photosynthesis happen?']:
+            Question.objects.create(quiz=quiz, stem=stem, answer_key='A', options={'A': 'Yes', 'B': 'No'},
+                                    explanation='See the text.')
+        Flashcard.objects.create(document=self.doc, front='Ribosomes', back='Make proteins.')
+        self.llm = FakeTranslator()
+        patcher = patch.object(translation, 'get_client', return_value=self.llm)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, name, **data):
+        return self.client.post(reverse(name, args=[self.doc.id]), json.dumps(data), content_type='application/json').json()
+
+    def test_quiz_is_translated_once_in_one_call(self):
+        first = self.post('quiz_in_language', language='es')
+        self.assertFalse(first['cached'])
+        self.assertEqual(first['quiz'][0]['stem'], 'ES<What do ribosomes make?>')
+        self.assertEqual(first['quiz'][1]['options'], {'A': 'ES<Yes>', 'B': 'ES<No>'})
+        self.assertEqual(first['quiz'][0]['answer_key'], 'A')
+        self.assertEqual(self.llm.calls, 1)
+
+        second = self.post('quiz_in_language', language='es')
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['quiz'], first['quiz'])
+        self.assertEqual(self.llm.calls, 1)
+        self.assertIn('elapsed_ms', second)
+
+    def test_quiz_in_its_own_language_needs_no_call(self):
+        response = self.post('quiz_in_language', language='en')
+        self.assertTrue(response['cached'])
+        self.assertEqual(response['quiz'][0]['stem'], 'What do ribosomes make?')
+        self.assertEqual(self.llm.calls, 0)
+
+    def test_flashcards_are_translated_once(self):
+        first = self.post('flashcards_in_language', language='hi')
+        self.assertEqual(first['flashcards'], [{'front': 'ES<Ribosomes>', 'back': 'ES<Make proteins.>'}])
+        self.assertFalse(first['cached'])
+        self.assertTrue(self.post('flashcards_in_language', language='hi')['cached'])
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_hindi_document_is_translated_to_english_not_hindi(self):
+        remember(CONTENT_HASH, extracted_text=BIOLOGY, summary='सारांश', summary_language='hi')
+        remember_derived(CONTENT_HASH, 'hi', quiz=QUIZ, flashcards=CARDS)
+        self.doc = Document.objects.create(user=self.user, title='hi.pdf', language='hi', content_hash=CONTENT_HASH)
+        restore_document(self.doc, get_cached(CONTENT_HASH))
+
+        own = self.post('quiz_in_language', language='hi')
+        self.assertTrue(own['cached'])
+        self.assertEqual(own['quiz'][0]['stem'], QUIZ[0]['stem'])
+        english = self.post('flashcards_in_language', language='en')
+        self.assertFalse(english['cached'])
+        self.assertEqual(english['flashcards'][0]['front'], f"ES<{CARDS[0]['front']}>")
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_summary_in_the_documents_own_language_is_the_original(self):
+        Document.objects.filter(pk=self.doc.pk).update(language='hi', summary='सारांश',
+                                                       summary_translations={'en': 'Summary'})
+        self.assertEqual(self.post('translate_summary', language='hi')['translation'], 'सारांश')
+        self.assertEqual(self.post('translate_summary', language='en')['translation'], 'Summary')
+
+    def test_login_is_required(self):
+        self.client.logout()
+        response = self.client.post(reverse('quiz_in_language', args=[self.doc.id]), '{}',
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+
+
+class AsyncViewTests(LanguageEndpointTests):
+    """The language endpoints again, served by their async versions (documents/async_views.py)"""
+
+    def request(self, name, user, data):
+        path = reverse(name, args=[self.doc.id])
+        request = AsyncRequestFactory().post(path, json.dumps(data), content_type='application/json')
+        request.user = user
+        view = getattr(async_views, resolve(path).func.__name__)
+        return async_to_sync(view)(request, doc_id=self.doc.id)
+
+    def post(self, name, **data):
+        return json.loads(self.request(name, self.user, data).content)
+
+    def test_login_is_required(self):
+        from django.contrib.auth.models import AnonymousUser
+        self.assertEqual(self.request('quiz_in_language', AnonymousUser(), {}).status_code, 302)
+
+    def test_summary_translation_is_saved(self):
+        self.doc.summary = "Ribosomes make proteins."
+        self.doc.save()
+        with patch('ai_services.client', self.llm):
+            first = self.post('translate_summary', language='es')
+            self.assertEqual(first['translation'], 'ES<Ribosomes make proteins.>')
+            self.assertTrue(self.post('translate_summary', language='es')['cached'])
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.summary_translations['es'], 'ES<Ribosomes make proteins.>')
+        self.assertEqual(self.llm.calls, 1)
+
+    def test_tutor_answers_from_the_async_client(self):
+        from llm.tests import make_async_client
+        llm = make_async_client(reply="Ribosomes make proteins.")
+        with patch.object(async_views, 'get_client', return_value=llm):
+            answer = self.post('tutor', question='What do ribosomes make?')
+        self.assertEqual(answer['response'], "Ribosomes make proteins.<br><small class='text-muted'>Based on: bio.pdf</small>")
+        self.assertIn('What do ribosomes make?', llm.http_transport.prompts[0])
+
+
+class DocumentAnalysisTests(TestCase):
+
+    TEXT = "Chapter 3: The 8085 Microprocessor\nThe 8085 CPU has an ALU and registers. The ALU adds. " * 3
+
+    def setUp(self):
+        analysis._recent.clear()
+        self.user = User.objects.create_user('analysis-user', password='pw')
+        self.doc = Document.objects.create(user=self.user, title='cpu.pdf', extracted_text=self.TEXT,
+                                           content_hash=CONTENT_HASH)
+
+    def test_features_match_the_individual_extractors(self):
+        from ai_services import detect_document_type, extract_key_terms_from_text, extract_main_topics
+        result = analysis.analyze_document(self.doc)
+        self.assertEqual(result.key_terms, extract_key_terms_from_text(self.TEXT))
+        self.assertEqual(result.main_topics, extract_main_topics(self.TEXT))
+        self.assertEqual(result.document_type, detect_document_type(self.TEXT))
+        self.assertEqual(result.language, 'en')
+
+    def test_stored_analysis_is_read_instead_of_recomputed(self):
+        analysis.analyze_document(self.doc)
+        row = DocumentAnalysis.objects.get(content_hash=CONTENT_HASH)
+        self.assertIn('8085', row.key_terms)
+
+        analysis._recent.clear()  # As in another process
+        with patch.object(analysis, 'analyze_text') as analyze, self.assertNumQueries(1):
+            first = analysis.get_analysis(self.TEXT)
+            second = analysis.get_analysis(self.TEXT)
+        analyze.assert_not_called()
+        self.assertIs(first, second)
+        self.assertEqual(first.key_terms, row.key_terms)
+
+    def test_other_texts_are_not_stored(self):
+        analysis.get_analysis("Summary of the 8085 CPU.\n\n" + self.TEXT[:200])
+        self.assertFalse(DocumentAnalysis.objects.exists())
+
+    def test_fallback_summary_uses_the_stored_analysis(self):
+        from ai_services import generate_enhanced_fallback_summary
+        analysis.analyze_document(self.doc)
+        with patch.object(analysis, 'analyze_text') as analyze:
+            generate_enhanced_fallback_summary(self.TEXT)
+        analyze.assert_not_called()
+
+
+class TextProcessingTests(TestCase):
+    TEXT = ("UNIT 1: The 8085 Microprocessor\n"
+            "The 8085 is an 8-bit CPU. Its pin-diagram shows VCC, VSS and the ALE pin; "
+            "the ALE pin latches the lower address byte. The Schrödinger equation, cos2θ and "
+            "time-dependent waves are covered in the physics unit. The 8085 CPU was released in 1976.")
+
+    def test_tokens_have_lowercase_forms_and_offsets(self):
+        from textproc import tokens
+        found = list(tokens(self.TEXT))
+        self.assertEqual([t.text for t in found[:4]], ['UNIT', '1', 'The', '8085'])
+        for token in found:
+            self.assertEqual(self.TEXT[token.start:token.start + len(token.text)], token.text)
+            self.assertEqual(token.lower, token.text.lower())
+        self.assertIn('pin-diagram', [t.text for t in found])
+
+    def test_one_stream_per_text(self):
+        from textproc import token_stream
+        stream = token_stream(self.TEXT)
+        self.assertIs(token_stream(self.TEXT), stream)
+        self.assertIn('pin-diagram', stream.lower)
+        self.assertIn('diagram', stream.parts)
+        self.assertIn('cos2', stream.ascii_words)  # Non-ASCII letters separate technical terms
+        self.assertNotIn('cos2', stream.words)
+
+    def test_extractors_match_their_previous_output(self):
+        from ai_services import extract_key_terms_from_text, extract_technical_keywords
+        from youtube_services import extract_keywords
+        from .management.commands.bench_textproc import (legacy_key_terms, legacy_keywords,
+                                                         legacy_technical_keywords)
+        for text in (self.TEXT, self.TEXT.replace('ö', 'o').replace('θ', ''), ''):
+            self.assertEqual(extract_key_terms_from_text(text), legacy_key_terms(text))
+            self.assertEqual(extract_technical_keywords(text), legacy_technical_keywords(text))
+            self.assertEqual(extract_keywords(text), legacy_keywords(text))
+        self.assertEqual(extract_key_terms_from_text(self.TEXT)[:3], ['8085', 'CPU', 'ALE'])
+
+    def test_summary_keywords_leave_punctuation_out(self):
+        from youtube_services import extract_keywords_from_summary
+        summary = "• Pipelining (overview): pipelining, hazards and hazards.\n• ➢Pipelining stalls"
+        self.assertEqual(extract_keywords_from_summary(summary), ['pipelining', 'hazards'])
+
+
+class FakeYouTubeTests(TestCase):
+
+    def search(self, server, query='8085 microprocessor'):
+        from youtube_services import fetch_youtube_videos
+        with patch.dict(os.environ, YOUTUBE_API_BASE=server.base_url, YOUTUBE_API_KEY='fake'):
+            return fetch_youtube_videos(query, max_results=3)
+
+    def test_search_results_are_deterministic(self):
+        with FakeYouTube() as server:
+            videos = self.search(server)
+            self.assertEqual(self.search(server), videos)
+        self.assertEqual(len(videos), 3)
+        self.assertEqual(videos[0]['title'], '8085 microprocessor lecture tutorial - Part 1')
+        self.assertTrue(videos[0]['thumbnail'].endswith(f"/{videos[0]['video_id']}/high.jpg"))
+        self.assertEqual(server.requests, 2)
+
+    def test_errors_fall_back_to_search_links(self):
+        with FakeYouTube(error_rate=1.0) as server:
+            videos = self.search(server)
+        self.assertEqual(videos[0]['video_id'], 'search_result_1')
@@ -0,0 +1,300 @@
+"""
+Translation memory
+Text is translated segment by segment: every line, and every sentence within
+a line, is looked up in TranslationSegment by (SHA-256 of the segment, target
+language). Segments seen before (the same bullet point in another copy of a
+document, a flashcard answer repeating a summary sentence) cost nothing. The
+misses are sent together in as few batched prompts as fit the token budget,
+and their translations are stored for next time. Summaries, quiz questions and
+flashcards all share the one table. The *_async functions serve async views:
+batches are awaited together and table reads and writes run in a thread.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+
+from asgiref.sync import sync_to_async
+
+from llm import get_client
+from llm.accounting import tagged
+from llm.fanout import map_concurrently
+from llm.summarize import estimate_tokens
+from studygenie.db import set_json_keys
+
+LANGUAGE_NAMES = {
+    'en': 'English',
+    'hi': 'Hindi',
+    'mr': 'Marathi',
+    'es': 'Spanish',
+    'fr': 'French',
+    'de': 'German',
+}
+
+BATCH_TOKENS = 1500  # Source text per batched prompt
+LOOKUP_BATCH = 500  # Hashes per IN (...) query, well under SQLite's variable limit
+
+PREFIX_RE = re.compile(r'^\s*(?:(?:[•*\-–]|\d+[.)])\s+)?')  # Indentation and bullet/number markers
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+LETTER_RE = re.compile(r'[^\W\d_]')
+
+BATCH_PROMPT = """
+Translate each string in this JSON array to {language}. Keep the meaning,
+technical terms, numbers and formulas intact.
+Return only a JSON array of {count} translated strings, in the same order.
+
+{strings}
+"""
+
+
+def normalize(segment):
+    return ' '.join(segment.split())
+
+
+def segment_hash(segment):
+    return hashlib.sha256(normalize(segment).encode('utf-8')).hexdigest()
+
+
+def split_segments(text):
+    """Text as a list of parts: str for layout kept as is, [segment] for text to translate"""
+    parts = []
+    for number, line in enumerate(text.split('\n')):
+        if number:
+            parts.append('\n')
+        prefix = PREFIX_RE.match(line).group()
+        if prefix:
+            parts.append(prefix)
+        for index, sentence in enumerate(SENTENCE_RE.split(line[len(prefix):])):
+            if index:
+                parts.append(' ')
+            parts.append([sentence] if LETTER_RE.search(sentence) else sentence)
+    return parts
+
+
+def lookup(hashes, language):
+    """{source hash: translation} for the hashes already in the table"""
+    from .models import TranslationSegment
+
+    hashes = list(hashes)
+    found = {}
+    for start in range(0, len(hashes), LOOKUP_BATCH):
+        found.update(TranslationSegment.objects.filter(
+            source_hash__in=hashes[start:start + LOOKUP_BATCH], language=language,
+        ).values_list('source_hash', 'translation'))
+    return found
+
+
+def batches(segments, max_tokens=BATCH_TOKENS):
+    batch, size = [], 0
+    for segment in segments:
+        tokens = estimate_tokens(segment)
+        if batch and size + tokens > max_tokens:
+            yield batch
+            batch, size = [], 0
+        batch.append(segment)
+        size += tokens
+    if batch:
+        yield batch
+
+
+def batch_prompt(segments, language):
+    return BATCH_PROMPT.format(language=LANGUAGE_NAMES.get(language, 'English'), count=len(segments),
+                               strings=json.dumps(segments, ensure_ascii=False, indent=0))
+
+
+def parse_batch(content, segments):
+    """The reply's translations, or None if they don't line up with the segments"""
+    translations = json.loads(content[content.find('['):content.rfind(']') + 1])
+    if (not isinstance(translations, list) or len(translations) != len(segments)
+            or not all(isinstance(t, str) and t.strip() for t in translations)):
+        print(f"Batch translation returned {len(translations) if isinstance(translations, list) else 'no'} "
+              f"strings for {len(segments)} segments")
+        return None
+    return [t.strip() for t in translations]
+
+
+def translate_batch(segments, language, client=None):
+    """Translations for a list of segments in one call, or None if the reply doesn't line up"""
+    client = client or get_client()
+    try:
+        with tagged(language=language):
+            return parse_batch(client.generate_content(batch_prompt(segments, language)).text, segments)
+    except Exception as e:
+        print(f"Batch translation error: {e}")
+        return None
+
+
+async def translate_batch_async(segments, language, client=None):
+    client = client or get_client()
+    try:
+        with tagged(language=language):
+            reply = await client.generate_content_async(batch_prompt(segments, language))
+        return parse_batch(reply.text, segments)
+    except Exception as e:
+        print(f"Batch translation error: {e}")
+        return None
+
+
+def known_segments(segments, language):
+    """({hash: normalized segment} of the distinct segments, {hash: translation} of those in the table)"""
+    unique = {}
+    for segment in segments:
+        unique.setdefault(segment_hash(segment), normalize(segment))
+    return unique, lookup(unique, language)
+
+
+def store_segments(groups, replies, known, language):
+    """Add the batches' translations to known and to the table; returns how many were stored"""
+    from .models import TranslationSegment
+
+    rows = []
+    for batch, translated in zip(groups, replies):
+        if translated is None:
+            continue
+        for source, translation in zip(batch, translated):
+            key = segment_hash(source)
+            known[key] = translation
+            rows.append(TranslationSegment(source_hash=key, language=language,
+                                           source_text=source, translation=translation))
+    TranslationSegment.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def translate_segments(segments, language, client=None):
+    """Translation of each segment from the table, else from batched calls (None where a call failed)"""
+    unique, known = known_segments(segments, language)
+    misses = [source for key, source in unique.items() if key not in known]
+    if misses:
+        groups = list(batches(misses))
+        replies = map_concurrently(lambda batch: translate_batch(batch, language, client), groups)
+        stored = store_segments(groups, replies, known, language)
+        print(f"Translation memory: {len(unique) - len(misses)} of {len(unique)} segments reused, "
+              f"{stored} translated")
+    return [known.get(segment_hash(segment)) for segment in segments]
+
+
+async def translate_segments_async(segments, language, client=None):
+    unique, known = await sync_to_async(known_segments)(segments, language)
+    misses = [source for key, source in unique.items() if key not in known]
+    if misses:
+        groups = list(batches(misses))
+        replies = await asyncio.gather(*(translate_batch_async(batch, language, client) for batch in groups))
+        stored = await sync_to_async(store_segments)(groups, replies, known, language)
+        print(f"Translation memory: {len(unique) - len(misses)} of {len(unique)} segments reused, "
+              f"{stored} translated")
+    return [known.get(segment_hash(segment)) for segment in segments]
+
+
+def join_segments(split, translations, partial):
+    """Texts rebuilt from their split parts and the translations of their segments, in order"""
+    translations = iter(translations)
+    results = []
+    for parts in split:
+        pieces = [next(translations) if isinstance(part, list) else part for part in parts]
+        if None in pieces and not partial:
+            results.append(None)
+            continue
+        results.append(''.join(piece if piece is not None else part[0]
+                               for piece, part in zip(pieces, parts)))
+    return results
+
+
+def text_segments(texts):
+    split = [split_segments(text or '') for text in texts]
+    return split, [part[0] for parts in split for part in parts if isinstance(part, list)]
+
+
+def translate_texts(texts, language, client=None, partial=True):
+    """Translate several texts at once; their segments share lookups and batches
+    
+    Segments that couldn't be translated are left in the source language, or,
+    with partial=False, the whole text comes back as None.
+    """
+    split, segments = text_segments(texts)
+    return join_segments(split, translate_segments(segments, language, client), partial)
+
+
+async def translate_texts_async(texts, language, client=None, partial=True):
+    split, segments = text_segments(texts)
+    return join_segments(split, await translate_segments_async(segments, language, client), partial)
+
+
+def translate_text(text, language, client=None):
+    return translate_texts([text], language, client)[0]
+
+
+async def translate_text_async(text, language, client=None):
+    return (await translate_texts_async([text], language, client))[0]
+
+
+def question_texts(questions):
+    texts = []
+    for q in questions:
+        texts.append(q.stem)
+        texts.append(q.explanation)
+        texts.extend(q.options[letter] for letter in sorted(q.options))
+    return texts
+
+
+def save_questions(questions, translated, language):
+    """Store complete translations (from question_texts order) on the questions; returns how many"""
+    from quizzes.models import Question
+
+    translated = iter(translated)
+    done = []
+    for q in questions:
+        stem, explanation = next(translated), next(translated)
+        options = {letter: next(translated) for letter in sorted(q.options)}
+        if stem is None or explanation is None or None in options.values():
+            continue  # Keep it untranslated (and retried next time) rather than half translated
+        q.translations = dict(q.translations or {}, **{language: {
+            'stem': stem, 'options': options, 'explanation': explanation}})
+        done.append(q)
+    set_json_keys(Question, 'translations', language, {q.pk: q.translations[language] for q in done})
+    return len(done)
+
+
+def translate_questions(questions, language, client=None):
+    """Fill Question.translations[language] for questions that lack it; returns how many were translated"""
+    missing = [q for q in questions if language not in (q.translations or {})]
+    return save_questions(missing, translate_texts(question_texts(missing), language, client, partial=False),
+                          language)
+
+
+async def translate_questions_async(questions, language, client=None):
+    missing = [q for q in questions if language not in (q.translations or {})]
+    translated = await translate_texts_async(question_texts(missing), language, client, partial=False)
+    return await sync_to_async(save_questions)(missing, translated, language)
+
+
+def card_texts(cards):
+    return [text for card in cards for text in (card.front, card.back)]
+
+
+def save_flashcards(cards, translated, language):
+    from flashcards.models import Flashcard
+
+    translated = iter(translated)
+    done = []
+    for card in cards:
+        front, back = next(translated), next(translated)
+        if front is None or back is None:
+            continue
+        card.translations = dict(card.translations or {}, **{language: {'front': front, 'back': back}})
+        done.append(card)
+    set_json_keys(Flashcard, 'translations', language, {card.pk: card.translations[language] for card in done})
+    return len(done)
+
+
+def translate_flashcards(cards, language, client=None):
+    """Fill Flashcard.translations[language] for cards that lack it; returns how many were translated"""
+    missing = [card for card in cards if language not in (card.translations or {})]
+    return save_flashcards(missing, translate_texts(card_texts(missing), language, client, partial=False),
+                           language)
+
+
+async def translate_flashcards_async(cards, language, client=None):
+    missing = [card for card in cards if language not in (card.translations or {})]
+    translated = await translate_texts_async(card_texts(missing), language, client, partial=False)
+    return await sync_to_async(save_flashcards)(missing, translated, language)
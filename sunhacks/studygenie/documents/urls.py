@@ -1,13 +1,19 @@
+from django.conf import settings
 from django.urls import path
 from . import views
+from . import async_views
+
+# Under ASGI the views that wait on Gemini run as coroutines (async_views.py)
+llm_views = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     path('upload/', views.upload_document, name='upload_document'),
     path('<int:doc_id>/summary/', views.summary_view, name='summary'),
-    path('tutor/<int:doc_id>/', views.tutor_view, name='tutor'),
-    path('chatbot/', views.chatbot_api, name='chatbot_api'),
-    path('<int:doc_id>/multilang/', views.generate_multilang_content, name='generate_multilang'),
-    path('<int:doc_id>/translate/', views.translate_summary, name='translate_summary'),
-    path('<int:doc_id>/quiz-lang/', views.get_quiz_in_language, name='quiz_in_language'),
-    path('<int:doc_id>/flashcards-lang/', views.get_flashcards_in_language, name='flashcards_in_language'),
-]
\ No newline at end of file
+    path('<int:doc_id>/progress/', views.document_progress, name='document_progress'),
+    path('tutor/<int:doc_id>/', llm_views.tutor_view, name='tutor'),
+    path('chatbot/', llm_views.chatbot_api, name='chatbot_api'),
+    path('<int:doc_id>/multilang/', llm_views.generate_multilang_content, name='generate_multilang'),
+    path('<int:doc_id>/translate/', llm_views.translate_summary, name='translate_summary'),
+    path('<int:doc_id>/quiz-lang/', llm_views.get_quiz_in_language, name='quiz_in_language'),
+    path('<int:doc_id>/flashcards-lang/', llm_views.get_flashcards_in_language, name='flashcards_in_language'),
+]
@@ -0,0 +1,160 @@
+"""
+Offline dense retrieval for the AI tutor (optional, needs numpy)
+Passages get a local, CPU-only embedding: stemmed words plus character
+trigrams, feature-hashed into a fixed number of dimensions and weighted by
+sublinear TF-IDF. Trigrams let "photosynthetic" meet "photosynthesis" where
+the keyword index sees two different words. Each document's passage vectors
+are a float32 matrix saved as .npy and memory-mapped on load, so a question is
+scored against every passage with one matrix-vector product.
+"""
+
+import math
+import os
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # Vector retrieval is optional; the tutor falls back to BM25
+    np = None
+
+from .retrieval import INDEX_VERSION, get_index, index_key, tokenize
+
+TRIGRAM_WEIGHT = 0.5
+
+_loaded = OrderedDict()  # index key -> (vectors, idf), most recently used last
+_loaded_lock = threading.Lock()
+LOADED_MATRICES = 32
+
+
+def available():
+    return np is not None
+
+
+def dimensions():
+    return getattr(settings, 'RETRIEVAL_VECTOR_DIM', 1024)
+
+
+def vector_dir():
+    return getattr(settings, 'RETRIEVAL_VECTOR_DIR', os.path.join(settings.BASE_DIR, 'vectors'))
+
+
+def features(text):
+    """Weighted hashed features {dimension: weight} (signed, so collisions tend to cancel)"""
+    dim = dimensions()
+    counts = Counter()
+    for token in tokenize(text):
+        counts[token] += 1.0
+        padded = f'#{token}#'
+        for i in range(len(padded) - 2):
+            counts[padded[i:i + 3]] += TRIGRAM_WEIGHT
+
+    hashed = {}
+    for feature, count in counts.items():
+        h = zlib.crc32(feature.encode('utf-8'))
+        sign = 1.0 if h & 0x80000000 else -1.0
+        slot = h % dim
+        hashed[slot] = hashed.get(slot, 0.0) + sign * (1.0 + math.log(count))
+    return hashed
+
+
+def embed_rows(texts):
+    """Unweighted, unnormalized feature matrix (one row per text)"""
+    matrix = np.zeros((len(texts), dimensions()), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for slot, weight in features(text).items():
+            matrix[row, slot] = weight
+    return matrix
+
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def embed_passages(texts):
+    """(L2-normalized TF-IDF passage vectors, per-dimension IDF) for one document"""
+    raw = embed_rows(texts)
+    # IDF over this document's passages: terms in every passage say little about any of them
+    df = np.count_nonzero(raw, axis=0)
+    idf = (np.log((len(raw) + 1) / (df + 1)) + 1).astype(np.float32)
+    return normalize(raw * idf).astype(np.float32), idf
+
+
+def paths(key):
+    base = os.path.join(vector_dir(), key[:2], f'{key}.v{INDEX_VERSION}')  # Features follow the index tokenizer
+    return base + '.vectors.npy', base + '.idf.npy'
+
+
+def build_vectors(doc, index=None):
+    """Embed the document's passages (same chunks as its BM25 index) and save them"""
+    if np is None:
+        return None
+    index = index or get_index(doc)
+    text = doc.extracted_text or ''
+    vectors, idf = embed_passages([text[start:end] for start, end in index.spans])
+
+    vectors_path, idf_path = paths(index_key(doc))
+    os.makedirs(os.path.dirname(vectors_path), exist_ok=True)
+    # Write then rename so a concurrent reader never maps a half-written file
+    for path, array in ((vectors_path, vectors), (idf_path, idf)):
+        with open(path + '.part', 'wb') as file:
+            np.save(file, array)
+        os.replace(path + '.part', path)
+
+    with _loaded_lock:
+        _loaded.pop(index_key(doc), None)
+    return vectors
+
+
+def load_vectors(doc, index):
+    """(vectors, idf) for a document, memory-mapped; built first if missing or stale"""
+    key = index_key(doc)
+    with _loaded_lock:
+        entry = _loaded.get(key)
+        if entry is not None and entry[0].shape[0] == len(index.spans):
+            _loaded.move_to_end(key)
+            return entry
+
+    vectors_path, idf_path = paths(key)
+    try:
+        entry = (np.load(vectors_path, mmap_mode='r'), np.load(idf_path))
+    except (OSError, ValueError):
+        entry = None
+    if entry is None or entry[0].shape != (len(index.spans), dimensions()):
+        build_vectors(doc, index)
+        entry = (np.load(vectors_path, mmap_mode='r'), np.load(idf_path))
+
+    with _loaded_lock:
+        _loaded[key] = entry
+        _loaded.move_to_end(key)
+        while len(_loaded) > LOADED_MATRICES:
+            _loaded.popitem(last=False)
+    return entry
+
+
+def rank(vectors, idf, question, k=3):
+    """Top-k [(row, cosine similarity), ...] of passage vectors for a question, best first"""
+    if not len(vectors):
+        return []
+    query = normalize(embed_rows([question])[0] * idf)
+    if not query.any():
+        return []
+
+    scores = vectors @ query  # One batched matrix-vector product over every passage
+    k = min(k, len(scores))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(row), float(scores[row])) for row in top if scores[row] > 0]
+
+
+def search(doc, index, question, k=3):
+    """Top-k [(chunk_id, cosine similarity), ...] for a document, best first"""
+    if not index.spans:
+        return []
+    vectors, idf = load_vectors(doc, index)
+    return rank(vectors, idf, question, k)
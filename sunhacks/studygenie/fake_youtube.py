@@ -0,0 +1,110 @@
+"""
+Local stand-in for the YouTube Data API search endpoint
+Answers GET /youtube/v3/search the way fetch_youtube_videos reads it: the
+same query always gets the same videos, after a configurable delay, and a
+share of requests can fail with a 503. Point YOUTUBE_API_BASE at base_url
+(any YOUTUBE_API_KEY works) to run uploads offline:
+
+    python manage.py fake_youtube --port 8765
+    YOUTUBE_API_BASE=http://127.0.0.1:8765/youtube/v3
+"""
+
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = '/youtube/v3/search'
+
+
+def search_results(query, max_results=5):
+    """Search response for a query (the same every time)"""
+    items = []
+    for index in range(max_results):
+        video_id = hashlib.sha1(f"{query}:{index}".encode()).hexdigest()[:11]
+        items.append({
+            'kind': 'youtube#searchResult',
+            'id': {'kind': 'youtube#video', 'videoId': video_id},
+            'snippet': {
+                'title': f"{query} - Part {index + 1}",
+                'description': f"Lecture {index + 1} of a series on {query}, with worked examples.",
+                'channelTitle': f"Channel {index % 3 + 1}",
+                'thumbnails': {
+                    name: {'url': f"https://i.ytimg.com/vi/{video_id}/{name}.jpg"}
+                    for name in ('default', 'medium', 'high')
+                },
+            },
+        })
+    return {'kind': 'youtube#searchListResponse', 'pageInfo': {'totalResults': len(items)}, 'items': items}
+
+
+class FakeYouTube(ThreadingHTTPServer):
+    """Search endpoint on a local port (0 picks a free one), served from a background thread"""
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, seed=None, host='127.0.0.1'):
+        super().__init__((host, port), SearchHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/youtube/v3"
+
+    def fails(self):
+        with self.lock:
+            self.requests += 1
+            return self.random.random() < self.error_rate
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path.rstrip('/') != SEARCH_PATH:
+            return self.reply(404, {'error': {'code': 404, 'message': 'Not found'}})
+        if not params.get('key'):
+            return self.reply(403, {'error': {'code': 403, 'message': 'The request is missing a valid API key.'}})
+
+        time.sleep(self.server.latency)
+        if self.server.fails():
+            return self.reply(503, {'error': {'code': 503, 'message': 'Simulated outage'}})
+        max_results = min(int(params.get('maxResults', ['5'])[0]), 50)
+        self.reply(200, search_results(params.get('q', [''])[0], max_results))
+
+    def reply(self, status, data):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Quiet under load
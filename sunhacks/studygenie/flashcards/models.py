@@ -1,6 +1,7 @@
 from django.db import models
 from documents.models import Document
 from django.contrib.auth.models import User
+from studygenie.db import set_json_keys
 
 class Flashcard(models.Model):
     LANGUAGE_CHOICES = [
@@ -30,10 +31,9 @@ class Flashcard(models.Model):
     
     def set_translation(self, lang_code, front_text, back_text):
         """Set flashcard translation for specific language"""
-        if not self.translations:
-            self.translations = {}
-        self.translations[lang_code] = {'front': front_text, 'back': back_text}
-        self.save()
+        translation = {'front': front_text, 'back': back_text}
+        self.translations = dict(self.translations or {}, **{lang_code: translation})
+        set_json_keys(Flashcard, 'translations', lang_code, {self.pk: translation})
 
 class FlashcardReview(models.Model):
     DIFFICULTY_CHOICES = [
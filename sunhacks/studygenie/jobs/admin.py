@@ -0,0 +1,7 @@
+from django.contrib import admin
+from .models import Job
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'document', 'status', 'attempts', 'run_after', 'updated_at']
+    list_filter = ['status', 'kind']
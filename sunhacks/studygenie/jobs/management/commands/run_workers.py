@@ -0,0 +1,74 @@
+import os
+import socket
+import threading
+import time
+import traceback
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from jobs.queue import claim_next, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run background workers that process queued document jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        self.stop_event = threading.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+        threads = []
+        for i in range(options['workers']):
+            worker_id = f"{prefix}:{i}"
+            thread = threading.Thread(
+                target=self.work,
+                args=(worker_id, options['poll_interval'], options['once']),
+                name=worker_id,
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+
+        self.stdout.write(f"Started {len(threads)} worker(s)")
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after their current job...")
+            self.stop_event.set()
+            for thread in threads:
+                thread.join()
+
+    def work(self, worker_id, poll_interval, once):
+        while not self.stop_event.is_set():
+            try:
+                if not self.work_once(worker_id):
+                    if once:
+                        break
+                    self.stop_event.wait(poll_interval)
+            except Exception:
+                # One bad job (or a DB hiccup) must not take the worker thread down with it
+                self.stderr.write(f"[{worker_id}] Worker error:\n{traceback.format_exc()}")
+                self.stop_event.wait(poll_interval)
+
+        close_old_connections()
+
+    def work_once(self, worker_id):
+        """Claim and run one job; False when the queue had nothing due"""
+        close_old_connections()
+        job = claim_next(worker_id)
+        if job is None:
+            return False
+
+        started = time.monotonic()
+        ok = run_job(job)
+        elapsed = time.monotonic() - started
+        self.stdout.write(f"[{worker_id}] {job.kind} #{job.id} {'done' if ok else job.status} in {elapsed:.2f}s")
+        return True
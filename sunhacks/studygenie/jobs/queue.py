@@ -0,0 +1,212 @@
+"""
+DB-backed job queue for StudyGenie
+Jobs are rows in the Job table; workers claim them with an atomic UPDATE so
+several `manage.py run_workers` processes can share one database.
+"""
+
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+
+from studygenie.metrics import request_id_var
+
+from .models import Job
+
+_handlers = {}
+_give_up_hooks = {}
+
+
+def job_handler(kind, on_give_up=None):
+    """Register a function as the handler for jobs of the given kind
+    
+    on_give_up(job) is called when a job is failed without its handler
+    running, i.e. its worker died on the last allowed attempt.
+    """
+    def decorator(func):
+        _handlers[kind] = func
+        if on_give_up:
+            _give_up_hooks[kind] = on_give_up
+        return func
+    return decorator
+
+
+def get_handler(kind):
+    handler = _handlers.get(kind)
+    if handler is None:
+        raise KeyError(f"No job handler registered for '{kind}'")
+    return handler
+
+
+def enqueue(kind, document=None, payload=None, max_attempts=None, delay=0):
+    """Add a job to the queue (or run it right away when JOBS_EAGER is set)"""
+    job = Job.objects.create(
+        kind=kind,
+        document=document,
+        payload=payload or {},
+        max_attempts=max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 3),
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+
+    if getattr(settings, 'JOBS_EAGER', False):
+        if delay:
+            # Nothing polls the queue in eager mode, so wait for the delay on a timer thread
+            timer = threading.Timer(delay, _run_eager_later, args=[job])
+            timer.daemon = True
+            timer.start()
+        else:
+            run_eager(job)
+
+    return job
+
+
+def run_eager(job):
+    """Run a job in-process, retrying immediately until it succeeds or gives up"""
+    while job.status not in ('done', 'failed'):
+        if not _update(job, status='running', attempts=job.attempts + 1, locked_by='eager', locked_at=timezone.now()):
+            break
+        run_job(job)
+
+
+def _run_eager_later(job):
+    try:
+        run_eager(job)
+    except Exception as e:
+        print(f"[ERROR] Delayed job {job} failed: {e}")
+    finally:
+        close_old_connections()
+
+
+def _stale_before(now):
+    return now - timedelta(seconds=getattr(settings, 'JOBS_LOCK_TIMEOUT', 600))
+
+
+def _claimable(now):
+    # Queued jobs that are due, plus running jobs whose worker stopped heartbeating
+    # (only while they still have attempts left, see expire_abandoned)
+    return (
+        Q(status='queued', run_after__lte=now)
+        | Q(status='running', locked_at__lt=_stale_before(now), attempts__lt=F('max_attempts'))
+    )
+
+
+def expire_abandoned(now=None):
+    """Fail jobs whose worker died on their last allowed attempt instead of running them again"""
+    now = now or timezone.now()
+    abandoned = Job.objects.filter(status='running', locked_at__lt=_stale_before(now),
+                                   attempts__gte=F('max_attempts'))
+    expired = 0
+    for job in abandoned:
+        # Re-check the lock in the UPDATE so a late heartbeat wins over expiry
+        updated = Job.objects.filter(pk=job.pk, status='running', locked_at=job.locked_at).update(
+            status='failed',
+            locked_by='',
+            locked_at=None,
+            last_error=f"Worker {job.locked_by} stopped responding on the last attempt",
+            updated_at=now,
+        )
+        if updated:
+            expired += 1
+            print(f"[ERROR] Job {job} abandoned by {job.locked_by}, giving up")
+            hook = _give_up_hooks.get(job.kind)
+            if hook:
+                try:
+                    hook(job)
+                except Exception as e:
+                    print(f"[ERROR] Give-up hook for {job} failed: {e}")
+    return expired
+
+
+def claim_next(worker_id):
+    """Atomically claim the next due job for this worker, or return None"""
+    now = timezone.now()
+    expire_abandoned(now)
+    candidates = list(
+        Job.objects.filter(_claimable(now))
+        .order_by('run_after', 'id')
+        .values_list('id', flat=True)[:10]
+    )
+
+    for job_id in candidates:
+        claimed = Job.objects.filter(_claimable(now), id=job_id).update(
+            status='running',
+            locked_by=worker_id,
+            locked_at=now,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+
+    return None
+
+
+def retry_delay(attempts):
+    """Exponential backoff between attempts, capped at JOBS_MAX_BACKOFF seconds"""
+    base = getattr(settings, 'JOBS_RETRY_BACKOFF', 5)
+    cap = getattr(settings, 'JOBS_MAX_BACKOFF', 300)
+    return min(cap, base * (2 ** max(attempts - 1, 0)))
+
+
+def _update(job, **fields):
+    """Write fields to the job's row; False when the row is gone (e.g. its document was deleted)"""
+    for name, value in fields.items():
+        setattr(job, name, value)
+    updated = Job.objects.filter(pk=job.pk).update(updated_at=timezone.now(), **fields)
+    if not updated:
+        print(f"[INFO] Job {job} no longer exists, dropping it")
+        job.status = 'failed'
+    return bool(updated)
+
+
+@contextmanager
+def heartbeat(job):
+    """Keep renewing the job's lock while it runs so it isn't reclaimed as abandoned"""
+    interval = getattr(settings, 'JOBS_LOCK_TIMEOUT', 600) / 3
+    stopped = threading.Event()
+
+    def beat():
+        while not stopped.wait(interval):
+            try:
+                alive = Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+                    locked_at=timezone.now())
+            except Exception as e:
+                print(f"[ERROR] Heartbeat for job {job} failed: {e}")
+                continue
+            if not alive:
+                break
+        close_old_connections()
+
+    thread = threading.Thread(target=beat, name=f"heartbeat-{job.pk}", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome"""
+    token = request_id_var.set(f"job-{job.pk}")  # Log records of the job carry its ID
+    try:
+        handler = get_handler(job.kind)
+        with heartbeat(job):
+            handler(job)
+    except Exception as e:
+        print(f"[ERROR] Job {job} failed on attempt {job.attempts}: {e}")
+        last_error = traceback.format_exc()[-4000:]
+        if job.attempts < job.max_attempts:
+            _update(job, status='queued', last_error=last_error, locked_by='', locked_at=None,
+                    run_after=timezone.now() + timedelta(seconds=retry_delay(job.attempts)))
+        else:
+            _update(job, status='failed', last_error=last_error, locked_by='', locked_at=None)
+        return False
+    finally:
+        request_id_var.reset(token)
+
+    return _update(job, status='done', locked_by='', locked_at=None)
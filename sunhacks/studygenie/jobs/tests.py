@@ -0,0 +1,164 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from documents.models import Document
+from .management.commands.run_workers import Command as RunWorkersCommand
+from .models import Job
+from .queue import claim_next, enqueue, job_handler, retry_delay, run_job
+
+calls = []
+
+
+@job_handler('test_ok')
+def ok_handler(job):
+    calls.append(job.id)
+
+
+@job_handler('test_fail')
+def fail_handler(job):
+    raise RuntimeError('boom')
+
+
+@job_handler('test_delete_document')
+def delete_document_handler(job):
+    job.document.delete()
+
+
+@job_handler('test_flaky')
+def flaky_handler(job):
+    if job.attempts < 2:
+        raise RuntimeError('first attempt fails')
+    calls.append(job.id)
+
+
+@override_settings(JOBS_EAGER=False, JOBS_RETRY_BACKOFF=5, JOBS_MAX_BACKOFF=300, JOBS_LOCK_TIMEOUT=600)
+class QueueTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_claim_marks_job_running(self):
+        job = enqueue('test_ok')
+        claimed = claim_next('worker-1')
+        self.assertEqual(claimed.id, job.id)
+        self.assertEqual(claimed.status, 'running')
+        self.assertEqual(claimed.attempts, 1)
+        self.assertEqual(claimed.locked_by, 'worker-1')
+        # Nothing else is due
+        self.assertIsNone(claim_next('worker-2'))
+
+    def test_delayed_job_is_not_claimed_early(self):
+        enqueue('test_ok', delay=60)
+        self.assertIsNone(claim_next('worker-1'))
+
+    def test_successful_job_is_done(self):
+        job = enqueue('test_ok')
+        self.assertTrue(run_job(claim_next('worker-1')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.locked_by, '')
+        self.assertEqual(calls, [job.id])
+
+    def test_failed_job_is_requeued_with_backoff(self):
+        job = enqueue('test_fail')
+        before = timezone.now()
+        self.assertFalse(run_job(claim_next('worker-1')))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'queued')
+        self.assertIn('boom', job.last_error)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=5))
+
+    def test_job_fails_after_max_attempts(self):
+        job = enqueue('test_fail', max_attempts=2)
+        for _ in range(2):
+            Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            run_job(claim_next('worker-1'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(claim_next('worker-1'))
+
+    def test_retry_delay_is_exponential_and_capped(self):
+        self.assertEqual([retry_delay(n) for n in (1, 2, 3)], [5, 10, 20])
+        self.assertEqual(retry_delay(20), 300)
+
+    def test_stale_running_job_is_reclaimed(self):
+        job = enqueue('test_ok')
+        claim_next('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=601))
+        reclaimed = claim_next('worker-2')
+        self.assertEqual(reclaimed.id, job.id)
+        self.assertEqual(reclaimed.attempts, 2)
+        self.assertEqual(reclaimed.locked_by, 'worker-2')
+
+    def test_running_job_with_fresh_lock_is_not_reclaimed(self):
+        enqueue('test_ok')
+        claim_next('worker-1')
+        self.assertIsNone(claim_next('worker-2'))
+
+    def test_abandoned_job_on_last_attempt_fails(self):
+        job = enqueue('test_ok', max_attempts=1)
+        claim_next('dead-worker')
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=601))
+        self.assertIsNone(claim_next('worker-2'))
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(calls, [])
+
+    def test_job_whose_document_was_deleted(self):
+        user = User.objects.create_user('jobs-user', password='pw')
+        doc = Document.objects.create(user=user, title='gone.pdf')
+        job = enqueue('test_delete_document', document=doc)
+        self.assertFalse(run_job(claim_next('worker-1')))
+        self.assertFalse(Job.objects.filter(pk=job.pk).exists())
+
+    def test_failing_job_whose_document_was_deleted(self):
+        user = User.objects.create_user('jobs-user', password='pw')
+        doc = Document.objects.create(user=user, title='gone.pdf')
+        enqueue('test_fail', document=doc)
+        job = claim_next('worker-1')
+        doc.delete()
+        self.assertFalse(run_job(job))
+
+
+@override_settings(JOBS_EAGER=True)
+class EagerModeTests(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_job_runs_inline(self):
+        job = enqueue('test_ok')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(calls, [job.id])
+
+    def test_job_is_retried_inline(self):
+        job = enqueue('test_flaky')
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.attempts, 2)
+
+    def test_job_gives_up_inline(self):
+        job = enqueue('test_fail', max_attempts=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.attempts, 2)
+
+
+class RunWorkersTests(TestCase):
+
+    def test_worker_survives_errors(self):
+        command = RunWorkersCommand(stdout=StringIO(), stderr=StringIO())
+        command.stop_event = mock.Mock(is_set=mock.Mock(return_value=False))
+        path = 'jobs.management.commands.run_workers.claim_next'
+        with mock.patch(path, side_effect=[RuntimeError('database is locked'), None]) as claim:
+            command.work('worker-1', poll_interval=0, once=True)
+        self.assertEqual(claim.call_count, 2)
+        self.assertIn('database is locked', command.stderr._out.getvalue())
@@ -0,0 +1,10 @@
+"""
+Shared LLM access for StudyGenie
+Every Gemini call goes through the process-wide client from get_client().
+"""
+
+from .cache import cache_bypass
+from .client import LLMClient, LLMError, get_client
+from .scheduler import lane
+
+__all__ = ['LLMClient', 'LLMError', 'cache_bypass', 'get_client', 'lane']
@@ -0,0 +1,170 @@
+"""
+LLM token and cost accounting
+Every LLM call becomes an LLMCall row: estimated prompt and reply tokens,
+latency, outcome, whether the cache answered it and its cost, tagged with
+the user, document, stage and language it was made for. Tags come from the
+code the call runs under:
+
+    with tagged(document=doc, user=doc.user_id, stage='quiz'):
+        ...
+
+Requests are tagged by AccountingMiddleware (user, document from the URL,
+view name) and pipeline jobs by document_stage; the language functions add
+the language. Rows are kept in memory and written with one bulk insert once
+LLM_ACCOUNTING_BATCH calls are waiting or the oldest has waited
+LLM_ACCOUNTING_FLUSH_SECONDS (never from inside an event loop; the end of the
+next request or the process picks those up). A failed write is logged and
+dropped, it never fails the call.
+"""
+
+import asyncio
+import atexit
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.deprecation import MiddlewareMixin
+
+TAGS = ('user', 'document', 'stage', 'language')
+
+_tags = contextvars.ContextVar('llm_tags', default={})
+
+
+def enabled():
+    try:
+        return getattr(settings, 'LLM_ACCOUNTING_ENABLED', True)
+    except ImproperlyConfigured:
+        return False  # Standalone scripts: no database to write to
+
+
+def tag_value(value):
+    """Model instances (and the anonymous user) as the id stored on the row"""
+    if getattr(value, 'is_anonymous', False):
+        return None
+    return getattr(value, 'pk', value)
+
+
+def current_tags():
+    return _tags.get()
+
+
+@contextmanager
+def tagged(**tags):
+    """Tag the LLM calls made in this block; tags of enclosing blocks are kept unless overridden"""
+    unknown = set(tags) - set(TAGS)
+    if unknown:
+        raise TypeError(f"Unknown LLM call tags: {', '.join(sorted(unknown))}")
+    token = _tags.set({**_tags.get(), **{name: tag_value(value) for name, value in tags.items() if value is not None}})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def in_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class CallBuffer:
+    """LLMCall rows waiting to be written, shared by every thread of the process"""
+
+    def __init__(self):
+        self.calls = []
+        self.oldest = None
+        self.database = None
+        self.lock = threading.Lock()
+
+    def add(self, call):
+        from django.db import connection
+        with self.lock:
+            if not self.calls:
+                self.oldest = time.monotonic()
+                self.database = connection.settings_dict['NAME']
+            self.calls.append(call)
+        if self.due() and not in_event_loop():
+            self.flush()
+
+    def due(self):
+        with self.lock:
+            if not self.calls:
+                return False
+            return (len(self.calls) >= getattr(settings, 'LLM_ACCOUNTING_BATCH', 50)
+                    or time.monotonic() - self.oldest >= getattr(settings, 'LLM_ACCOUNTING_FLUSH_SECONDS', 5))
+
+    def flush(self):
+        """Write every waiting row; returns how many were written"""
+        from django.db import connection, transaction
+        from .models import LLMCall
+        with self.lock:
+            calls, self.calls = self.calls, []
+        if not calls:
+            return 0
+        if connection.settings_dict['NAME'] != self.database:
+            return 0  # Made against a test database that is gone; don't write them to the real one
+        try:
+            with transaction.atomic():  # A savepoint when called inside the caller's transaction
+                LLMCall.objects.bulk_create(calls)
+        except Exception as e:
+            print(f"Could not record {len(calls)} LLM calls: {e}")
+            return 0
+        return len(calls)
+
+
+buffer = CallBuffer()
+
+
+def flush():
+    return buffer.flush()
+
+
+def record(model_name, mode, prompt, reply, seconds, outcome, tags):
+    """Queue the row for one finished call (prompt and reply are text, or None when unknown)"""
+    if not enabled():
+        return
+    from .models import LLMCall
+    from .summarize import estimate_tokens
+    cached = outcome == 'cached'
+    prompt_tokens = estimate_tokens(prompt) if isinstance(prompt, str) else 0
+    response_tokens = estimate_tokens(reply) if reply else 0
+    cost = 0 if cached else (prompt_tokens * getattr(settings, 'LLM_PRICE_INPUT_PER_MTOK', 0)
+                             + response_tokens * getattr(settings, 'LLM_PRICE_OUTPUT_PER_MTOK', 0)) / 1e6
+    buffer.add(LLMCall(
+        user_id=tags.get('user'), document_id=tags.get('document'),
+        stage=str(tags.get('stage', ''))[:50], language=str(tags.get('language', ''))[:10],
+        model_name=model_name, mode=mode, outcome=outcome, cached=cached,
+        prompt_tokens=prompt_tokens, response_tokens=response_tokens,
+        latency_ms=round(seconds * 1000, 2), cost=cost,
+    ))
+
+
+def flush_if_due(**kwargs):
+    """request_finished handler: write what is due, including calls made by async views"""
+    if buffer.due():
+        buffer.flush()
+
+
+atexit.register(flush)
+
+
+class AccountingMiddleware(MiddlewareMixin):
+    """Tags the LLM calls of a request with its user, the document in its URL and the view name"""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        user = getattr(request, 'user', None)
+        match = request.resolver_match
+        _tags.set({
+            'user': tag_value(user) if user is not None else None,
+            'document': view_kwargs.get('doc_id'),
+            'stage': (match.url_name or match.view_name) if match else '',
+        })
+
+    def process_response(self, request, response):
+        _tags.set({})  # Worker threads are reused across requests
+        return response
@@ -0,0 +1,61 @@
+from django.contrib import admin
+from django.db.models import Avg, Count, F, Q, Sum
+
+from documents.models import Document
+from .models import CachedResponse, LLMCall
+
+@admin.register(CachedResponse)
+class CachedResponseAdmin(admin.ModelAdmin):
+    list_display = ['key', 'model_name', 'hits', 'last_used_at', 'expires_at']
+    list_filter = ['model_name']
+    search_fields = ['key']
+
+
+def usage(queryset, *fields):
+    """Calls, tokens, cost, cache hits and mean latency grouped by fields, most tokens first"""
+    return (queryset.values(*fields)
+            .annotate(calls=Count('id'), cached_calls=Count('id', filter=Q(cached=True)),
+                      prompt=Sum('prompt_tokens'), response=Sum('response_tokens'),
+                      tokens=Sum(F('prompt_tokens') + F('response_tokens')),
+                      cost_total=Sum('cost'), latency=Avg('latency_ms'))
+            .order_by('-tokens'))
+
+
+@admin.register(LLMCall)
+class LLMCallAdmin(admin.ModelAdmin):
+    """Read-only: the table is append-only. The list page adds the heaviest documents and stages for its filters"""
+    change_list_template = 'admin/llm/llmcall/change_list.html'
+    list_display = ['created_at', 'stage', 'document_id', 'user_id', 'language', 'mode', 'outcome',
+                    'prompt_tokens', 'response_tokens', 'latency_ms', 'cost']
+    list_filter = ['stage', 'mode', 'outcome', 'cached', 'language', 'model_name', 'created_at']
+    search_fields = ['stage', 'model_name']
+    date_hierarchy = 'created_at'
+    heaviest_count = 10
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        changelist = getattr(response, 'context_data', {}).get('cl')
+        if changelist is None:
+            return response  # A redirect or an error page
+        queryset = changelist.queryset.order_by()
+        documents = list(usage(queryset.exclude(document=None), 'document_id')[:self.heaviest_count])
+        titles = dict(Document.objects.filter(pk__in=[row['document_id'] for row in documents])
+                      .values_list('pk', 'title'))
+        for row in documents:
+            row['title'] = titles.get(row['document_id'], '(deleted)')
+        response.context_data.update(
+            heaviest_documents=documents,
+            heaviest_stages=list(usage(queryset, 'stage')),
+            totals=queryset.aggregate(calls=Count('id'), tokens=Sum(F('prompt_tokens') + F('response_tokens')),
+                                      cost_total=Sum('cost')),
+        )
+        return response
@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+class LlmConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'llm'
+
+    def ready(self):
+        from django.core.signals import request_finished
+        from .accounting import flush_if_due
+        request_finished.connect(flush_if_due, dispatch_uid='llm_accounting_flush')
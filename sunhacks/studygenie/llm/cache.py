@@ -0,0 +1,178 @@
+"""
+Prompt/response cache for LLM calls
+Two tiers: a per-process LRU dict in front of the CachedResponse table. A
+memory hit costs one SHA-256 and a dict lookup; the table survives restarts
+and is shared by every process. Entries expire after a TTL, and the table is
+trimmed back to its size limit by dropping the least recently used rows.
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.core.exceptions import AppRegistryNotReady, ImproperlyConfigured
+from django.db.models import F
+from django.utils import timezone
+
+_local = threading.local()
+
+
+@contextmanager
+def cache_bypass():
+    """Skip cache lookups in this thread; fresh responses still replace the stored ones"""
+    previous = getattr(_local, 'bypass', False)
+    _local.bypass = True
+    try:
+        yield
+    finally:
+        _local.bypass = previous
+
+
+def is_bypassed():
+    return getattr(_local, 'bypass', False)
+
+
+def normalize_prompt(prompt):
+    # Prompts are indented f-strings; whitespace changes don't change the request
+    return ' '.join(prompt.split())
+
+
+def cache_key(model_name, prompt, params=None):
+    """SHA-256 of (model, normalized prompt, generation params)"""
+    params = json.dumps(params or {}, sort_keys=True, default=str)
+    raw = '\0'.join([model_name, normalize_prompt(prompt), params])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class CachedReply:
+    """Stands in for a GenerativeModel response on a cache hit"""
+    cached = True
+
+    def __init__(self, text):
+        self.text = text
+
+
+class ResponseCache:
+    """Thread-safe two-tier (memory LRU + database) response cache"""
+
+    TRIM_EVERY = 100  # Stores between trims of the table
+
+    def __init__(self, ttl=7 * 24 * 3600, max_entries=5000, memory_entries=500, persist=True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.persist = persist
+        self.memory = OrderedDict()  # key -> (expires_at, text), oldest first
+        self.lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        self.stores_since_trim = 0
+        self.warned = False
+
+    def get(self, key):
+        """Cached response text, or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self.memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return entry[1]
+                del self.memory[key]
+
+        found = self._db_get(key) if self.persist else None
+        with self.lock:
+            if found is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['db_hits'] += 1
+            text, expires_at = found
+            self._remember(key, text, expires_at)
+            return text
+
+    def set(self, key, text, model_name=''):
+        expires_at = time.time() + self.ttl
+        with self.lock:
+            self._remember(key, text, expires_at)
+            self.counters['stores'] += 1
+            self.stores_since_trim += 1
+            trim = self.stores_since_trim >= self.TRIM_EVERY
+            if trim:
+                self.stores_since_trim = 0
+
+        if self.persist:
+            self._db_set(key, text, model_name, trim)
+
+    def _remember(self, key, text, expires_at):
+        # Caller holds self.lock
+        self.memory[key] = (expires_at, text)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    def _db_get(self, key):
+        try:
+            from .models import CachedResponse
+            now = timezone.now()
+            row = (CachedResponse.objects.filter(key=key, expires_at__gt=now)
+                   .values_list('response', 'expires_at').first())
+            if row is None:
+                return None
+            CachedResponse.objects.filter(key=key).update(last_used_at=now, hits=F('hits') + 1)
+            return row[0], row[1].timestamp()
+        except Exception as e:
+            self._db_failed(e)
+            return None
+
+    def _db_set(self, key, text, model_name, trim=False):
+        try:
+            from .models import CachedResponse
+            now = timezone.now()
+            CachedResponse.objects.update_or_create(key=key, defaults={
+                'model_name': model_name,
+                'response': text,
+                'last_used_at': now,
+                'expires_at': now + timedelta(seconds=self.ttl),
+            })
+            if trim:
+                self.trim()
+        except Exception as e:
+            self._db_failed(e)
+
+    def _db_failed(self, error):
+        # The cache must never break a call: fall back to the memory tier
+        if isinstance(error, (AppRegistryNotReady, ImproperlyConfigured)):
+            self.persist = False  # No Django database at all (standalone script)
+        if not self.warned:
+            self.warned = True
+            print(f"LLM cache: database tier unavailable ({error}), using the memory tier")
+
+    def trim(self):
+        """Drop expired rows, then the least recently used ones beyond max_entries"""
+        from .models import CachedResponse
+        removed, _ = CachedResponse.objects.filter(expires_at__lte=timezone.now()).delete()
+        excess = CachedResponse.objects.count() - self.max_entries
+        if excess > 0:
+            oldest = list(CachedResponse.objects.order_by('last_used_at').values_list('id', flat=True)[:excess])
+            removed += CachedResponse.objects.filter(id__in=oldest).delete()[0]
+        with self.lock:
+            self.counters['evictions'] += removed
+        return removed
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+        if self.persist:
+            from .models import CachedResponse
+            CachedResponse.objects.all().delete()
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, memory_entries=len(self.memory))
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['db_hits']) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,521 @@
+"""
+Process-wide Gemini client
+The SDK is configured and the GenerativeModel built once per process, on
+first use. The model creates its GenerativeService client (one gRPC channel)
+on the first call and keeps it, so every caller reuses that connection;
+configuring the SDK per request used to throw it away each time. Callers also
+share a concurrency limit, handed out by priority lane (interactive,
+pipeline, backfill; llm/scheduler.py), a per-call timeout, retry with
+exponential backoff for transient errors and the prompt/response cache
+(llm/cache.py).
+
+Async views (under ASGI) use generate_content_async / stream_content_async,
+which call Gemini's REST API with httpx instead of the SDK: a waiting call is
+a suspended coroutine, not a blocked thread, so one process can hold hundreds
+of them (LLM_ASYNC_MAX_CONCURRENCY). Each event loop gets its own pooled
+httpx client and semaphore. Caching and retries work as for sync calls, and
+each call is counted in flight in its lane, so sync background calls of the
+same process wait for it. The pipeline and backfill lanes also spend from a
+per-minute budget shared by every process (LLM_LANE_BUDGETS) before each call.
+
+LLM_BACKEND swaps Gemini for another backend, such as the offline fake in
+llm/fake.py used for load tests; limits, retries and caching still apply.
+Every call is timed, with its prompt and reply sizes, into the LLM histograms
+of studygenie/metrics.py, and recorded with its token estimates for
+accounting (llm/accounting.py).
+"""
+
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+
+from studygenie.metrics import LLM_PROMPT_CHARS, LLM_RESPONSE_CHARS, LLM_SECONDS, observe, timed
+
+from . import accounting
+from .cache import CachedReply, ResponseCache, cache_key, is_bypassed
+from .scheduler import LaneScheduler
+
+GEMINI_API_BASE = 'https://generativelanguage.googleapis.com/v1beta'
+PLACEHOLDER_KEYS = {'', 'your-google-ai-key', 'your-google-ai-api-key-here'}
+TRANSIENT_STATUS = {429, 500, 502, 503, 504}
+
+_client = None
+_client_lock = threading.Lock()
+
+
+class LLMError(Exception):
+    """Raised when the LLM client cannot be used (e.g. no API key configured)"""
+
+
+def is_transient(error):
+    """Whether an error is worth retrying (rate limits, timeouts, 5xx)"""
+    try:
+        from google.api_core import exceptions as google_exceptions
+        transient = (
+            google_exceptions.ResourceExhausted,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+        )
+        if isinstance(error, transient):
+            return True
+    except ImportError:
+        pass
+    try:
+        import httpx
+        if isinstance(error, httpx.TransportError):
+            return True
+        if isinstance(error, httpx.HTTPStatusError):
+            return error.response.status_code in TRANSIENT_STATUS
+    except ImportError:
+        pass
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+def chunk_text(chunk):
+    """Text of one streamed chunk ('' for chunks that only carry metadata)"""
+    try:
+        return chunk.text
+    except ValueError:
+        return ''
+
+
+class Reply:
+    """A REST API reply; callers read .text as from a GenerativeModel response"""
+    cached = False
+
+    def __init__(self, text):
+        self.text = text
+
+
+def rest_body(prompt, generation_config=None, safety_settings=None):
+    """generateContent request body for a text prompt (SDK-style snake_case settings are accepted)"""
+    if not isinstance(prompt, str):
+        raise LLMError("Async calls take a text prompt")
+    body = {'contents': [{'role': 'user', 'parts': [{'text': prompt}]}]}
+    if generation_config:
+        body['generationConfig'] = {
+            ''.join(part.capitalize() if index else part for index, part in enumerate(name.split('_'))): value
+            for name, value in dict(generation_config).items()
+        }
+    if safety_settings:
+        body['safetySettings'] = safety_settings
+    return body
+
+
+class Call:
+    """One LLM call: timed into the LLM metrics and recorded for accounting (llm/accounting.py) when it ends
+
+    Set .reply to the response (or the text streamed so far) inside the block.
+    """
+
+    def __init__(self, client, mode, prompt):
+        self.client = client
+        self.mode = mode
+        self.prompt = prompt
+        self.reply = None
+
+    def __enter__(self):
+        self.tags = accounting.current_tags()  # Taken now: a stream is read after its view has returned
+        self.started = time.perf_counter()
+        self.timer = timed(LLM_SECONDS, mode=self.mode).__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        if exc_type is GeneratorExit:
+            outcome = 'closed'
+        elif exc_type is not None:
+            outcome = 'error'
+        else:
+            outcome = 'cached' if isinstance(self.reply, CachedReply) else 'ok'
+        self.timer.labels['outcome'] = outcome
+        self.timer.__exit__(exc_type, exc, tb)
+
+        reply = self.reply
+        if isinstance(reply, list):
+            reply = ''.join(reply)
+        elif reply is not None and not isinstance(reply, str):
+            try:
+                reply = reply.text
+            except Exception:
+                reply = None  # A stream not read yet, or a blocked reply
+        if isinstance(self.prompt, str):
+            observe(LLM_PROMPT_CHARS, len(self.prompt), mode=self.mode)
+        if reply is not None and outcome != 'error':
+            observe(LLM_RESPONSE_CHARS, len(reply), mode=self.mode)
+        accounting.record(self.client.model_name, self.mode, self.prompt, reply, seconds, outcome, self.tags)
+        return False
+
+
+def reply_text(data):
+    """Text of one generateContent reply (or one streamed chunk of it)"""
+    candidates = data.get('candidates') or []
+    parts = ((candidates[0].get('content') or {}).get('parts') or []) if candidates else []
+    return ''.join(part.get('text', '') for part in parts)
+
+
+class LLMClient:
+    """Thread-safe, lazily initialised wrapper around a Gemini GenerativeModel"""
+
+    def __init__(self, api_key, model_name='gemini-1.5-flash', max_concurrency=4,
+                 timeout=30, max_retries=2, retry_backoff=1.0, cache=None,
+                 max_async_concurrency=100, api_base=GEMINI_API_BASE, http_transport=None, backend=None, lanes=None,
+                 lane_budgets=None):
+        self.api_key = api_key if api_key not in PLACEHOLDER_KEYS else None
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.scheduler = LaneScheduler(max_concurrency, lanes, lane_budgets)  # Slots for sync calls, shared out by lane
+        self.cache = cache
+        self.max_async_concurrency = max_async_concurrency
+        self.api_base = api_base.rstrip('/')
+        self.http_transport = http_transport  # httpx transport for the async calls (tests, benchmarks)
+        self.backend = backend  # Answers in place of Gemini (see build_backend); no API key needed
+        if backend is not None:
+            self.model_name = getattr(backend, 'model_name', model_name)
+            self.http_transport = http_transport or backend.transport()
+        self._model = backend
+        self._model_lock = threading.Lock()
+        self._loops = weakref.WeakKeyDictionary()  # Event loop -> (httpx.AsyncClient, asyncio.Semaphore)
+
+    def __bool__(self):
+        # Lets existing `if not client:` checks keep working without building the model
+        return self.api_key is not None or self.backend is not None
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    if not self.api_key:
+                        raise LLMError("GOOGLE_AI_API_KEY is not configured")
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                    print(f"LLM client initialized: {self.model_name} (key {self.api_key[:10]}...)")
+        return self._model
+
+    def _cache_key(self, prompt, cache, kwargs):
+        if not cache or self.cache is None or not isinstance(prompt, str):
+            return None
+        params = {name: value for name, value in kwargs.items() if name != 'request_options'}
+        return cache_key(self.model_name, prompt, params)
+
+    def _backoff(self, attempt):
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+
+    def generate_content(self, prompt, cache=True, **kwargs):
+        """Same call as GenerativeModel.generate_content, with caching, limits and retries applied
+        
+        Plain-text prompts are answered from the response cache when possible;
+        pass cache=False (or use llm.cache_bypass()) to force a fresh call.
+        """
+        mode = 'stream' if kwargs.get('stream') else 'sync'
+        with Call(self, mode, prompt) as call:
+            call.reply = response = self._generate_content(prompt, cache, **kwargs)
+        return response
+
+    def _generate_content(self, prompt, cache, **kwargs):
+        key = None if kwargs.get('stream') else self._cache_key(prompt, cache, kwargs)
+        if key is not None and not is_bypassed():
+            text = self.cache.get(key)
+            if text is not None:
+                return CachedReply(text)
+
+        response = self._generate(prompt, **kwargs)
+
+        if key is not None:
+            try:
+                text = response.text
+            except Exception:
+                text = None  # Blocked or empty candidates: nothing worth caching
+            if text:
+                self.cache.set(key, text, self.model_name)
+        return response
+
+    def stream_content(self, prompt, cache=True, **kwargs):
+        """Yield the reply's text chunk by chunk as Gemini generates it (generate_content(stream=True))
+
+        A cached reply comes back as one chunk, and a streamed reply is cached
+        once complete. Transient errors are retried until the first chunk
+        arrives; the concurrency slot is held until the stream ends or is closed.
+        """
+        with Call(self, 'stream', prompt) as call:
+            call.reply = []
+            for text in self._stream_content(prompt, cache, **kwargs):
+                call.reply.append(text)
+                yield text
+
+    def _stream_content(self, prompt, cache, **kwargs):
+        key = self._cache_key(prompt, cache, kwargs)
+        if key is not None and not is_bypassed():
+            text = self.cache.get(key)
+            if text is not None:
+                yield text
+                return
+
+        kwargs.setdefault('request_options', {'timeout': self.timeout})
+        model = self.model
+
+        attempt = 0
+        while True:
+            self.scheduler.spend_budget()
+            lane = self.scheduler.acquire()
+            try:
+                chunks = iter(model.generate_content(prompt, stream=True, **kwargs))
+                first = next(text for text in map(chunk_text, chunks) if text)
+                break
+            except StopIteration:
+                self.scheduler.release(lane)
+                raise LLMError("The model returned an empty reply")
+            except Exception as e:
+                self.scheduler.release(lane)
+                if attempt >= self.max_retries or not is_transient(e):
+                    raise
+                error = e
+            delay = self._backoff(attempt)
+            print(f"LLM stream failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+        parts = [first]
+        try:
+            yield first
+            for chunk in chunks:
+                text = chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+        finally:
+            self.scheduler.release(lane)
+        if key is not None:
+            self.cache.set(key, ''.join(parts), self.model_name)
+
+    def _generate(self, prompt, **kwargs):
+        kwargs.setdefault('request_options', {'timeout': self.timeout})
+        model = self.model
+
+        attempt = 0
+        while True:
+            self.scheduler.spend_budget()
+            with self.scheduler.slot():
+                try:
+                    return model.generate_content(prompt, **kwargs)
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_transient(e):
+                        raise
+                    error = e
+
+            # Back off outside the slot so waiting calls can use it
+            delay = self._backoff(attempt)
+            print(f"LLM call failed ({error}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+
+    def _loop_state(self):
+        """This event loop's pooled httpx client and concurrency semaphore (made on first use)"""
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            import httpx
+            if not self.api_key and self.backend is None:
+                raise LLMError("GOOGLE_AI_API_KEY is not configured")
+            http = httpx.AsyncClient(
+                base_url=self.api_base, params={'key': self.api_key} if self.api_key else None, timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_async_concurrency),
+                transport=self.http_transport,
+            )
+            state = self._loops[loop] = (http, asyncio.Semaphore(self.max_async_concurrency))
+        return state
+
+    async def generate_content_async(self, prompt, cache=True, **kwargs):
+        """Async generate_content for a text prompt; returns an object with .text"""
+        with Call(self, 'async', prompt) as call:
+            call.reply = reply = await self._generate_content_async(prompt, cache, **kwargs)
+        return reply
+
+    async def _generate_content_async(self, prompt, cache, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        kwargs.pop('request_options', None)
+        key = self._cache_key(prompt, cache, kwargs)
+        if key is not None and not is_bypassed():
+            text = await sync_to_async(self.cache.get)(key)
+            if text is not None:
+                return CachedReply(text)
+
+        body = rest_body(prompt, **kwargs)
+        http, semaphore = self._loop_state()
+        attempt = 0
+        while True:
+            if self.scheduler.has_budget():
+                await sync_to_async(self.scheduler.spend_budget)()
+            async with semaphore:
+                with self.scheduler.occupy():
+                    try:
+                        response = await http.post(f"/models/{self.model_name}:generateContent", json=body)
+                        response.raise_for_status()
+                        text = reply_text(response.json())
+                        break
+                    except Exception as e:
+                        if attempt >= self.max_retries or not is_transient(e):
+                            raise
+                        error = e
+            delay = self._backoff(attempt)
+            print(f"LLM call failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if not text:
+            raise ValueError("The model returned no text (the reply may have been blocked)")
+        if key is not None:
+            await sync_to_async(self.cache.set)(key, text, self.model_name)
+        return Reply(text)
+
+    async def stream_content_async(self, prompt, cache=True, **kwargs):
+        """Async stream_content: yield the reply's text chunk by chunk (streamGenerateContent)"""
+        with Call(self, 'async_stream', prompt) as call:
+            call.reply = []
+            async for text in self._stream_content_async(prompt, cache, **kwargs):
+                call.reply.append(text)
+                yield text
+
+    async def _stream_content_async(self, prompt, cache, **kwargs):
+        from asgiref.sync import sync_to_async
+
+        kwargs.pop('request_options', None)
+        key = self._cache_key(prompt, cache, kwargs)
+        if key is not None and not is_bypassed():
+            text = await sync_to_async(self.cache.get)(key)
+            if text is not None:
+                yield text
+                return
+
+        body = rest_body(prompt, **kwargs)
+        http, semaphore = self._loop_state()
+        parts = []
+        attempt = 0
+        while True:
+            if self.scheduler.has_budget():
+                await sync_to_async(self.scheduler.spend_budget)()
+            async with semaphore:
+                with self.scheduler.occupy():
+                    try:
+                        async with http.stream('POST', f"/models/{self.model_name}:streamGenerateContent",
+                                               params={'alt': 'sse'}, json=body) as response:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if not line.startswith('data:'):
+                                    continue
+                                text = reply_text(json.loads(line[5:]))
+                                if text:
+                                    parts.append(text)
+                                    yield text
+                        break
+                    except Exception as e:
+                        # Retried only until the first chunk: after that the caller has part of the reply
+                        if parts or attempt >= self.max_retries or not is_transient(e):
+                            raise
+                        error = e
+            delay = self._backoff(attempt)
+            print(f"LLM stream failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+        if not parts:
+            raise LLMError("The model returned an empty reply")
+        if key is not None:
+            await sync_to_async(self.cache.set)(key, ''.join(parts), self.model_name)
+
+
+def setting(name, default=None):
+    """Django setting, or environment variable when used outside Django (standalone scripts)"""
+    try:
+        return getattr(settings, name, default)
+    except ImproperlyConfigured:
+        from dotenv import load_dotenv
+        load_dotenv()
+        value = os.getenv(name)
+        if value is None or default is None:
+            return value or default
+        if isinstance(default, bool):
+            return value.lower() in ('1', 'true', 'yes')
+        return type(default)(value)
+
+
+def build_client():
+    return LLMClient(
+        api_key=setting('GOOGLE_AI_API_KEY'),
+        model_name=setting('LLM_MODEL', 'gemini-1.5-flash'),
+        max_concurrency=setting('LLM_MAX_CONCURRENCY', 4),
+        timeout=setting('LLM_TIMEOUT', 30.0),
+        max_retries=setting('LLM_MAX_RETRIES', 2),
+        retry_backoff=setting('LLM_RETRY_BACKOFF', 1.0),
+        cache=build_cache(),
+        max_async_concurrency=setting('LLM_ASYNC_MAX_CONCURRENCY', 100),
+        api_base=setting('GEMINI_API_BASE', GEMINI_API_BASE),
+        backend=build_backend(),
+        lanes=setting('LLM_LANES'),
+        lane_budgets=setting('LLM_LANE_BUDGETS'),
+    )
+
+
+def build_backend():
+    """The backend named by LLM_BACKEND: None for Gemini, 'fake' or a dotted path to a factory"""
+    name = setting('LLM_BACKEND', 'gemini')
+    if name == 'gemini':
+        return None
+    if name == 'fake':
+        from .fake import FakeLLM
+        backend = FakeLLM.from_settings()
+    else:
+        from django.utils.module_loading import import_string
+        backend = import_string(name)()
+    print(f"LLM backend: {name}")
+    return backend
+
+
+def build_cache():
+    if not setting('LLM_CACHE_ENABLED', True):
+        return None
+    return ResponseCache(
+        ttl=setting('LLM_CACHE_TTL', 7 * 24 * 3600),
+        max_entries=setting('LLM_CACHE_MAX_ENTRIES', 5000),
+        memory_entries=setting('LLM_CACHE_MEMORY_ENTRIES', 500),
+    )
+
+
+def get_client():
+    """The shared client for this process (built on first call)"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = build_client()
+                if not _client:
+                    print("WARNING: Google AI API key not configured properly", file=sys.stderr)
+                    print("Please set GOOGLE_AI_API_KEY in your .env file", file=sys.stderr)
+    return _client
+
+
+def reset_client(setting, **kwargs):
+    """Build the client again once a setting it was built from changes (e.g. override_settings in tests)"""
+    global _client
+    if setting.startswith(('LLM_ACCOUNTING_', 'LLM_PRICE_')):
+        return  # Read on every call
+    if setting in ('GOOGLE_AI_API_KEY', 'GEMINI_API_BASE') or setting.startswith('LLM_'):
+        _client = None
+
+
+setting_changed.connect(reset_client)
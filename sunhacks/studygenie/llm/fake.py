@@ -0,0 +1,254 @@
+"""
+Offline LLM backend
+With LLM_BACKEND=fake the shared client answers every prompt locally instead
+of calling Gemini, so uploads, the tutor and translations can be run and
+load-tested without an API key. Replies are built from the prompt and follow
+the shape each caller parses: JSON quiz questions and flashcards, one
+translated string per segment of a translation batch, a summary with bullet
+points that mentions the prompt's key terms, chunk notes and chat answers.
+
+Each call waits for a latency drawn from a distribution (LLM_FAKE_LATENCY,
+LLM_FAKE_LATENCY_DIST) and fails with a transient error at LLM_FAKE_ERROR_RATE,
+so the client's retries and concurrency limits are exercised as with the real
+service. Async calls go through the same fake via an httpx transport that
+speaks the REST API. A seed (LLM_FAKE_SEED) makes runs repeatable.
+
+Any other backend is a dotted path in LLM_BACKEND to a factory returning an
+object with the same interface: generate_content(prompt, stream=False, **kwargs)
+returning a reply with .text (or, with stream=True, an iterable of them), and
+transport() returning an httpx transport for the async calls.
+"""
+
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from textproc import BASIC_STOP_WORDS, token_stream
+
+from .client import setting
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+CHUNK_CHARS = 40  # Size of each streamed chunk
+
+SECTION_RE = re.compile(r'(?:DOCUMENT CONTENT|DOCUMENT|SECTION|Content):\s*(.*?)(?:\n\s*\n\s*[A-Z][^\n]*:\s*$|\Z)',
+                        re.DOTALL | re.MULTILINE)
+KEY_TERMS_RE = re.compile(r'Key Terms:\s*([^\n]*)')
+QUESTION_RE = re.compile(r'(?:Student |User )?Question:\s*([^\n]*)')
+LANGUAGE_RE = re.compile(r'(?:to|in) (English|Hindi|Marathi|Spanish|French|German)\b')
+DIFFICULTY_RE = re.compile(r'"difficulty": "(\w+)"')
+LANGUAGE_CODE_RE = re.compile(r'"language": "(\w+)"')
+COUNT_RE = re.compile(r'exactly (\d+)|Create (\d+)')
+
+
+class Latency:
+    """Random delays with a given median: fixed, uniform (0 to twice it), exponential or lognormal"""
+
+    def __init__(self, seconds=0.0, distribution='fixed', error_rate=0.0, seed=None):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution {distribution!r} (one of {', '.join(DISTRIBUTIONS)})")
+        self.seconds = seconds
+        self.distribution = distribution
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sample(self):
+        """(seconds to wait, whether this call fails)"""
+        with self.lock:
+            fails = self.random.random() < self.error_rate
+            if self.seconds <= 0 or self.distribution == 'fixed':
+                return max(self.seconds, 0), fails
+            if self.distribution == 'uniform':
+                return self.random.uniform(0, 2 * self.seconds), fails
+            if self.distribution == 'exponential':
+                return self.random.expovariate(math.log(2) / self.seconds), fails
+            return self.random.lognormvariate(math.log(self.seconds), 0.5), fails
+
+
+class FakeReply:
+    cached = False
+
+    def __init__(self, text):
+        self.text = text
+
+
+def transient_error():
+    try:
+        from google.api_core.exceptions import ServiceUnavailable
+        return ServiceUnavailable("Simulated outage (fake LLM backend)")
+    except ImportError:
+        return ConnectionError("Simulated outage (fake LLM backend)")
+
+
+def document_section(prompt):
+    match = SECTION_RE.search(prompt)
+    return match.group(1).strip() if match else prompt
+
+
+def key_terms(prompt, count=8):
+    """The prompt's listed key terms, else the most frequent longer words of its document section"""
+    match = KEY_TERMS_RE.search(prompt)
+    listed = [term.strip() for term in match.group(1).split(',') if term.strip()] if match else []
+    if len(listed) >= 2:
+        return listed[:count]
+    words = Counter(word for word in token_stream(document_section(prompt)).lower
+                    if len(word) > 4 and word not in BASIC_STOP_WORDS and not word.isdigit())
+    terms = listed + [word for word, _ in words.most_common(count)]
+    return terms[:count] or ['the topic', 'key concepts']
+
+
+def sentences(prompt, count):
+    text = ' '.join(document_section(prompt).split())
+    found = [s.strip() for s in re.split(r'(?<=[.!?])\s+', text) if len(s.split()) >= 4]
+    return (found or [text or 'The document explains its topic.'])[:count]
+
+
+class FakeLLM:
+    """Local stand-in for a GenerativeModel, with simulated latency and errors"""
+    model_name = 'fake'
+
+    def __init__(self, latency=0.0, distribution='fixed', error_rate=0.0, seed=None):
+        self.latency = Latency(latency, distribution, error_rate, seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(latency=setting('LLM_FAKE_LATENCY', 0.0),
+                   distribution=setting('LLM_FAKE_LATENCY_DIST', 'fixed'),
+                   error_rate=setting('LLM_FAKE_ERROR_RATE', 0.0),
+                   seed=setting('LLM_FAKE_SEED'))
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        delay, fails = self._call()
+        time.sleep(delay)
+        if fails:
+            raise transient_error()
+        text = self.reply(prompt)
+        if stream:
+            return iter([FakeReply(text[start:start + CHUNK_CHARS]) for start in range(0, len(text), CHUNK_CHARS)])
+        return FakeReply(text)
+
+    def transport(self):
+        """httpx transport answering the REST calls (generateContent, streamGenerateContent)"""
+        import asyncio
+        import httpx
+
+        async def respond(request):
+            delay, fails = self._call()
+            await asyncio.sleep(delay)
+            if fails:
+                return httpx.Response(503, json={'error': {'code': 503, 'message': 'Simulated outage'}})
+            prompt = json.loads(request.content)['contents'][0]['parts'][0]['text']
+            text = self.reply(prompt)
+            if request.url.path.endswith(':streamGenerateContent'):
+                body = ''.join(f"data: {json.dumps(self.payload(text[start:start + CHUNK_CHARS]))}\r\n\r\n"
+                               for start in range(0, len(text), CHUNK_CHARS))
+                return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+            return httpx.Response(200, json=self.payload(text))
+
+        return httpx.MockTransport(respond)
+
+    @staticmethod
+    def payload(text):
+        return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]}
+
+    def _call(self):
+        with self.lock:
+            self.calls += 1
+        return self.latency.sample()
+
+    def reply(self, prompt):
+        """A reply shaped like what the prompt asks for"""
+        if 'Translate each string in this JSON array' in prompt:
+            return self.translation(prompt)
+        if 'Condense this section' in prompt:
+            return ' '.join(document_section(prompt).split()[:60])
+        if '"stem"' in prompt:
+            return self.quiz(prompt)
+        if '"front"' in prompt:
+            return self.flashcards(prompt)
+        if 'MCQs' in prompt:
+            return self.mcqs(prompt)
+        if 'Write the summary in' in prompt:
+            return self.language_summary(prompt)
+        if 'Key Points:' in prompt:
+            return self.summary(prompt)
+        return self.answer(prompt)
+
+    def translation(self, prompt):
+        language = LANGUAGE_RE.search(prompt)
+        tag = (language.group(1) if language else 'English')[:2].upper()
+        strings = json.loads(prompt[prompt.index('['):prompt.rindex(']') + 1])
+        return json.dumps([f"[{tag}] {string}" for string in strings], ensure_ascii=False)
+
+    def count(self, prompt, default):
+        match = COUNT_RE.search(prompt)
+        return int(next(group for group in match.groups() if group)) if match else default
+
+    def quiz(self, prompt):
+        terms = key_terms(prompt, 10)
+        difficulty = DIFFICULTY_RE.search(prompt)
+        difficulty = difficulty.group(1) if difficulty else 'medium'
+        language = LANGUAGE_CODE_RE.search(prompt)
+        stems = {'easy': "What is {}?", 'medium': "How is {} used in this material?",
+                 'hard': "Evaluate the best approach to {} described here."}
+        questions = []
+        for index in range(self.count(prompt, 5)):
+            term = terms[index % len(terms)]
+            others = [other for other in terms if other != term][:3]
+            others += ['An unrelated idea'] * (3 - len(others))
+            question = {
+                'stem': stems.get(difficulty, stems['medium']).format(term),
+                'options': {'A': f"The document's account of {term}", 'B': others[0], 'C': others[1], 'D': others[2]},
+                'answer_key': 'A',
+                'explanation': f"The document discusses {term}.",
+                'difficulty': difficulty,
+                'topic': term,
+            }
+            if language:
+                question['language'] = language.group(1)
+            questions.append(question)
+        return json.dumps(questions, ensure_ascii=False, indent=2)
+
+    def flashcards(self, prompt):
+        language = LANGUAGE_CODE_RE.search(prompt)
+        lines = sentences(prompt, 12)
+        cards = []
+        for index, term in enumerate(key_terms(prompt, 8 if 'Generate 8-12' in prompt else 5)):
+            card = {'front': term, 'back': ' '.join(lines[index % len(lines)].split()[:20])}
+            if language:
+                card['language'] = language.group(1)
+            cards.append(card)
+        return json.dumps(cards, ensure_ascii=False, indent=2)
+
+    def mcqs(self, prompt):
+        terms = key_terms(prompt, 10)
+        return '\n'.join(f"Q{index}: What does the document say about {terms[(index - 1) % len(terms)]}?\n"
+                         f"A) Its explanation B) Nothing C) Something unrelated D) A different topic\n"
+                         f"Answer: A" for index in range(1, 11))
+
+    def summary(self, prompt):
+        """Intro plus bullet points naming the key terms, 100-200 characters as is_summary_well_formatted wants"""
+        terms = key_terms(prompt, 4)
+        first, second = terms[0], terms[1 % len(terms)]
+        intro = f"This document covers {first} and {second}.\n\nKey Points:"
+        points = [f"• {term} as explained in the text" for term in terms]
+        while len(points) > 1 and len(intro) + sum(len(point) + 1 for point in points) > 195:
+            points.pop()
+        return '\n'.join([intro] + points)[:195]
+
+    def language_summary(self, prompt):
+        language = LANGUAGE_RE.search(prompt)
+        tag = (language.group(1) if language else 'English')[:2].upper()
+        return f"[{tag}] " + ' '.join(sentences(prompt, 4))
+
+    def answer(self, prompt):
+        question = QUESTION_RE.search(prompt)
+        topic = question.group(1).strip() if question else 'your question'
+        return (f"Here is what the material says about {topic}\n"
+                + '\n'.join(f"- {line}" for line in sentences(prompt, 3)))
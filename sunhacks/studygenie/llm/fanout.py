@@ -0,0 +1,61 @@
+"""
+Concurrent fan-out of LLM calls
+Independent calls (chunks of one document, languages of one upload) run on a
+small thread pool. The pool only bounds how many threads wait; the number of
+calls actually in flight is capped process-wide by the client's scheduler
+(LLM_MAX_CONCURRENCY, shared out by lane), which every other caller shares. Each call runs in a
+copy of the caller's context, so request IDs and accounting tags carry over.
+"""
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from .cache import cache_bypass, is_bypassed
+from .client import setting
+
+
+def _task(function, bypass):
+    """function wrapped for a pool thread: same cache bypass as the caller, no leaked DB connection"""
+    def run(item):
+        try:
+            if bypass:
+                with cache_bypass():
+                    return function(item)
+            return function(item)
+        finally:
+            try:
+                from django.db import connections
+                connections.close_all()  # Connections are per thread; the pool thread's would never close
+            except Exception:
+                pass
+    return run
+
+
+def fan_out(function, items, workers=None):
+    """Yield (item, result, error) for each item as its call finishes, fastest first"""
+    items = list(items)
+    if not items:
+        return
+    run = _task(function, is_bypassed())
+    workers = min(workers or setting('LLM_FANOUT_WORKERS', 4), len(items))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='llm-fanout') as pool:
+        pending = {pool.submit(contextvars.copy_context().run, run, item): item for item in items}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                yield item, (None if error else future.result()), error
+
+
+def map_concurrently(function, items, workers=None):
+    """[function(item), ...] in input order; the first error is raised"""
+    items = list(items)
+    if len(items) <= 1:
+        return [function(item) for item in items]
+    results = {}
+    for index, result, error in fan_out(lambda index: function(items[index]), range(len(items)), workers):
+        if error:
+            raise error
+        results[index] = result
+    return [results[index] for index in range(len(items))]
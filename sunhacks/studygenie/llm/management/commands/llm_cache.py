@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from llm.client import build_cache
+from llm.models import CachedResponse
+
+
+class Command(BaseCommand):
+    help = 'Show, trim or clear the LLM prompt/response cache'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trim', action='store_true', help='Drop expired entries and trim to LLM_CACHE_MAX_ENTRIES')
+        parser.add_argument('--clear', action='store_true', help='Delete every cached response')
+
+    def handle(self, *args, **options):
+        cache = build_cache()
+        if cache is None:
+            self.stdout.write(self.style.WARNING("LLM cache is disabled (LLM_CACHE_ENABLED)"))
+            return
+
+        if options['clear']:
+            count = CachedResponse.objects.count()
+            cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} cached responses"))
+        elif options['trim']:
+            self.stdout.write(self.style.SUCCESS(f"Removed {cache.trim()} cached responses"))
+
+        totals = CachedResponse.objects.aggregate(entries=Count('id'), hits=Sum('hits'))
+        self.stdout.write(f"{totals['entries']} cached responses, {totals['hits'] or 0} hits served from the table")
+        for row in CachedResponse.objects.values('model_name').annotate(entries=Count('id'), hits=Sum('hits')):
+            self.stdout.write(f"  {row['model_name']}: {row['entries']} entries, {row['hits']} hits")
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:11
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('documents', '0012_document_analysis'),
+        ('llm', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LLMCall',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('stage', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('language', models.CharField(blank=True, max_length=10)),
+                ('model_name', models.CharField(max_length=100)),
+                ('mode', models.CharField(max_length=20)),
+                ('outcome', models.CharField(max_length=10)),
+                ('cached', models.BooleanField(default=False)),
+                ('prompt_tokens', models.IntegerField(default=0)),
+                ('response_tokens', models.IntegerField(default=0)),
+                ('latency_ms', models.FloatField(default=0)),
+                ('cost', models.FloatField(default=0)),
+                ('document', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='documents.document')),
+                ('user', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['document', 'stage'], name='llm_llmcall_documen_cd682d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('llm', '0002_llmcall'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=200, primary_key=True, serialize=False)),
+                ('tokens', models.FloatField()),
+                ('updated', models.FloatField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,51 @@
+from django.db import models
+from django.utils import timezone
+
+class CachedResponse(models.Model):
+    """A stored Gemini response, keyed by model, normalized prompt and generation params"""
+    key = models.CharField(max_length=64, unique=True)  # SHA-256, see llm/cache.py
+    model_name = models.CharField(max_length=100)
+    response = models.TextField()
+    hits = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.model_name} {self.key[:12]}"
+
+
+class LLMCall(models.Model):
+    """One LLM call and who it was for; written in batches by llm/accounting.py and never updated"""
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # No constraints: rows outlive the users and documents they were made for
+    user = models.ForeignKey('auth.User', null=True, blank=True, on_delete=models.DO_NOTHING,
+                             db_constraint=False, related_name='+')
+    document = models.ForeignKey('documents.Document', null=True, blank=True, on_delete=models.DO_NOTHING,
+                                 db_constraint=False, related_name='+')
+    stage = models.CharField(max_length=50, blank=True, db_index=True)  # Pipeline stage or view name
+    language = models.CharField(max_length=10, blank=True)
+    model_name = models.CharField(max_length=100)
+    mode = models.CharField(max_length=20)  # sync, stream, async, async_stream
+    outcome = models.CharField(max_length=10)  # ok, cached, error, closed
+    cached = models.BooleanField(default=False)
+    prompt_tokens = models.IntegerField(default=0)  # Estimated as characters / 4
+    response_tokens = models.IntegerField(default=0)
+    latency_ms = models.FloatField(default=0)
+    cost = models.FloatField(default=0)  # USD at the LLM_PRICE_* settings of the time; cached calls are free
+
+    class Meta:
+        indexes = [models.Index(fields=['document', 'stage'])]
+
+    def __str__(self):
+        return f"{self.stage or self.mode} {self.prompt_tokens}+{self.response_tokens} tokens"
+
+
+class RateLimitBucket(models.Model):
+    """Token bucket shared by every process (RATELIMIT_BACKEND='database', see llm/ratelimit.py)"""
+    key = models.CharField(max_length=200, primary_key=True)  # '<endpoint class>:user:<id>', ':ip:<address>' or 'llm:global'
+    tokens = models.FloatField()
+    updated = models.FloatField(db_index=True)  # Unix time of the last request
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,248 @@
+"""
+Token-bucket rate limiting for the LLM-backed endpoints
+Each user (or IP address, for anonymous requests) has a bucket per endpoint
+class ('chat', 'generate' in RATELIMIT_RATES) that refills at a steady rate
+up to a burst size; a request takes one token or is turned away. Admitted
+requests also take a token from one bucket shared by everyone
+(RATELIMIT_LLM_BUDGET), which caps the Gemini calls these endpoints make
+together and leaves the rest of the quota to document processing.
+
+    @rate_limited('chat', fallback=lambda request: JsonResponse(...))
+    def chatbot_api(request): ...
+
+Turned-away requests get the view's local fallback answer (when it has one
+and RATELIMIT_OVER_LIMIT is 'fallback') or a 429; both carry Retry-After.
+Buckets live in this process ('memory') or in a database table shared by
+every process ('database'; one atomic SQLite upsert per request).
+"""
+
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.http import JsonResponse
+
+logger = logging.getLogger('studygenie.ratelimit')
+
+GLOBAL_KEY = 'llm:global'
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def enabled():
+    return getattr(settings, 'RATELIMIT_ENABLED', True)
+
+
+class MemoryBackend:
+    """Buckets in a dict of this process; the least recently used are forgotten past max_keys"""
+    shared = False
+
+    def __init__(self, max_keys=10000):
+        self.buckets = OrderedDict()  # key -> (tokens, updated)
+        self.max_keys = max_keys
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, capacity, cost, now):
+        """0 if cost tokens were taken, else seconds until they would be there"""
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            if tokens >= cost:
+                self.buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                self.buckets[key] = (tokens, now)
+                wait = (cost - tokens) / rate
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)  # Idle longest: most likely full again anyway
+        return wait
+
+    def give_back(self, key, capacity, cost):
+        with self.lock:
+            if key in self.buckets:
+                tokens, updated = self.buckets[key]
+                self.buckets[key] = (min(capacity, tokens + cost), updated)
+
+
+class DatabaseBackend:
+    """Buckets in the RateLimitBucket table, so every process shares them (SQLite 3.35+ for RETURNING)"""
+    shared = True
+
+    def __init__(self, retention=3600, purge_every=1000):
+        from .models import RateLimitBucket
+        self.table = RateLimitBucket._meta.db_table
+        self.retention = retention  # Rows idle this long are full again for any sensible rate
+        self.purge_every = purge_every
+
+    def take(self, key, rate, capacity, cost, now):
+        from django.db import connection
+        table = connection.ops.quote_name(self.table)
+        refilled = "min(%s, tokens + max(0, excluded.updated - updated) * %s)"
+        with connection.cursor() as cursor:
+            # One statement, so concurrent processes cannot both spend the last token
+            cursor.execute(
+                f"INSERT INTO {table} (key, tokens, updated) VALUES (%s, %s, %s) "
+                f"ON CONFLICT(key) DO UPDATE SET tokens = {refilled} - %s, updated = excluded.updated "
+                f"WHERE {refilled} >= %s RETURNING tokens",
+                [key, capacity - cost, now, capacity, rate, cost, capacity, rate, cost],
+            )
+            admitted = cursor.fetchone() is not None
+            if not admitted:
+                cursor.execute(f"SELECT tokens, updated FROM {table} WHERE key = %s", [key])
+                tokens, updated = cursor.fetchone()
+        if random.randrange(self.purge_every) == 0:
+            self.purge(now)
+        if admitted:
+            return 0.0
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        return max(0.0, cost - tokens) / rate
+
+    def give_back(self, key, capacity, cost):
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute(f"UPDATE {connection.ops.quote_name(self.table)} SET tokens = min(%s, tokens + %s) "
+                           f"WHERE key = %s", [capacity, cost, key])
+
+    def purge(self, now):
+        from .models import RateLimitBucket
+        RateLimitBucket.objects.filter(updated__lt=now - self.retention).delete()
+
+
+BACKENDS = {'memory': MemoryBackend, 'database': DatabaseBackend}
+
+
+def per_second(rule):
+    """(requests per minute, burst) -> (tokens per second, capacity)"""
+    per_minute, burst = rule
+    return per_minute / 60, max(1, burst)
+
+
+class RateLimiter:
+    """Per-client buckets for each endpoint class, plus the global LLM budget"""
+
+    def __init__(self, backend, rates, budget=None, clock=time.time):
+        self.backend = backend
+        self.rates = rates
+        self.budget = budget
+        self.clock = clock
+
+    def admit(self, endpoint_class, client, cost=1):
+        """0 when the request may go ahead, else seconds until it could"""
+        rate, capacity = per_second(self.rates[endpoint_class])
+        key = f"{endpoint_class}:{client}"
+        now = self.clock()
+        wait = self.backend.take(key, rate, capacity, cost, now)
+        if wait or not self.budget:
+            return wait
+        budget_rate, budget_capacity = per_second(self.budget)
+        wait = self.backend.take(GLOBAL_KEY, budget_rate, budget_capacity, cost, now)
+        if wait:
+            self.backend.give_back(key, capacity, cost)  # Not the client's fault; keep its token
+        return wait
+
+    def spend_budget(self, cost=1, sleep=time.sleep):
+        """Wait until the global LLM budget has room, for background work; returns the seconds waited"""
+        return self.spend(GLOBAL_KEY, self.budget, cost, sleep)
+
+    def spend(self, key, rule, cost=1, sleep=time.sleep):
+        """Wait until the bucket under key (refilled by rule) has cost tokens and take them"""
+        if not rule:
+            return 0.0
+        rate, capacity = per_second(rule)
+        waited = 0.0
+        while True:
+            wait = self.backend.take(key, rate, capacity, cost, self.clock())
+            if not wait:
+                return waited
+            sleep(wait)
+            waited += wait
+
+
+def build_limiter():
+    name = getattr(settings, 'RATELIMIT_BACKEND', 'memory')
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown RATELIMIT_BACKEND {name!r} (choose from {', '.join(BACKENDS)})")
+    return RateLimiter(BACKENDS[name](), getattr(settings, 'RATELIMIT_RATES', {}),
+                       getattr(settings, 'RATELIMIT_LLM_BUDGET', None))
+
+
+def get_limiter():
+    """The limiter of this process (built on first use, and again after RATELIMIT_* settings change)"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = build_limiter()
+    return _limiter
+
+
+def reset_limiter(setting, **kwargs):
+    global _limiter
+    if setting.startswith('RATELIMIT_'):
+        _limiter = None
+
+
+setting_changed.connect(reset_limiter)
+
+
+def client_key(request, user):
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def posted_question(request):
+    """The 'question' of a JSON request body ('' without one), for fallback answers"""
+    try:
+        return str(json.loads(request.body).get('question', '')).strip()
+    except (ValueError, AttributeError):
+        return ''
+
+
+def over_limit(request, endpoint_class, wait, fallback):
+    retry_after = max(1, math.ceil(wait))
+    logger.info("rate limited", extra={'endpoint_class': endpoint_class, 'retry_after': retry_after,
+                                       'path': request.path})
+    if fallback is not None and getattr(settings, 'RATELIMIT_OVER_LIMIT', 'fallback') == 'fallback':
+        response = fallback(request)
+    else:
+        message = f"Too many requests. Please wait {retry_after} seconds and try again."
+        response = JsonResponse({'response': message, 'error': message, 'status': 'error',
+                                 'retry_after': retry_after}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(endpoint_class, fallback=None):
+    """Admit a view's POST requests through the limiter; fallback(request) answers those turned away"""
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method == 'POST' and enabled():
+                    from studygenie.aio import get_user
+                    limiter = get_limiter()
+                    admit = partial(limiter.admit, endpoint_class, client_key(request, await get_user(request)))
+                    wait = await sync_to_async(admit)() if limiter.backend.shared else admit()
+                    if wait:
+                        return over_limit(request, endpoint_class, wait, fallback)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method == 'POST' and enabled():
+                    wait = get_limiter().admit(endpoint_class, client_key(request, getattr(request, 'user', None)))
+                    if wait:
+                        return over_limit(request, endpoint_class, wait, fallback)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
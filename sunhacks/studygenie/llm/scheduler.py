@@ -0,0 +1,173 @@
+"""
+Priority lanes for outbound LLM calls
+Every sync call waits for a slot of the client's LLM_MAX_CONCURRENCY before
+it goes out. Calls are queued per lane:
+
+    interactive  tutor and chat questions (the default)
+    pipeline     upload processing jobs (document_stage)
+    backfill     bulk regeneration of existing documents
+
+When a slot frees up it goes to the waiting lane with the lowest virtual
+time (weighted fair queuing): a lane's virtual time advances by 1 / weight
+per call it is given, so under contention lanes get slots in proportion to
+their LLM_LANES weights, and a lane that was idle starts level with the
+others instead of cashing in the time it was away. Each lane also has its
+own cap on calls in flight; keeping the background lanes' caps below
+LLM_MAX_CONCURRENCY leaves slots free for chat however much backlog there
+is. Within a lane calls go first come, first served.
+
+Slots only arbitrate between the calls of one process, but chat, upload jobs
+(run_workers) and backfills (manage.py regenerate) normally run in different
+processes. So the background lanes also have a budget of calls per minute
+(LLM_LANE_BUDGETS), a token bucket in the RateLimitBucket table that every
+process takes from before it asks for a slot: however many workers and
+backfills run, together they leave the rest of the Gemini quota to chat.
+
+Async calls (the interactive views under ASGI) are bounded by their event
+loop's semaphore rather than queued here, but they are counted in flight in
+their lane, so background calls of the same process wait while they run.
+
+    with lane('backfill'):
+        generate_summary_with_ai(text)
+
+The lane is a context variable, so fan-out threads inherit it.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from studygenie.metrics import LLM_QUEUE_SECONDS, observe
+
+LANES = {  # name -> (weight, max in flight); see LLM_LANES in settings
+    'interactive': (6, 4),
+    'pipeline': (3, 2),
+    'backfill': (1, 1),
+}
+
+_lane = contextvars.ContextVar('llm_lane', default='interactive')
+
+
+def current_lane():
+    return _lane.get()
+
+
+@contextmanager
+def lane(name):
+    """Send the LLM calls made in this block through the named lane"""
+    token = _lane.set(name)
+    try:
+        yield
+    finally:
+        _lane.reset(token)
+
+
+class Lane:
+    def __init__(self, name, weight, max_in_flight):
+        self.name = name
+        self.weight = weight
+        self.max_in_flight = max_in_flight
+        self.waiting = deque()  # threading.Event per queued call
+        self.in_flight = 0
+        self.vtime = 0.0
+        self.granted = 0
+
+
+class LaneScheduler:
+    """Hands out capacity slots to lanes by weighted fair queuing, each lane capped at its max in flight"""
+
+    def __init__(self, capacity, lanes=None, budgets=None):
+        self.capacity = capacity
+        self.lanes = {name: Lane(name, weight, max(1, min(limit, capacity)))
+                      for name, (weight, limit) in (lanes or LANES).items()}
+        self.budgets = budgets or {}  # name -> (calls per minute, burst) shared by every process
+        self.limiter = None  # Built on the first budgeted call, so the scheduler needs no database until then
+        self.in_flight = 0
+        self.vclock = 0.0  # Virtual time of the last call given a slot
+        self.lock = threading.Lock()
+
+    def lane(self, name):
+        lane = self.lanes.get(name)
+        if lane is None:
+            raise ValueError(f"Unknown LLM lane {name!r} (choose from {', '.join(self.lanes)})")
+        return lane
+
+    def acquire(self, name=None):
+        """Wait for a slot in the lane (the current one by default); returns the lane name for release()"""
+        lane = self.lane(name or current_lane())
+        ready = threading.Event()
+        started = time.perf_counter()
+        with self.lock:
+            if not lane.waiting:
+                lane.vtime = max(lane.vtime, self.vclock)  # No credit for time spent idle
+            lane.waiting.append(ready)
+            self._dispatch()
+        ready.wait()
+        observe(LLM_QUEUE_SECONDS, time.perf_counter() - started, lane=lane.name)
+        return lane.name
+
+    def spend_budget(self, name=None, sleep=time.sleep):
+        """Wait until the lane's cross-process budget admits one more call; returns the seconds waited"""
+        name = name or current_lane()
+        rule = self.budgets.get(name)
+        if not rule:
+            return 0.0
+        if self.limiter is None:
+            from .ratelimit import DatabaseBackend, RateLimiter
+            self.limiter = RateLimiter(DatabaseBackend(), {})  # Always the table: the point is to share it
+        started = time.perf_counter()
+        waited = self.limiter.spend(f"llm:lane:{name}", rule, sleep=sleep)
+        if waited:
+            observe(LLM_QUEUE_SECONDS, time.perf_counter() - started, lane=name)
+        return waited
+
+    def has_budget(self, name=None):
+        return bool(self.budgets.get(name or current_lane()))
+
+    @contextmanager
+    def occupy(self, name=None):
+        """Count a call as in flight in its lane without queuing it (async calls, bounded elsewhere)"""
+        lane = self.lane(name or current_lane())
+        with self.lock:
+            lane.in_flight += 1
+            lane.granted += 1
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.release(lane.name)
+
+    def release(self, name):
+        with self.lock:
+            lane = self.lanes[name]
+            lane.in_flight -= 1
+            self.in_flight -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, name=None):
+        name = self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+
+    def _dispatch(self):
+        while self.in_flight < self.capacity:
+            ready = [lane for lane in self.lanes.values() if lane.waiting and lane.in_flight < lane.max_in_flight]
+            if not ready:
+                return
+            lane = min(ready, key=lambda lane: lane.vtime)  # Ties go to the lane listed first
+            self.vclock = lane.vtime
+            lane.vtime += 1 / lane.weight
+            lane.in_flight += 1
+            lane.granted += 1
+            self.in_flight += 1
+            lane.waiting.popleft().set()
+
+    def stats(self):
+        with self.lock:
+            return {name: {'waiting': len(lane.waiting), 'in_flight': lane.in_flight, 'granted': lane.granted}
+                    for name, lane in self.lanes.items()}
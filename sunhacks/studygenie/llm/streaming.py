@@ -0,0 +1,298 @@
+"""
+Streaming replies to the browser
+Chat and tutor endpoints can send a reply as Gemini generates it instead of
+waiting for all of it. The view starts the stream (start_stream), so the call
+has already produced its first chunk, or failed and taken the view's usual
+fallback path, before any response is sent. The chunks are then formatted
+into HTML incrementally (HtmlFormatter) and forwarded as server-sent events
+(sse_response):
+
+    data: {"delta": "<html to append>"}          one per chunk
+    event: error / data: {"error": "..."}         the stream broke off midway
+    event: done  / data: {"ttft_ms": ..., "total_ms": ..., "chars": ...}
+
+Time to first token is measured for every stream: it is sent in the
+X-TTFT-Ms header and the done event, logged, and kept for ttft_summary().
+Async views start theirs with start_stream_async; the response then streams
+from an async iterator, which ASGI serves without a thread.
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+from django.http import StreamingHttpResponse
+
+from studygenie.metrics import LLM_TTFT_SECONDS, observe
+
+from .client import LLMError, get_client
+
+RECENT_STREAMS = 500  # TTFT samples kept for ttft_summary()
+
+_ttft = deque(maxlen=RECENT_STREAMS)
+_ttft_lock = threading.Lock()
+
+BULLET_HTML = "<span style='color: #4facfe;'>•</span> "
+NUMBER_HTML = "<span style='color: #4facfe; font-weight: bold;'>{}</span> "
+NUMBERS = ('1.', '2.', '3.', '4.', '5.')
+
+
+def wants_stream(request, data=None):
+    """Whether the client asked for a streamed reply ("stream": true, or Accept: text/event-stream)"""
+    return bool((data or {}).get('stream')) or 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def record_ttft(ms):
+    with _ttft_lock:
+        _ttft.append(ms)
+    observe(LLM_TTFT_SECONDS, ms / 1000)
+
+
+def ttft_summary():
+    """Count, median, 95th percentile and last time to first token (ms) of recent streams"""
+    with _ttft_lock:
+        samples = list(_ttft)
+    if not samples:
+        return {'count': 0}
+    ordered = sorted(samples)
+    return {
+        'count': len(samples),
+        'p50_ms': round(ordered[len(ordered) // 2], 1),
+        'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+        'last_ms': round(samples[-1], 1),
+    }
+
+
+class StartedStream:
+    """A reply stream whose first chunk has arrived"""
+
+    def __init__(self, first, chunks, started):
+        self.first = first
+        self.chunks = chunks
+        self.started = started
+        self.ttft_ms = (time.perf_counter() - started) * 1000
+        record_ttft(self.ttft_ms)
+
+    def __iter__(self):
+        yield self.first
+        yield from self.chunks
+
+    def close(self):
+        self.chunks.close()
+
+
+class AsyncStartedStream(StartedStream):
+    """StartedStream over an async generator"""
+
+    async def __aiter__(self):
+        yield self.first
+        async for chunk in self.chunks:
+            yield chunk
+
+    async def close(self):
+        await self.chunks.aclose()
+
+
+def start_stream(prompt, client=None, **kwargs):
+    """Start streaming a reply; raises here (before anything is sent) if the call fails"""
+    client = client or get_client()
+    started = time.perf_counter()
+    chunks = client.stream_content(prompt, **kwargs)
+    try:
+        first = next(chunks)
+    except StopIteration:
+        raise LLMError("The model returned an empty reply")
+    return StartedStream(first, chunks, started)
+
+
+async def start_stream_async(prompt, client=None, **kwargs):
+    """start_stream for async views"""
+    client = client or get_client()
+    started = time.perf_counter()
+    chunks = client.stream_content_async(prompt, **kwargs)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        raise LLMError("The model returned an empty reply")
+    return AsyncStartedStream(first, chunks, started)
+
+
+class HtmlFormatter:
+    """Turns streamed reply text into HTML piece by piece
+
+    Joined together, the pieces are what the chat formatters produce for the
+    whole reply. Newlines become <br>. With markdown=True, each line is also
+    stripped, '-'/'•' bullets and '1.'-'5.' numbers are highlighted, and
+    '**' becomes <strong> (and, with emphasis=True, '*' becomes <em>). Text
+    is held back only while its formatting is undecided: the first two
+    characters of a line, a run of '*', and whitespace that may turn out to
+    be trailing.
+    """
+
+    def __init__(self, markdown=True, emphasis=False):
+        self.markdown = markdown
+        self.emphasis = emphasis
+        self.started = False  # Anything output yet (leading whitespace of the reply is dropped)
+        self.held = ''  # Plain text: whitespace waiting for more text
+        self.breaks = 0  # Line breaks waiting for the next line with content
+        self.head = ''  # Start of the current line while its prefix is undecided, else None
+        self.opened = False  # Current line has produced output
+        self.content = False  # Current line has text after its prefix
+        self.spaces = ''  # Whitespace inside the current line waiting for more text
+        self.stars = 0  # Length of the run of '*' waiting to be converted
+
+    def feed(self, text):
+        """HTML for the next chunk of the reply"""
+        if not self.markdown:
+            return self._plain(text)
+        out = []
+        for index, piece in enumerate(text.split('\n')):
+            if index:
+                out.append(self._end_line())
+                self.head, self.opened, self.content = '', False, False
+            out.append(self._line_text(piece))
+        return ''.join(out)
+
+    def close(self):
+        """HTML still held back at the end of the reply"""
+        return self._end_line() if self.markdown else ''
+
+    def _plain(self, text):
+        if not self.started:
+            text = text.lstrip()
+        body = text.rstrip()
+        if not body:
+            self.held += text
+            return ''
+        out = self.held + body
+        self.held = text[len(body):]
+        self.started = True
+        return out.replace('\n', '<br>')
+
+    def _line_text(self, text):
+        if self.head is None:
+            return self._inline(text)
+        self.head += text
+        start = self.head.lstrip()
+        if len(start) < 2:
+            return ''
+        self.head = None
+        return self._prefix(start)
+
+    def _end_line(self):
+        out = ''
+        if self.head is not None and self.head.strip():  # A line of one character
+            out = self._prefix(self.head.strip())
+        self.head = None
+        if self.stars:
+            out += self._text(self._star_run())
+        self.spaces = ''
+        if self.started:
+            self.breaks += 1
+        return out
+
+    def _prefix(self, line):
+        if line.startswith(('•', '-')):
+            return self._open() + BULLET_HTML + self._inline(line[1:])
+        if line.startswith(NUMBERS):
+            return self._open() + NUMBER_HTML.format(line[:2]) + self._inline(line[2:])
+        return self._inline(line)
+
+    def _inline(self, text):
+        out = []
+        for char in text:
+            if char == '*':
+                self.stars += 1
+                continue
+            if self.stars:
+                out.append(self._text(self._star_run()))
+            if char.isspace():
+                if self.content:
+                    self.spaces += char
+            else:
+                out.append(self._text(char))
+        return ''.join(out)
+
+    def _star_run(self):
+        strong, single = divmod(self.stars, 2)
+        self.stars = 0
+        return '<strong>' * strong + ('<em>' if self.emphasis else '*') * single
+
+    def _text(self, text):
+        out = (self._open() + self.spaces + text) if self.content else (self._open() + text)
+        self.spaces, self.content = '', True
+        return out
+
+    def _open(self):
+        """Line breaks owed before the current line's first output"""
+        if self.opened:
+            return ''
+        self.opened = True
+        out = '<br>' * self.breaks if self.started else ''
+        self.breaks, self.started = 0, True
+        return out
+
+
+def sse_event(data, event=None):
+    head = f"event: {event}\n" if event else ''
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _EventWriter:
+    """Server-sent events for one stream: formatted deltas, then an error (if any) and done"""
+
+    def __init__(self, stream, formatter, footer):
+        self.stream = stream
+        self.formatter = formatter
+        self.footer = footer
+        self.chars = 0
+
+    def delta(self, chunk):
+        self.chars += len(chunk)
+        html = self.formatter.feed(chunk)
+        return sse_event({'delta': html}) if html else ''
+
+    def error(self, error):
+        print(f"Stream broke off after {self.chars} characters: {error}")
+        return sse_event({'error': 'The reply was cut off. Please try again.'}, event='error')
+
+    def finish(self):
+        tail = self.formatter.close() + self.footer
+        total_ms = (time.perf_counter() - self.stream.started) * 1000
+        print(f"Streamed {self.chars} characters: first token {self.stream.ttft_ms:.0f} ms, total {total_ms:.0f} ms")
+        done = sse_event({'ttft_ms': round(self.stream.ttft_ms, 1), 'total_ms': round(total_ms, 1),
+                          'chars': self.chars}, event='done')
+        return (sse_event({'delta': tail}) if tail else '') + done
+
+
+def sse_response(stream, formatter=None, footer=''):
+    """StreamingHttpResponse forwarding a started stream (sync or async) as server-sent events"""
+    writer = _EventWriter(stream, formatter or HtmlFormatter(), footer)
+
+    def events():
+        try:
+            for chunk in stream:
+                yield writer.delta(chunk)
+        except Exception as e:
+            yield writer.error(e)
+        finally:
+            stream.close()
+        yield writer.finish()
+
+    async def async_events():
+        try:
+            async for chunk in stream:
+                yield writer.delta(chunk)
+        except Exception as e:
+            yield writer.error(e)
+        finally:
+            await stream.close()
+        yield writer.finish()
+
+    body = async_events() if isinstance(stream, AsyncStartedStream) else events()
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Don't let a proxy buffer the stream
+    response['X-TTFT-Ms'] = f"{stream.ttft_ms:.1f}"
+    return response
@@ -0,0 +1,143 @@
+"""
+Map-reduce condensing of long documents
+A document too long for one prompt is split into token-budgeted chunks on
+paragraph and sentence boundaries. Each chunk is turned into short notes by
+its own LLM call, run concurrently (see fanout.py). If the joined notes are still
+over budget they are condensed again, level by level, until they fit.
+
+Chunk prompts contain nothing but the chunk, so their responses are cached
+under a hash of the chunk text: summarizing the same document again, in
+another language or at another length, reuses every chunk's notes.
+condense_async does the same for async views, with the chunks' calls gathered
+on the event loop.
+"""
+
+import asyncio
+import re
+
+from .client import get_client, setting
+from .fanout import map_concurrently
+
+CHARS_PER_TOKEN = 4  # Rough average for English text; no tokenizer needed
+NOTE_WORDS = 120  # Target length of one chunk's notes
+MAX_LEVELS = 3  # Reduce rounds before giving up and truncating
+
+PARAGRAPH_RE = re.compile(r'\n\s*\n')
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+NOTES_PROMPT = """
+Condense this section of a study document into concise notes in English
+(at most {words} words). Keep the key concepts, definitions, formulas,
+numbers, procedures and examples. Use only information from the section.
+
+SECTION:
+{text}
+
+Notes:
+"""
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_text(text, max_tokens):
+    """Chunks of at most ~max_tokens, cut at paragraph, then sentence, then word boundaries"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    pieces = []
+    for paragraph in PARAGRAPH_RE.split(text):
+        paragraph = paragraph.strip()
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for sentence in SENTENCE_RE.split(paragraph):
+            while len(sentence) > max_chars:
+                cut = sentence.rfind(' ', 0, max_chars)
+                cut = cut if cut > 0 else max_chars
+                pieces.append(sentence[:cut])
+                sentence = sentence[cut:].strip()
+            pieces.append(sentence)
+
+    chunks, current = [], ''
+    for piece in pieces:
+        if not piece:
+            continue
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def chunk_notes(chunk, client=None):
+    """Short English notes for one chunk; the chunk itself (trimmed) if the call fails"""
+    client = client or get_client()
+    try:
+        response = client.generate_content(NOTES_PROMPT.format(words=NOTE_WORDS, text=chunk))
+        notes = response.text.strip()
+        if notes:
+            return notes
+    except Exception as e:
+        print(f"Chunk notes error: {e}")
+    return ' '.join(chunk.split()[:NOTE_WORDS])
+
+
+async def chunk_notes_async(chunk, client=None):
+    client = client or get_client()
+    try:
+        response = await client.generate_content_async(NOTES_PROMPT.format(words=NOTE_WORDS, text=chunk))
+        notes = response.text.strip()
+        if notes:
+            return notes
+    except Exception as e:
+        print(f"Chunk notes error: {e}")
+    return ' '.join(chunk.split()[:NOTE_WORDS])
+
+
+def estimate_calls(text, max_tokens=None):
+    """LLM calls a summary of the text takes: the notes of each chunk condense() cuts it into, plus the summary"""
+    max_tokens, chunk_tokens = _budget(max_tokens)
+    text = text or ''
+    if estimate_tokens(text) <= max_tokens:
+        return 1
+    return len(split_text(text, chunk_tokens)) + 1
+
+
+def _budget(max_tokens):
+    max_tokens = max_tokens or setting('SUMMARY_INPUT_TOKENS', 2000)
+    return max_tokens, min(max(setting('SUMMARY_CHUNK_TOKENS', 2000), 200), max_tokens)
+
+
+def condense(text, max_tokens=None, client=None):
+    """The text itself if it fits in max_tokens, else map-reduced notes that do"""
+    max_tokens, chunk_tokens = _budget(max_tokens)
+    text = text or ''
+
+    level = 0
+    while estimate_tokens(text) > max_tokens and level < MAX_LEVELS:
+        chunks = split_text(text, chunk_tokens)
+        notes = map_concurrently(lambda chunk: chunk_notes(chunk, client), chunks)
+        text = '\n\n'.join(notes)
+        level += 1
+        print(f"Condensed {len(chunks)} chunks into {estimate_tokens(text)} tokens of notes (level {level})")
+
+    # Anything still over budget after the last level is cut rather than sent
+    return text[:max_tokens * CHARS_PER_TOKEN]
+
+
+async def condense_async(text, max_tokens=None, client=None):
+    max_tokens, chunk_tokens = _budget(max_tokens)
+    text = text or ''
+
+    level = 0
+    while estimate_tokens(text) > max_tokens and level < MAX_LEVELS:
+        chunks = split_text(text, chunk_tokens)
+        notes = await asyncio.gather(*(chunk_notes_async(chunk, client) for chunk in chunks))
+        text = '\n\n'.join(notes)
+        level += 1
+        print(f"Condensed {len(chunks)} chunks into {estimate_tokens(text)} tokens of notes (level {level})")
+
+    return text[:max_tokens * CHARS_PER_TOKEN]
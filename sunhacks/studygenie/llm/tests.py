@@ -0,0 +1,743 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import httpx
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import accounting, ratelimit
+from .cache import ResponseCache, cache_bypass, cache_key
+from .client import LLMClient, build_backend, get_client, is_transient
+from .fake import FakeLLM, Latency
+from .streaming import HtmlFormatter, sse_response, start_stream, start_stream_async, ttft_summary
+from .fanout import map_concurrently
+from .models import CachedResponse, LLMCall, RateLimitBucket
+from .scheduler import LaneScheduler, current_lane, lane
+from .summarize import condense, condense_async, estimate_tokens, split_text
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModel:
+    """Answers every prompt with a numbered reply; optionally fails the first calls"""
+
+    def __init__(self, failures=(), delay=0, reply=None):
+        self.calls = 0
+        self.failures = list(failures)
+        self.delay = delay
+        self.reply = reply
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self.lock:
+            self.calls += 1
+            calls = self.calls
+            failure = self.failures.pop(0) if self.failures else None
+        time.sleep(self.delay)
+        if failure:
+            raise failure
+        text = self.reply or f"reply {calls}"
+        if kwargs.get('stream'):
+            return iter([FakeResponse(text[start:start + 5]) for start in range(0, len(text), 5)])
+        return FakeResponse(text)
+
+
+def make_client(cache=None, failures=(), delay=0, reply=None):
+    client = LLMClient(api_key='test-key', retry_backoff=0, cache=cache)
+    client._model = FakeModel(failures, delay, reply)
+    return client
+
+
+class FakeGemini(httpx.MockTransport):
+    """Gemini's REST API for the async calls: numbered replies, optional failures (status codes or errors)"""
+
+    def __init__(self, failures=(), delay=0, reply=None):
+        super().__init__(self.respond)
+        self.calls = 0
+        self.prompts = []
+        self.failures = list(failures)
+        self.delay = delay
+        self.reply = reply
+
+    async def respond(self, request):
+        self.calls += 1
+        self.prompts.append(json.loads(request.content)['contents'][0]['parts'][0]['text'])
+        failure = self.failures.pop(0) if self.failures else None
+        await asyncio.sleep(self.delay)
+        if isinstance(failure, int):
+            return httpx.Response(failure, json={'error': {'code': failure}})
+        if failure:
+            raise failure
+        text = self.reply or f"reply {self.calls}"
+        if request.url.path.endswith(':streamGenerateContent'):
+            body = ''.join(f"data: {json.dumps(self.payload(text[start:start + 5]))}\r\n\r\n"
+                           for start in range(0, len(text), 5))
+            return httpx.Response(200, text=body, headers={'Content-Type': 'text/event-stream'})
+        return httpx.Response(200, json=self.payload(text))
+
+    @staticmethod
+    def payload(text):
+        return {'candidates': [{'content': {'role': 'model', 'parts': [{'text': text}]}}]}
+
+
+def make_async_client(cache=None, failures=(), delay=0, reply=None, **kwargs):
+    return LLMClient(api_key='test-key', retry_backoff=0, cache=cache,
+                     http_transport=FakeGemini(failures, delay, reply), **kwargs)
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.client_ = make_client(ResponseCache())
+
+    def test_repeated_prompt_is_served_from_memory(self):
+        first = self.client_.generate_content("Summarize photosynthesis")
+        second = self.client_.generate_content("Summarize photosynthesis")
+        self.assertEqual(first.text, second.text)
+        self.assertTrue(second.cached)
+        self.assertEqual(self.client_._model.calls, 1)
+        stats = self.client_.cache.stats()
+        self.assertEqual((stats['memory_hits'], stats['misses'], stats['stores']), (1, 1, 1))
+
+    def test_whitespace_differences_share_an_entry(self):
+        self.client_.generate_content("Summarize\n        photosynthesis  ")
+        self.client_.generate_content("Summarize photosynthesis")
+        self.assertEqual(self.client_._model.calls, 1)
+
+    def test_generation_params_are_part_of_the_key(self):
+        self.client_.generate_content("Quiz me", generation_config={'temperature': 0.2})
+        self.client_.generate_content("Quiz me", generation_config={'temperature': 0.9})
+        self.assertEqual(self.client_._model.calls, 2)
+        self.assertNotEqual(cache_key('m', 'p', {'a': 1}), cache_key('m', 'p', {'a': 2}))
+        self.assertNotEqual(cache_key('m1', 'p'), cache_key('m2', 'p'))
+
+    def test_responses_survive_a_new_process(self):
+        self.client_.generate_content("Translate this")
+        fresh = make_client(ResponseCache())
+        self.assertEqual(fresh.generate_content("Translate this").text, "reply 1")
+        self.assertEqual(fresh._model.calls, 0)
+        self.assertEqual(fresh.cache.stats()['db_hits'], 1)
+        self.assertEqual(CachedResponse.objects.get().hits, 1)
+
+    def test_expired_entries_are_not_used(self):
+        cache = ResponseCache(ttl=0)
+        client = make_client(cache)
+        client.generate_content("Old prompt")
+        client.generate_content("Old prompt")
+        self.assertEqual(client._model.calls, 2)
+
+    def test_expired_rows_are_ignored(self):
+        self.client_.generate_content("Old prompt")
+        CachedResponse.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        fresh = make_client(ResponseCache())
+        fresh.generate_content("Old prompt")
+        self.assertEqual(fresh._model.calls, 1)
+
+    def test_memory_tier_evicts_least_recently_used(self):
+        cache = ResponseCache(memory_entries=2, persist=False)
+        client = make_client(cache)
+        for prompt in ["a", "b", "a", "c"]:
+            client.generate_content(prompt)
+        self.assertEqual(list(cache.memory), [cache_key(client.model_name, p) for p in ["a", "c"]])
+
+    def test_table_is_trimmed_to_max_entries(self):
+        cache = ResponseCache(max_entries=2)
+        client = make_client(cache)
+        for prompt in ["a", "b", "c"]:
+            client.generate_content(prompt)
+        CachedResponse.objects.filter(key=cache_key(client.model_name, "a")).update(
+            last_used_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(cache.trim(), 1)
+        self.assertFalse(CachedResponse.objects.filter(key=cache_key(client.model_name, "a")).exists())
+
+    def test_bypass_forces_a_fresh_call_and_refreshes_the_entry(self):
+        self.client_.generate_content("Regenerate me")
+        with cache_bypass():
+            fresh = self.client_.generate_content("Regenerate me")
+        self.assertEqual(fresh.text, "reply 2")
+        self.assertEqual(self.client_.generate_content("Regenerate me").text, "reply 2")
+        self.assertEqual(CachedResponse.objects.get().response, "reply 2")
+
+    def test_cache_false_skips_the_cache(self):
+        self.client_.generate_content("Chat message", cache=False)
+        self.client_.generate_content("Chat message", cache=False)
+        self.assertEqual(self.client_._model.calls, 2)
+        self.assertFalse(CachedResponse.objects.exists())
+
+    def test_memory_hit_overhead_is_well_under_a_millisecond(self):
+        prompt = "Summarize this document. " * 200
+        self.client_.generate_content(prompt)
+        started = time.perf_counter()
+        for _ in range(1000):
+            self.client_.generate_content(prompt)
+        per_hit = (time.perf_counter() - started) / 1000
+        self.assertLess(per_hit, 0.0005)
+
+
+class RetryTests(TestCase):
+
+    def test_transient_errors_are_retried(self):
+        client = make_client(failures=[TimeoutError("slow"), ConnectionError("reset")])
+        self.assertEqual(client.generate_content("Hello").text, "reply 3")
+
+    def test_other_errors_are_raised(self):
+        client = make_client(failures=[ValueError("bad request")])
+        with self.assertRaises(ValueError):
+            client.generate_content("Hello")
+        self.assertEqual(client._model.calls, 1)
+
+
+def long_document(paragraphs=8, words=400):
+    return '\n\n'.join(' '.join(f"topic{p}word{w}" for w in range(words)) for p in range(paragraphs))
+
+
+@override_settings(SUMMARY_INPUT_TOKENS=2000, SUMMARY_CHUNK_TOKENS=2000, LLM_FANOUT_WORKERS=4)
+class SummarizeTests(TestCase):
+
+    def test_short_text_is_sent_unchanged(self):
+        client = make_client()
+        self.assertEqual(condense("A short page.", client=client), "A short page.")
+        self.assertEqual(client._model.calls, 0)
+
+    def test_chunks_respect_the_budget_and_keep_every_word(self):
+        text = long_document()
+        chunks = split_text(text, 1000)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(estimate_tokens(chunk) <= 1000 for chunk in chunks))
+        self.assertEqual(' '.join(chunks).split(), text.split())
+
+    def test_long_text_is_condensed_to_fit(self):
+        client = make_client()
+        text = long_document()
+        notes = condense(text, client=client)
+        self.assertLessEqual(estimate_tokens(notes), 2000)
+        self.assertEqual(client._model.calls, len(split_text(text, 2000)))
+
+    def test_chunks_are_condensed_concurrently(self):
+        client = make_client(delay=0.1)
+        text = long_document()
+        chunk_count = len(split_text(text, 2000))
+        started = time.perf_counter()
+        condense(text, client=client)
+        self.assertLess(time.perf_counter() - started, chunk_count * 0.1 / 2)
+
+    def test_chunk_notes_are_reused(self):
+        text = long_document()
+        client = make_client(ResponseCache(persist=False))
+        first = condense(text, client=client)
+        calls = client._model.calls
+        self.assertEqual(condense(text, client=client), first)
+        self.assertEqual(client._model.calls, calls)
+
+    def test_bypass_reaches_the_pool_threads(self):
+        text = long_document()
+        client = make_client(ResponseCache(persist=False))
+        condense(text, client=client)
+        calls = client._model.calls
+        with cache_bypass():
+            condense(text, client=client)
+        self.assertEqual(client._model.calls, calls * 2)
+
+    def test_failed_chunk_falls_back_to_its_text(self):
+        client = make_client(failures=[ValueError("blocked")])
+        notes = condense(long_document(), client=client)
+        self.assertIn('topic', notes)
+
+
+async def read_body(response):
+    return b''.join([part async for part in response.streaming_content])
+
+
+def sse_events(response, body=None):
+    """[(event, data), ...] of a server-sent events response (sync or async)"""
+    if body is None:
+        body = async_to_sync(read_body)(response) if response.is_async else b''.join(response.streaming_content)
+    events = []
+    for block in body.decode().strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines.get('event', 'message'), json.loads(lines['data'])))
+    return events
+
+
+class StreamingTests(TestCase):
+    REPLY = "Photosynthesis:\n- **Light** reactions\n\n1. Calvin cycle *fixes* carbon\n"
+
+    def test_chunks_arrive_in_order_and_the_reply_is_cached(self):
+        client = make_client(ResponseCache(), reply=self.REPLY)
+        chunks = list(client.stream_content("Explain photosynthesis"))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), self.REPLY)
+
+        self.assertEqual(list(client.stream_content("Explain photosynthesis")), [self.REPLY])
+        self.assertEqual(client.generate_content("Explain photosynthesis").text, self.REPLY)
+        self.assertEqual(client._model.calls, 1)
+
+    def test_errors_before_the_first_chunk_are_retried(self):
+        client = make_client(failures=[TimeoutError("slow")], reply=self.REPLY)
+        self.assertEqual(''.join(client.stream_content("Hello")), self.REPLY)
+        self.assertEqual(client._model.calls, 2)
+
+    def test_closing_a_stream_frees_its_slot(self):
+        client = make_client(reply=self.REPLY)
+        stream = start_stream("Hello", client)
+        self.assertEqual(client.scheduler.in_flight, 1)
+        stream.close()
+        self.assertEqual(client.scheduler.in_flight, 0)
+
+    def test_incremental_html_matches_the_whole_reply_formatted(self):
+        from dashboard.ai_assistant import ai_assistant
+        from documents.views import format_ai_response
+        for formatter, whole in ((HtmlFormatter(), format_ai_response),
+                                 (HtmlFormatter(emphasis=True), ai_assistant.format_response)):
+            html = ''.join(formatter.feed(self.REPLY[start:start + 3]) for start in range(0, len(self.REPLY), 3))
+            self.assertEqual(html + formatter.close(), whole(self.REPLY.strip()))
+
+    def test_server_sent_events_carry_time_to_first_token(self):
+        client = make_client(reply=self.REPLY)
+        before = ttft_summary()['count']
+        response = sse_response(start_stream("Hello", client), HtmlFormatter(markdown=False), footer='<br>end')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('X-TTFT-Ms', response)
+
+        events = sse_events(response)
+        html = ''.join(data['delta'] for event, data in events if event == 'message')
+        self.assertEqual(html, self.REPLY.strip().replace('\n', '<br>') + '<br>end')
+        event, done = events[-1]
+        self.assertEqual(event, 'done')
+        self.assertEqual(done['chars'], len(self.REPLY))
+        self.assertGreaterEqual(done['total_ms'], done['ttft_ms'])
+        self.assertEqual(ttft_summary()['count'], before + 1)
+
+
+class AsyncClientTests(TestCase):
+    REPLY = StreamingTests.REPLY
+
+    def test_reply_comes_from_the_rest_api_and_is_cached(self):
+        client = make_async_client(ResponseCache())
+        first = async_to_sync(client.generate_content_async)("Summarize photosynthesis",
+                                                             generation_config={'max_output_tokens': 50})
+        self.assertEqual(first.text, 'reply 1')
+        self.assertFalse(first.cached)
+
+        second = async_to_sync(client.generate_content_async)("Summarize  photosynthesis",
+                                                              generation_config={'max_output_tokens': 50})
+        self.assertTrue(second.cached)
+        self.assertEqual(client.http_transport.calls, 1)
+        self.assertEqual(client.http_transport.prompts, ["Summarize photosynthesis"])
+
+    def test_generation_config_is_sent_in_rest_form(self):
+        from .client import rest_body
+        body = rest_body("Hi", generation_config={'max_output_tokens': 50, 'temperature': 0.2})
+        self.assertEqual(body['generationConfig'], {'maxOutputTokens': 50, 'temperature': 0.2})
+
+    def test_transient_statuses_are_retried(self):
+        client = make_async_client(failures=[503, httpx.ConnectError("reset")])
+        self.assertEqual(async_to_sync(client.generate_content_async)("Hello").text, 'reply 3')
+
+        client = make_async_client(failures=[400])
+        with self.assertRaises(httpx.HTTPStatusError):
+            async_to_sync(client.generate_content_async)("Hello")
+        self.assertEqual(client.http_transport.calls, 1)
+
+    def test_calls_wait_on_the_loop_not_on_threads(self):
+        client = make_async_client(delay=0.2, max_async_concurrency=50)
+
+        async def many():
+            return await asyncio.gather(*(client.generate_content_async(f"Question {n}") for n in range(50)))
+
+        threads = threading.active_count()
+        started = time.perf_counter()
+        replies = async_to_sync(many)()
+        self.assertLess(time.perf_counter() - started, 2)  # 50 x 0.2 s one after another would be 10 s
+        self.assertEqual(len(replies), 50)
+        self.assertLessEqual(threading.active_count(), threads + 1)
+
+    def test_concurrency_is_capped_per_loop(self):
+        client = make_async_client(delay=0.1, max_async_concurrency=2)
+
+        async def many():
+            started = time.perf_counter()
+            await asyncio.gather(*(client.generate_content_async(f"Question {n}") for n in range(4)))
+            return time.perf_counter() - started
+
+        self.assertGreaterEqual(async_to_sync(many)(), 0.2)
+
+    def test_streamed_reply_matches_the_sync_stream(self):
+        client = make_async_client(ResponseCache(), reply=self.REPLY)
+        response, body = async_to_sync(self.stream)(client)  # Started and read on one event loop, as under ASGI
+        self.assertTrue(response.is_async)
+        events = sse_events(response, body)
+        html = ''.join(data['delta'] for event, data in events if event == 'message')
+        self.assertEqual(html, self.REPLY.strip().replace('\n', '<br>'))
+        self.assertEqual(events[-1][0], 'done')
+        self.assertEqual(client.cache.get(cache_key(client.model_name, "Hello")), self.REPLY)
+
+    async def stream(self, client):
+        response = sse_response(await start_stream_async("Hello", client), HtmlFormatter(markdown=False))
+        return response, await read_body(response)
+
+    def test_long_text_is_condensed_with_gathered_calls(self):
+        client = make_async_client(delay=0.1)
+        started = time.perf_counter()
+        notes = async_to_sync(condense_async)(long_document(), max_tokens=500, client=client)
+        self.assertLess(time.perf_counter() - started, 0.1 * client.http_transport.calls)
+        self.assertLessEqual(estimate_tokens(notes), 500)
+
+
+NOTES = """Photosynthesis converts light energy into chemical energy in chloroplasts.
+Chlorophyll absorbs light and drives the light reactions, which split water and release oxygen.
+The Calvin cycle uses carbon dioxide, ATP and NADPH to build glucose in the stroma.
+Photosynthesis rates depend on light intensity, carbon dioxide concentration and temperature."""
+
+
+class FakeBackendTests(TestCase):
+
+    def setUp(self):
+        self.client = LLMClient(api_key=None, cache=None, retry_backoff=0, backend=FakeLLM(seed=1))
+
+    def test_client_works_without_an_api_key(self):
+        self.assertTrue(self.client)
+        self.assertEqual(self.client.model_name, 'fake')
+        self.assertIn('Photosynthesis', self.client.generate_content("Student Question: Photosynthesis?").text)
+
+    def test_replies_pass_the_callers_parsing(self):
+        import ai_services
+        with patch.object(ai_services, 'client', self.client):
+            summary = ai_services.generate_summary_with_ai(NOTES)
+            quiz = ai_services.generate_quiz_with_ai(NOTES, 'easy')
+            cards = ai_services.generate_flashcards_with_ai(NOTES)
+            language_quiz = ai_services.generate_quiz_with_language(NOTES, 'hi', 'hard')
+        self.assertTrue(summary.startswith("This document covers"))
+        self.assertTrue(ai_services.is_summary_well_formatted(summary, ai_services.get_analysis(NOTES).key_terms))
+        self.assertEqual(len(quiz), 10)
+        self.assertTrue(all(q['stem'].startswith('What is') and q['answer_key'] in q['options'] for q in quiz))
+        self.assertTrue(all(card['front'] and card['back'] for card in cards))
+        self.assertEqual(len(language_quiz), 5)
+        self.assertEqual({q['language'] for q in language_quiz}, {'hi'})
+
+    def test_translation_batches_line_up(self):
+        from documents.translation import translate_text
+        translated = translate_text(NOTES, 'es', client=self.client)
+        self.assertEqual(translated.count('[SP]'), 4)
+
+    def test_errors_are_transient_and_retried(self):
+        client = LLMClient(api_key=None, cache=None, retry_backoff=0, max_retries=1,
+                           backend=FakeLLM(error_rate=1.0))
+        with self.assertRaises(Exception) as raised:
+            client.generate_content("Hello")
+        self.assertTrue(is_transient(raised.exception))
+        self.assertEqual(client.backend.calls, 2)
+
+    def test_seeded_latencies_repeat(self):
+        first, second = (Latency(0.2, 'lognormal', 0.3, seed=7) for _ in range(2))
+        samples = [first.sample() for _ in range(20)]
+        self.assertEqual(samples, [second.sample() for _ in range(20)])
+        self.assertTrue(any(fails for _, fails in samples))
+
+    def test_async_calls_use_the_same_fake(self):
+        reply = async_to_sync(self.client.generate_content_async)("Condense this section\n\nSECTION:\nCells divide.")
+        self.assertEqual(reply.text, "Cells divide.")
+        self.assertEqual(self.client.backend.calls, 1)
+
+    @override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY=0.0, LLM_FAKE_ERROR_RATE=0.0)
+    def test_backend_is_chosen_by_setting(self):
+        self.assertIsInstance(build_backend(), FakeLLM)
+
+
+@override_settings(LLM_ACCOUNTING_BATCH=3, LLM_ACCOUNTING_FLUSH_SECONDS=3600,
+                   LLM_PRICE_INPUT_PER_MTOK=1.0, LLM_PRICE_OUTPUT_PER_MTOK=2.0)
+class AccountingTests(TestCase):
+
+    def setUp(self):
+        accounting.flush()  # Calls left over from other tests
+        LLMCall.objects.all().delete()
+
+    def test_calls_are_tagged_and_written_in_batches(self):
+        client = make_client(ResponseCache(), reply='x' * 40)
+        with accounting.tagged(stage='quiz', language='hi'):
+            client.generate_content("Explain osmosis")
+            client.generate_content("Explain osmosis")
+            self.assertEqual(LLMCall.objects.count(), 0)
+            client.generate_content("Explain diffusion")
+        calls = list(LLMCall.objects.order_by('id'))
+        self.assertEqual([call.outcome for call in calls], ['ok', 'cached', 'ok'])
+        self.assertEqual({(call.stage, call.language, call.mode) for call in calls}, {('quiz', 'hi', 'sync')})
+        self.assertEqual((calls[0].prompt_tokens, calls[0].response_tokens), (4, 11))
+        self.assertAlmostEqual(calls[0].cost, (4 * 1.0 + 11 * 2.0) / 1e6)
+        self.assertEqual(calls[1].cost, 0)
+        self.assertTrue(calls[1].cached)
+
+    def test_fan_out_threads_keep_the_callers_tags(self):
+        client = make_client()
+        with accounting.tagged(stage='summary', user=7):
+            map_concurrently(client.generate_content, ['one', 'two'])
+        accounting.flush()
+        self.assertEqual(set(LLMCall.objects.values_list('stage', 'user_id')), {('summary', 7)})
+
+    def test_failed_and_abandoned_calls_are_recorded(self):
+        client = make_client(failures=[ValueError('blocked')], reply='A long streamed reply')
+        with self.assertRaises(ValueError):
+            client.generate_content("Explain osmosis")
+        stream = client.stream_content("Explain diffusion")
+        next(stream)
+        stream.close()
+        accounting.flush()
+        self.assertEqual(list(LLMCall.objects.order_by('id').values_list('mode', 'outcome', 'response_tokens')),
+                         [('sync', 'error', 0), ('stream', 'closed', 2)])
+
+    @override_settings(LLM_ACCOUNTING_BATCH=1)
+    def test_async_calls_are_written_outside_the_event_loop(self):
+        client = make_async_client()
+        async_to_sync(client.generate_content_async)("Explain osmosis")
+        self.assertEqual(LLMCall.objects.count(), 0)  # No database access from the loop
+        accounting.flush_if_due()
+        self.assertEqual(LLMCall.objects.get().mode, 'async')
+
+    @override_settings(LLM_ACCOUNTING_ENABLED=False)
+    def test_disabled_accounting_records_nothing(self):
+        make_client().generate_content("Explain osmosis")
+        self.assertEqual(accounting.flush(), 0)
+
+    def test_admin_shows_the_heaviest_documents_and_stages(self):
+        from django.contrib.auth.models import User
+        from documents.models import Document
+        admin = User.objects.create_superuser('accountant', password='pw')
+        small, large = (Document.objects.create(user=admin, title=title) for title in ('small.pdf', 'large.pdf'))
+        LLMCall.objects.bulk_create([
+            LLMCall(document=small, stage='quiz', model_name='m', mode='sync', outcome='ok', prompt_tokens=10),
+            LLMCall(document=large, stage='summary', model_name='m', mode='sync', outcome='ok', prompt_tokens=900),
+            LLMCall(document=large, stage='quiz', model_name='m', mode='sync', outcome='ok', prompt_tokens=50),
+            LLMCall(stage='chatbot_api', model_name='m', mode='sync', outcome='ok', prompt_tokens=20),
+        ])
+        self.client.force_login(admin)
+        response = self.client.get('/admin/llm/llmcall/')
+        self.assertEqual([row['title'] for row in response.context['heaviest_documents']], ['large.pdf', 'small.pdf'])
+        self.assertEqual([(row['stage'], row['tokens']) for row in response.context['heaviest_stages']],
+                         [('summary', 900), ('quiz', 60), ('chatbot_api', 20)])
+        self.assertContains(response, 'large.pdf')
+
+        response = self.client.get('/admin/llm/llmcall/', {'document__id__exact': small.id})
+        self.assertEqual([(row['stage'], row['tokens']) for row in response.context['heaviest_stages']], [('quiz', 10)])
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimitTests(TestCase):
+    RATES = {'chat': (60, 2)}  # One request a second, bursts of two
+
+    def limiter(self, backend, budget=None, clock=None):
+        return ratelimit.RateLimiter(backend, self.RATES, budget, clock or Clock())
+
+    def check_bucket(self, backend):
+        limiter = self.limiter(backend)
+        self.assertEqual([limiter.admit('chat', 'user:1') for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(limiter.admit('chat', 'user:1'), 1.0)
+        self.assertEqual(limiter.admit('chat', 'user:2'), 0)  # Other clients have their own bucket
+        limiter.clock.now += 0.5
+        self.assertAlmostEqual(limiter.admit('chat', 'user:1'), 0.5)
+        limiter.clock.now += 0.5
+        self.assertEqual(limiter.admit('chat', 'user:1'), 0)
+
+    def check_budget(self, backend):
+        limiter = self.limiter(backend, budget=(60, 2))
+        self.assertEqual([limiter.admit('chat', f'ip:{n}') for n in range(2)], [0, 0])
+        self.assertAlmostEqual(limiter.admit('chat', 'ip:2'), 1.0)
+        limiter.clock.now += 1
+        # The refused client kept its token: its burst is still two once the budget allows
+        self.assertEqual(limiter.admit('chat', 'ip:2'), 0)
+        limiter.budget = None
+        self.assertEqual(limiter.admit('chat', 'ip:2'), 0)
+        self.assertGreater(limiter.admit('chat', 'ip:2'), 0)
+
+    def test_memory_bucket_refills_over_time(self):
+        self.check_bucket(ratelimit.MemoryBackend())
+
+    def test_database_bucket_refills_over_time(self):
+        self.check_bucket(ratelimit.DatabaseBackend())
+
+    def test_global_budget_is_shared_by_all_clients(self):
+        self.check_budget(ratelimit.MemoryBackend())
+        self.check_budget(ratelimit.DatabaseBackend())
+
+    def test_database_buckets_are_shared_between_processes(self):
+        clock = Clock()
+        first, second = (self.limiter(ratelimit.DatabaseBackend(), clock=clock) for _ in range(2))
+        self.assertEqual((first.admit('chat', 'user:1'), second.admit('chat', 'user:1')), (0, 0))
+        self.assertGreater(first.admit('chat', 'user:1'), 0)
+        clock.now += 3600 * 2
+        ratelimit.DatabaseBackend().purge(clock.now)
+        self.assertEqual(RateLimitBucket.objects.count(), 0)
+
+    def test_memory_backend_forgets_idle_clients(self):
+        backend = ratelimit.MemoryBackend(max_keys=2)
+        limiter = self.limiter(backend)
+        for client in ('a', 'b', 'c'):
+            limiter.admit('chat', client)
+        self.assertEqual(list(backend.buckets), ['chat:b', 'chat:c'])
+
+
+@override_settings(RATELIMIT_RATES={'chat': (1, 1), 'generate': (1, 1)}, RATELIMIT_LLM_BUDGET=None,
+                   GOOGLE_AI_API_KEY='')
+@override_settings(LLM_BACKEND='fake', LLM_FAKE_LATENCY=0.0, LLM_FAKE_ERROR_RATE=0.0)
+class RateLimitedViewTests(TestCase):
+    """Admitted requests are answered by the offline fake, never by Gemini"""
+
+    def setUp(self):
+        ratelimit.reset_limiter('RATELIMIT_RATES')  # Fresh buckets for each test
+
+    def ask(self, question='What is osmosis?', **extra):
+        return self.client.post('/documents/chatbot/', json.dumps({'question': question}),
+                                content_type='application/json', **extra)
+
+    def test_over_limit_requests_get_the_fallback_answer(self):
+        first = self.ask()
+        self.assertNotIn('Retry-After', first)
+        second = self.ask()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Retry-After'], '60')
+        self.assertTrue(second.json()['response'])
+        self.assertNotIn('Retry-After', self.ask(REMOTE_ADDR='10.0.0.2'))  # Another client
+
+    @override_settings(RATELIMIT_OVER_LIMIT='reject')
+    def test_over_limit_requests_can_be_rejected(self):
+        self.ask()
+        response = self.ask()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual((response['Retry-After'], response.json()['retry_after']), ('60', 60))
+
+    @override_settings(RATELIMIT_OVER_LIMIT='reject', RATELIMIT_BACKEND='database')
+    def test_async_views_are_limited(self):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import AsyncRequestFactory
+        from documents import async_views
+
+        def request():
+            request = AsyncRequestFactory().post('/documents/chatbot/', {'question': 'Hi'},
+                                                 content_type='application/json')
+            request.user = AnonymousUser()
+            return async_to_sync(async_views.chatbot_api)(request)
+
+        self.assertEqual(request().status_code, 200)
+        self.assertEqual(request().status_code, 429)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_limits_can_be_turned_off(self):
+        self.assertFalse(any('Retry-After' in self.ask() for _ in range(3)))
+
+    def test_overridden_backend_is_used(self):
+        self.assertIsInstance(get_client().backend, FakeLLM)
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.001)
+
+
+class SchedulerTests(TestCase):
+    LANES = {'interactive': (6, 4), 'pipeline': (3, 2), 'backfill': (1, 1)}
+
+    def queue(self, scheduler, lanes):
+        """Start a thread per lane name that takes a slot, notes its lane and gives the slot back"""
+        order = []
+
+        def call(name):
+            with scheduler.slot(name):
+                order.append(name)
+
+        def waiting():
+            return sum(stats['waiting'] for stats in scheduler.stats().values())
+
+        for name in lanes:
+            before = waiting()
+            threading.Thread(target=call, args=(name,), daemon=True).start()
+            wait_until(lambda: waiting() > before)
+        return order
+
+    def test_slots_go_to_lanes_by_weight(self):
+        scheduler = LaneScheduler(1, self.LANES)
+        held = scheduler.acquire('pipeline')
+        order = self.queue(scheduler, ['backfill'] * 3 + ['interactive'] * 3)
+        scheduler.release(held)
+        wait_until(lambda: len(order) == 6)
+        # Interactive first and more often, but backfill is not starved
+        self.assertEqual(order, ['interactive', 'backfill', 'interactive', 'interactive', 'backfill', 'backfill'])
+
+    def test_each_lane_is_capped(self):
+        scheduler = LaneScheduler(3, self.LANES)
+        held = scheduler.acquire('backfill')
+        order = self.queue(scheduler, ['backfill'])
+        self.assertEqual(order, [])  # Two slots are free, but not for backfill
+        with scheduler.slot('interactive'):
+            self.assertEqual(scheduler.stats()['interactive']['in_flight'], 1)
+        scheduler.release(held)
+        wait_until(lambda: order == ['backfill'])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_unknown_lane_is_rejected(self):
+        with self.assertRaises(ValueError):
+            LaneScheduler(1).acquire('urgent')
+
+    def test_async_calls_count_in_their_lane(self):
+        scheduler = LaneScheduler(1, self.LANES)
+        with scheduler.occupy('interactive'):
+            self.assertEqual(scheduler.stats()['interactive']['in_flight'], 1)
+            order = self.queue(scheduler, ['pipeline'])
+            self.assertEqual(order, [])  # The async call holds the process's only slot
+        wait_until(lambda: order == ['pipeline'])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_lane_budget_is_shared_between_processes(self):
+        budgets = {'pipeline': (600, 2)}
+        worker, backfill = LaneScheduler(2, self.LANES, budgets), LaneScheduler(2, self.LANES, budgets)
+        waits = []
+
+        def sleep(seconds):
+            waits.append(seconds)
+            time.sleep(seconds)
+
+        self.assertEqual(worker.spend_budget('pipeline', sleep), 0)
+        self.assertEqual(worker.spend_budget('pipeline', sleep), 0)
+        self.assertGreater(backfill.spend_budget('pipeline', sleep), 0)  # The burst was spent by the other one
+        self.assertTrue(waits)
+        self.assertTrue(RateLimitBucket.objects.filter(key='llm:lane:pipeline').exists())
+        self.assertEqual(worker.spend_budget('interactive', sleep), 0)  # Chat has no lane budget
+        self.assertFalse(RateLimitBucket.objects.filter(key='llm:lane:interactive').exists())
+
+    def test_fan_out_threads_keep_the_lane(self):
+        with lane('pipeline'):
+            self.assertEqual(map_concurrently(lambda _: current_lane(), range(3)), ['pipeline'] * 3)
+        self.assertEqual(current_lane(), 'interactive')
+
+    def test_chat_latency_stays_flat_during_a_backfill(self):
+        client = LLMClient(api_key='test-key', retry_backoff=0, max_concurrency=2, lanes=self.LANES)
+        client._model = FakeModel(delay=0.05)
+        def run_backfill():
+            with lane('backfill'):
+                map_concurrently(client.generate_content, [f"doc {n}" for n in range(20)], 8)
+
+        backfill = threading.Thread(target=run_backfill, daemon=True)
+        backfill.start()
+        wait_until(lambda: client.scheduler.stats()['backfill']['waiting'] > 5)
+        started = time.perf_counter()
+        client.generate_content("What is osmosis?")
+        elapsed = time.perf_counter() - started
+        self.assertLess(elapsed, 0.04 + 0.05 * 2)  # Its own call, not the backfill queue ahead of it
+        self.assertGreater(client.scheduler.stats()['backfill']['waiting'], 0)
+        backfill.join()
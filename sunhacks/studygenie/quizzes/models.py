@@ -37,6 +37,13 @@ class Question(models.Model):
 
     def __str__(self):
         return self.stem[:50]
+    
+    def get_translation(self, lang_code):
+        """Question text (stem, options, explanation) in a language, the original if not translated"""
+        original = {'stem': self.stem, 'options': self.options, 'explanation': self.explanation}
+        if lang_code == self.quiz.language:
+            return original
+        return self.translations.get(lang_code, original)
 
 class QuizAttempt(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -3,73 +3,66 @@ RAG-based AI Tutor for StudyGenie
 Retrieval-Augmented Generation tutor that uses document content for context-aware responses
 """
 
-import os
 import json
-from dotenv import load_dotenv
-import google.generativeai as genai
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from documents.models import Document
-
-# Load environment variables
-load_dotenv()
+from llm import get_client
+from llm.ratelimit import rate_limited
+from llm.streaming import HtmlFormatter, sse_response, start_stream, wants_stream
 
 class RAGTutor:
     def __init__(self):
-        self.api_key = os.getenv('GOOGLE_AI_API_KEY')
         self.model = None
         self.initialize_ai()
     
     def initialize_ai(self):
-        """Initialize AI model with API key from .env"""
-        try:
-            if not self.api_key:
-                print("ERROR: GOOGLE_AI_API_KEY not found in .env file")
-                return False
-            
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-1.5-flash')
-            print(f"RAG Tutor initialized with API key: {self.api_key[:10]}...")
-            return True
-        except Exception as e:
-            print(f"RAG Tutor initialization error: {e}")
-            return False
+        """Use the shared LLM client (falsy when no API key is configured)"""
+        self.model = get_client()
+        return bool(self.model)
+    
+    def rank_passages(self, question, document, mode=None):
+        """Top 3 (passage, score, offset in extracted_text); mode is 'bm25', 'vector' or 'hybrid'"""
+        from documents.retrieval import search_document
+        return search_document(document, question, k=3, mode=mode)
     
-    def retrieve_relevant_content(self, question, document):
+    def retrieve_relevant_content(self, question, document, mode=None):
         """Retrieve relevant content from document based on question"""
         if not document.extracted_text:
             return "No document content available."
-        
-        # Split document into chunks
-        text = document.extracted_text
-        sentences = [s.strip() for s in text.split('.') if len(s.strip()) > 20]
-        
-        # Simple keyword matching for retrieval
-        question_words = set(question.lower().split())
-        relevant_chunks = []
-        
-        for sentence in sentences:
-            sentence_words = set(sentence.lower().split())
-            # Calculate overlap
-            overlap = len(question_words.intersection(sentence_words))
-            if overlap > 0:
-                relevant_chunks.append((sentence, overlap))
-        
-        # Sort by relevance and return top chunks
-        relevant_chunks.sort(key=lambda x: x[1], reverse=True)
-        return ' '.join([chunk[0] for chunk in relevant_chunks[:5]])
+        return ' '.join([chunk[0] for chunk in self.rank_passages(question, document, mode)])
+    
+    def cited_pages(self, chunks, document):
+        """Sorted PDF page numbers the retrieved passages start on"""
+        pages = {document.get_page_number(offset) for passage, score, offset in chunks}
+        return sorted(page for page in pages if page is not None)
     
-    def generate_rag_response(self, question, document):
+    def generate_rag_response(self, question, document, mode=None):
         """Generate response using RAG approach"""
         if not self.model:
-            return self.generate_fallback_response(question, document)
+            return self.generate_fallback_response(question, document, mode)
         
         try:
             # Retrieve relevant content
-            relevant_content = self.retrieve_relevant_content(question, document)
+            chunks = self.rank_passages(question, document, mode)
+            response = self.model.generate_content(self.build_prompt(question, document, chunks))
+            return self.format_response(response.text.strip(), document.title, self.cited_pages(chunks, document))
             
-            # Create RAG prompt
-            rag_prompt = f"""
+        except Exception as e:
+            print(f"RAG response error: {e}")
+            return self.generate_fallback_response(question, document, mode)
+    
+    def stream_rag_response(self, question, document, mode=None):
+        """The RAG response streamed as server-sent events (llm/streaming.py); raises if the call fails"""
+        chunks = self.rank_passages(question, document, mode)
+        stream = start_stream(self.build_prompt(question, document, chunks), self.model)
+        return sse_response(stream, HtmlFormatter(markdown=False),
+                            self.source_footer(document.title, self.cited_pages(chunks, document)))
+    
+    def build_prompt(self, question, document, chunks):
+        """RAG prompt: the question with the retrieved passages"""
+        relevant_content = ' '.join([chunk[0] for chunk in chunks]) or "No document content available."
+        return f"""
             You are an AI tutor helping a student understand their study material.
             
             DOCUMENT: {document.title}
@@ -86,27 +79,23 @@ class RAGTutor:
             
             Response:
             """
-            
-            response = self.model.generate_content(rag_prompt)
-            return self.format_response(response.text.strip(), document.title)
-            
-        except Exception as e:
-            print(f"RAG response error: {e}")
-            return self.generate_fallback_response(question, document)
     
-    def format_response(self, response, doc_title):
+    def format_response(self, response, doc_title, pages=None):
         """Format AI response for display"""
         formatted = response.replace('\n\n', '<br><br>').replace('\n', '<br>')
-        formatted += f"<br><br><small class='text-muted'><i class='fas fa-book'></i> Based on: {doc_title}</small>"
-        return formatted
+        return formatted + self.source_footer(doc_title, pages)
+    
+    def source_footer(self, doc_title, pages=None):
+        source = f"{doc_title}, p. {', '.join(map(str, pages))}" if pages else doc_title
+        return f"<br><br><small class='text-muted'><i class='fas fa-book'></i> Based on: {source}</small>"
     
-    def generate_fallback_response(self, question, document):
+    def generate_fallback_response(self, question, document, mode=None):
         """Generate intelligent fallback when AI is unavailable"""
         question_lower = question.lower()
         
         # Try to find relevant content manually
         if document.extracted_text:
-            relevant_content = self.retrieve_relevant_content(question, document)
+            relevant_content = self.retrieve_relevant_content(question, document, mode)
             
             if relevant_content and len(relevant_content) > 50:
                 return f"""
@@ -162,6 +151,7 @@ class RAGTutor:
 rag_tutor = RAGTutor()
 
 @csrf_exempt
+@rate_limited('chat')
 def rag_tutor_chat(request, doc_id):
     """Handle RAG-based tutor chat for specific document"""
     if request.method == 'POST':
@@ -180,7 +170,15 @@ def rag_tutor_chat(request, doc_id):
                 })
             
             # Generate RAG response
-            response = rag_tutor.generate_rag_response(question, document)
+            # Optional 'retrieval': 'bm25' | 'vector' | 'hybrid' (default TUTOR_RETRIEVAL_MODE)
+            if wants_stream(request, data) and rag_tutor.model:
+                try:
+                    return rag_tutor.stream_rag_response(question, document, data.get('retrieval'))
+                except Exception as e:
+                    print(f"RAG streaming error: {e}")
+                    response = rag_tutor.generate_fallback_response(question, document, data.get('retrieval'))
+            else:
+                response = rag_tutor.generate_rag_response(question, document, data.get('retrieval'))
             
             return JsonResponse({
                 'response': response,
@@ -0,0 +1,49 @@
+"""
+Helpers for async views
+Django 4.2's login_required, csrf_exempt and get_object_or_404 only work with
+sync views; these are their async counterparts. request.user is loaded in a
+thread the first time (it reads the session and user tables), after which the
+view can use it directly.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+
+
+async def get_user(request):
+    """request.user, loaded without blocking the event loop"""
+    def load():
+        request.user.is_authenticated  # Evaluates the lazy object; later reads are plain attribute access
+        return request.user
+    return await sync_to_async(load)()
+
+
+def login_required(view):
+    """Async login_required: anonymous users are redirected to the login page"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await get_user(request)
+        if not user.is_authenticated:
+            return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def csrf_exempt(view):
+    """Async csrf_exempt"""
+    @wraps(view)
+    async def wrapper(*args, **kwargs):
+        return await view(*args, **kwargs)
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+async def get_object_or_404(model, **lookup):
+    try:
+        return await model.objects.aget(**lookup)
+    except model.DoesNotExist:
+        raise Http404(f"No {model._meta.object_name} matches the given query.")
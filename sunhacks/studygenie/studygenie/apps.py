@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+class StudyGenieConfig(AppConfig):
+    name = 'studygenie'
+    verbose_name = 'StudyGenie'
+
+    def ready(self):
+        # Time database writes on every connection (studygenie/metrics.py)
+        if getattr(settings, 'METRICS_ENABLED', True):
+            from .metrics import install_write_timer
+            connection_created.connect(install_write_timer)
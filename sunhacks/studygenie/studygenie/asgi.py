@@ -0,0 +1,6 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studygenie.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')  # Chat, tutor and translation endpoints run as async views
+application = get_asgi_application()
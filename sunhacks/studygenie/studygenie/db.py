@@ -0,0 +1,42 @@
+"""
+Database helpers for partial writes
+Translations are stored as {language: content} JSON fields. Reading the dict,
+adding a key and saving it back loses the keys another request or job added
+in between; set_json_keys() sets one key inside the database instead, with
+SQLite's JSON_SET, so concurrent translations of the same rows all land.
+
+    set_json_keys(Flashcard, 'translations', 'hi', {card.pk: {'front': ..., 'back': ...}})
+"""
+
+import json
+
+from django.db.models import Case, Func, JSONField, TextField, Value, When
+from django.db.models.expressions import F
+
+
+class JSONSet(Func):
+    """The JSON field with one top-level key set to value (a JSON text expression)"""
+    template = "JSON_SET(COALESCE(%(field)s, '{}'), %(path)s, JSON(%(value)s))"
+
+    def __init__(self, field, key, value):
+        if not key or any(char in key for char in '"\\'):
+            raise ValueError(f"Unsupported JSON key {key!r}")
+        super().__init__(F(field), Value(f'$."{key}"'), value, output_field=JSONField())
+
+    def as_sql(self, compiler, connection, **extra_context):
+        parts, params = [], []
+        for expression in self.get_source_expressions():
+            sql, expression_params = compiler.compile(expression)
+            parts.append(sql)
+            params.extend(expression_params)
+        field, path, value = parts
+        return self.template % {'field': field, 'path': path, 'value': value}, params
+
+
+def set_json_keys(model, field, key, values):
+    """Set field[key] on each row of {pk: value} with one UPDATE that leaves the other keys alone"""
+    if not values:
+        return 0
+    value = Case(*[When(pk=pk, then=Value(json.dumps(content, ensure_ascii=False)))
+                   for pk, content in values.items()], output_field=TextField())
+    return model.objects.filter(pk__in=list(values)).update(**{field: JSONSet(field, key, value)})
@@ -0,0 +1,234 @@
+"""
+In-process metrics and request IDs
+Timers around the slow parts of StudyGenie (requests, pipeline stages, text
+extraction, LLM calls, database writes, YouTube searches) feed histograms
+kept in this process, which /metrics serves in the Prometheus text format.
+Every timed event is also logged on the 'studygenie.metrics' logger with its
+duration and the ID of the request or job it ran for, so log lines of one
+request can be found together.
+
+    with timed(EXTRACTION_SECONDS, kind='pdf'):
+        ...
+
+    @timer(STAGE_SECONDS, stage='quiz')
+    def quiz_stage(job, doc): ...
+
+With METRICS_ENABLED off, timed() hands back a shared no-op timer and no
+database wrapper is installed, so the only cost left is one flag check.
+"""
+
+import contextvars
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger('studygenie.metrics')
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+WRITE_RE = re.compile(r'^\s*(INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def enabled():
+    try:
+        return getattr(settings, 'METRICS_ENABLED', True)
+    except ImproperlyConfigured:
+        return False  # Standalone scripts without Django settings
+
+
+def new_request_id():
+    return uuid.uuid4().hex[:16]
+
+
+class Histogram:
+    """Prometheus-style histogram with labels, safe to observe from any thread"""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+        with _registry_lock:
+            _registry[name] = self
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, '')) for label in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {key: list(series) for key, series in self.series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.snapshot().items()):
+            labels = [f'{label}="{escape(value)}"' for label, value in zip(self.labels, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{label_set(labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{label_set(labels, '+Inf')} {series[-1]}")
+            lines.append(f"{self.name}_sum{label_set(labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{label_set(labels)} {series[-1]}")
+        return '\n'.join(lines)
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def label_set(labels, le=None):
+    """{a="1",le="0.5"} (empty when there are no labels)"""
+    labels = labels + [f'le="{le}"'] if le is not None else labels
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+REQUEST_SECONDS = Histogram('studygenie_http_request_seconds', 'Time to produce a response (first byte of a stream)',
+                            ('view', 'method', 'status'))
+STAGE_SECONDS = Histogram('studygenie_stage_seconds', 'Document pipeline stage run time', ('stage', 'outcome'))
+EXTRACTION_SECONDS = Histogram('studygenie_extraction_seconds', 'Text extraction time per file', ('kind', 'outcome'))
+LLM_SECONDS = Histogram('studygenie_llm_call_seconds', 'LLM call time, including retries and waiting for a slot',
+                        ('mode', 'outcome'))
+LLM_PROMPT_CHARS = Histogram('studygenie_llm_prompt_chars', 'Prompt size in characters', ('mode',), SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram('studygenie_llm_response_chars', 'Reply size in characters', ('mode',), SIZE_BUCKETS)
+LLM_QUEUE_SECONDS = Histogram('studygenie_llm_queue_seconds', 'Time LLM calls waited for a slot', ('lane',))
+LLM_TTFT_SECONDS = Histogram('studygenie_llm_ttft_seconds', 'Time to first token of streamed replies')
+DB_WRITE_SECONDS = Histogram('studygenie_db_write_seconds', 'Database write statement time', ('statement', 'table'))
+YOUTUBE_SECONDS = Histogram('studygenie_youtube_fetch_seconds', 'YouTube search API call time', ('status',))
+
+
+class Timer:
+    """Observes the time spent in a with block; labels can be changed inside it (e.g. the outcome)"""
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        if 'outcome' in self.histogram.labels:
+            self.labels.setdefault('outcome', 'error' if exc_type else 'ok')
+        self.histogram.observe(seconds, **self.labels)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(self.histogram.name, extra={'duration_ms': round(seconds * 1000, 2), **self.labels})
+        return False
+
+
+class NullTimer:
+    labels = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+def timed(histogram, **labels):
+    """Context manager timing a block into the histogram"""
+    if not enabled():
+        return NULL_TIMER
+    return Timer(histogram, labels)
+
+
+def timer(histogram, **labels):
+    """Decorator timing every call of a function into the histogram"""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, **labels):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def observe(histogram, value, **labels):
+    if enabled():
+        histogram.observe(value, **labels)
+
+
+def time_writes(execute, sql, params, many, context):
+    """Database execute wrapper timing INSERT, UPDATE and DELETE statements"""
+    match = WRITE_RE.match(sql)
+    if match is None:
+        return execute(sql, params, many, context)
+    with Timer(DB_WRITE_SECONDS, {'statement': match.group(1).split()[0].lower(), 'table': match.group(2)}):
+        return execute(sql, params, many, context)
+
+
+def install_write_timer(sender, connection, **kwargs):
+    """connection_created handler: time this connection's writes"""
+    if time_writes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_writes)
+
+
+def render():
+    with _registry_lock:
+        histograms = list(_registry.values())
+    return '\n'.join(histogram.render() for histogram in histograms) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint: staff users and METRICS_ALLOWED_IPS only"""
+    allowed = request.META.get('REMOTE_ADDR') in getattr(settings, 'METRICS_ALLOWED_IPS', ())
+    if not allowed and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden("Forbidden")
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the current request (or job) ID to every log record"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request ID, message and any extra fields"""
+
+    RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', '-'),
+            'message': record.getMessage(),
+        }
+        data.update((key, value) for key, value in vars(record).items() if key not in self.RESERVED)
+        if record.exc_info:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
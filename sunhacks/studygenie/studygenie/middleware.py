@@ -0,0 +1,61 @@
+"""
+Request IDs and request timing
+Each request gets an ID (the incoming X-Request-ID header if there is one),
+which is set for the code handling it, added to its log records and sent
+back in the X-Request-ID response header. The time to produce the response
+goes into the request histogram and one structured log line per request.
+Works for sync and async views alike.
+"""
+
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+logger = logging.getLogger('studygenie.requests')
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, started = self.start(request)
+        try:
+            return self.finish(request, self.get_response(request), started)
+        finally:
+            metrics.request_id_var.reset(token)
+
+    async def __acall__(self, request):
+        token, started = self.start(request)
+        try:
+            return self.finish(request, await self.get_response(request), started)
+        finally:
+            metrics.request_id_var.reset(token)
+
+    def start(self, request):
+        request.id = request.headers.get('X-Request-ID', '')[:64] or metrics.new_request_id()
+        return metrics.request_id_var.set(request.id), time.perf_counter()
+
+    def finish(self, request, response, started):
+        response['X-Request-ID'] = request.id
+        if not metrics.enabled():
+            return response
+        seconds = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        metrics.REQUEST_SECONDS.observe(seconds, view=view, method=request.method, status=response.status_code)
+        logger.info("%s %s %s", request.method, request.path, response.status_code, extra={
+            'view': view, 'status': response.status_code,
+            'duration_ms': round(seconds * 1000, 2), 'streaming': response.streaming,
+        })
+        return response
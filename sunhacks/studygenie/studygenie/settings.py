@@ -24,14 +24,20 @@ INSTALLED_APPS = [
     'quizzes',
     'flashcards',
     'dashboard',
+    'jobs',
+    'llm',
+    'benchmarks',
+    'studygenie.apps.StudyGenieConfig',
 ]
 
 MIDDLEWARE = [
+    'studygenie.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'llm.accounting.AccountingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,6 +61,8 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'studygenie.wsgi.application'
+ASGI_APPLICATION = 'studygenie.asgi.application'
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '') == '1'  # Serve the LLM-bound views' async versions; set by asgi.py
 
 DATABASES = {
     'default': {
@@ -96,4 +104,96 @@ LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/auth/login/'
 
 # Google AI API Configuration  
-GOOGLE_AI_API_KEY = os.getenv('GOOGLE_AI_API_KEY', 'your-google-ai-key')
\ No newline at end of file
+GOOGLE_AI_API_KEY = os.getenv('GOOGLE_AI_API_KEY', 'your-google-ai-key')
+
+# Shared LLM client (llm/client.py)
+LLM_MODEL = os.getenv('LLM_MODEL', 'gemini-1.5-flash')
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))  # In-flight calls per process
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '30'))  # Seconds per call
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '2'))  # Retries for rate limits, timeouts and 5xx errors
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '1.0'))  # Seconds before the first retry, doubled each time
+LLM_LANES = {  # Priority lanes sharing those calls (llm/scheduler.py): name -> (weight, max in flight)
+    'interactive': (6, LLM_MAX_CONCURRENCY),  # Tutor and chat
+    'pipeline': (3, max(1, LLM_MAX_CONCURRENCY // 2)),  # Upload processing jobs
+    'backfill': (1, 1),  # Regenerating existing documents
+}
+LLM_LANE_BUDGETS = {  # Calls per minute, burst for the background lanes, shared by every process (RateLimitBucket table)
+    'pipeline': (int(os.getenv('LLM_PIPELINE_PER_MINUTE', '30')), 10),
+    'backfill': (int(os.getenv('LLM_BACKFILL_PER_MINUTE', '10')), 5),
+}
+LLM_FANOUT_WORKERS = LLM_MAX_CONCURRENCY  # Threads for concurrent calls (summary chunks, languages); in-flight calls stay capped above
+LLM_ASYNC_MAX_CONCURRENCY = int(os.getenv('LLM_ASYNC_MAX_CONCURRENCY', '100'))  # In-flight async calls per event loop (ASGI)
+GEMINI_API_BASE = os.getenv('GEMINI_API_BASE', 'https://generativelanguage.googleapis.com/v1beta')  # REST endpoint of the async calls
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')  # 'gemini', 'fake' (offline, llm/fake.py) or a dotted path to a backend factory
+
+# Fake LLM backend for offline load tests (LLM_BACKEND=fake)
+LLM_FAKE_LATENCY = float(os.getenv('LLM_FAKE_LATENCY', '0.5'))  # Median seconds per call
+LLM_FAKE_LATENCY_DIST = os.getenv('LLM_FAKE_LATENCY_DIST', 'lognormal')  # fixed, uniform, exponential or lognormal
+LLM_FAKE_ERROR_RATE = float(os.getenv('LLM_FAKE_ERROR_RATE', '0'))  # Share of calls failing with a retryable 503
+LLM_FAKE_SEED = int(os.getenv('LLM_FAKE_SEED')) if os.getenv('LLM_FAKE_SEED') else None  # Repeatable latencies and errors
+
+# Prompt/response cache (llm/cache.py)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', str(7 * 24 * 3600)))  # Seconds a cached response stays valid
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))  # Rows kept in the table (least recently used go first)
+LLM_CACHE_MEMORY_ENTRIES = 500  # Per-process in-memory LRU in front of the table
+
+# Token and cost accounting (llm/accounting.py); one LLMCall row per call, see the admin
+LLM_ACCOUNTING_ENABLED = os.getenv('LLM_ACCOUNTING_ENABLED', '1') == '1'
+LLM_ACCOUNTING_BATCH = 50  # Rows written per insert
+LLM_ACCOUNTING_FLUSH_SECONDS = 5  # Longest a row waits in memory (checked on the next call or request end)
+LLM_PRICE_INPUT_PER_MTOK = float(os.getenv('LLM_PRICE_INPUT_PER_MTOK', '0.075'))  # USD per million prompt tokens
+LLM_PRICE_OUTPUT_PER_MTOK = float(os.getenv('LLM_PRICE_OUTPUT_PER_MTOK', '0.30'))  # USD per million reply tokens
+
+# Rate limits for the chat, tutor and generation endpoints (llm/ratelimit.py); token buckets per user or IP
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1'
+RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'memory')  # 'memory' (per process) or 'database' (shared by all processes)
+RATELIMIT_RATES = {  # Endpoint class -> (requests per minute, burst) for each user or IP
+    'chat': (20, 10),  # Document chatbot, tutor, dashboard chat
+    'generate': (20, 10),  # Translations and other-language quizzes, flashcards and summaries
+}
+RATELIMIT_LLM_BUDGET = (int(os.getenv('RATELIMIT_LLM_PER_MINUTE', '60')), 30)  # All users together: LLM calls per minute, burst
+RATELIMIT_OVER_LIMIT = os.getenv('RATELIMIT_OVER_LIMIT', 'fallback')  # 'fallback': serve the local answer where there is one; 'reject': always 429
+
+# Map-reduce summarization of long documents (llm/summarize.py); tokens are estimated as characters / 4
+SUMMARY_INPUT_TOKENS = 2000  # Text sent to the final summary prompt; longer documents are condensed to fit
+SUMMARY_CHUNK_TOKENS = 2000  # Size of each chunk condensed into notes
+
+# Background job queue (run workers with: python manage.py run_workers)
+JOBS_EAGER = os.getenv('JOBS_EAGER', '') == '1'  # Run jobs inline, e.g. for tests or single-process dev
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_BACKOFF = 5  # Seconds before the first retry, doubled on each attempt
+JOBS_MAX_BACKOFF = 300
+JOBS_LOCK_TIMEOUT = 600  # Running jobs renew their lock every third of this; older locks mean the worker died
+
+# Processing page progress checks (documents/<id>/progress/)
+PROGRESS_POLL_INTERVAL = 2  # Seconds the processing page waits between progress checks (sent as Retry-After)
+
+# PDF extraction (documents/extraction.py)
+PDF_EXTRACTION_WORKERS = int(os.getenv('PDF_EXTRACTION_WORKERS', '0'))  # 0 = min(CPU count, 4)
+PDF_PARALLEL_MIN_PAGES = 16  # Shorter PDFs are extracted in-process
+
+# Tutor passage index (documents/retrieval.py); changing these only affects newly built indexes
+RETRIEVAL_CHUNK_WORDS = 80  # Words per passage
+RETRIEVAL_CHUNK_OVERLAP = 20  # Words shared by consecutive passages
+TUTOR_RETRIEVAL_MODE = os.getenv('TUTOR_RETRIEVAL_MODE', 'bm25')  # 'bm25', 'vector' or 'hybrid' (vector modes need numpy)
+RETRIEVAL_VECTOR_DIM = 1024  # Hashed embedding size
+RETRIEVAL_VECTOR_DIR = os.path.join(BASE_DIR, 'vectors')  # Memory-mapped passage vectors, one .npy per document
+
+# Metrics and structured logs (studygenie/metrics.py); Prometheus scrapes /metrics
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'  # Off: timers are no-ops and database writes are not wrapped
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')  # Besides staff users
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')  # DEBUG also logs every timed event (LLM calls, writes, stages...)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {'request_id': {'()': 'studygenie.metrics.RequestIdFilter'}},
+    'formatters': {'json': {'()': 'studygenie.metrics.JsonFormatter'}},
+    'handlers': {
+        'json': {'class': 'logging.StreamHandler', 'formatter': 'json', 'filters': ['request_id']},
+    },
+    'loggers': {
+        'studygenie': {'handlers': ['json'], 'level': LOG_LEVEL, 'propagate': False},
+    },
+}
@@ -0,0 +1,102 @@
+import json
+import logging
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from jobs.models import Job
+from jobs.queue import job_handler, run_job
+from llm.cache import ResponseCache
+from llm.tests import make_client
+from . import metrics
+
+seen_ids = []
+
+
+@job_handler('test_request_id')
+def request_id_handler(job):
+    seen_ids.append(metrics.request_id_var.get())
+
+
+def series(histogram, **labels):
+    """[bucket counts..., sum, count] of one label set"""
+    key = tuple(str(labels.get(label, '')) for label in histogram.labels)
+    return histogram.snapshot().get(key, [0] * (len(histogram.buckets) + 2))
+
+
+class HistogramTests(TestCase):
+
+    def test_prometheus_text_format(self):
+        histogram = metrics.Histogram('test_render_seconds', 'Test', ('view',), buckets=(0.1, 1))
+        for value in (0.05, 0.5, 3):
+            histogram.observe(value, view='a"b')
+        self.assertEqual(histogram.render().splitlines(), [
+            '# HELP test_render_seconds Test',
+            '# TYPE test_render_seconds histogram',
+            'test_render_seconds_bucket{view="a\\"b",le="0.1"} 1',
+            'test_render_seconds_bucket{view="a\\"b",le="1"} 2',
+            'test_render_seconds_bucket{view="a\\"b",le="+Inf"} 3',
+            'test_render_seconds_sum{view="a\\"b"} 3.55',
+            'test_render_seconds_count{view="a\\"b"} 3',
+        ])
+
+    def test_llm_calls_are_timed_with_their_sizes(self):
+        client = make_client(ResponseCache())
+        before = {outcome: series(metrics.LLM_SECONDS, mode='sync', outcome=outcome)[-1]
+                  for outcome in ('ok', 'cached')}
+        prompts = series(metrics.LLM_PROMPT_CHARS, mode='sync')[-1]
+        client.generate_content("Explain osmosis")
+        client.generate_content("Explain osmosis")
+        self.assertEqual(series(metrics.LLM_SECONDS, mode='sync', outcome='ok')[-1], before['ok'] + 1)
+        self.assertEqual(series(metrics.LLM_SECONDS, mode='sync', outcome='cached')[-1], before['cached'] + 1)
+        self.assertEqual(series(metrics.LLM_PROMPT_CHARS, mode='sync')[-1], prompts + 2)
+
+    def test_database_writes_are_timed(self):
+        before = series(metrics.DB_WRITE_SECONDS, statement='insert', table='auth_user')[-1]
+        User.objects.create_user('metrics-user')
+        self.assertEqual(series(metrics.DB_WRITE_SECONDS, statement='insert', table='auth_user')[-1], before + 1)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled_timers_record_nothing(self):
+        self.assertIs(metrics.timed(metrics.STAGE_SECONDS, stage='quiz'), metrics.NULL_TIMER)
+        before = metrics.STAGE_SECONDS.snapshot()
+        with metrics.timed(metrics.STAGE_SECONDS, stage='quiz'):
+            pass
+        self.assertEqual(metrics.STAGE_SECONDS.snapshot(), before)
+
+
+class RequestMetricsTests(TestCase):
+
+    def test_request_id_is_echoed_or_generated(self):
+        response = self.client.get(reverse('login'), HTTP_X_REQUEST_ID='abc123')
+        self.assertEqual(response['X-Request-ID'], 'abc123')
+        self.assertEqual(len(self.client.get(reverse('login'))['X-Request-ID']), 16)
+
+    @override_settings(METRICS_ALLOWED_IPS=[])
+    def test_metrics_endpoint_is_for_staff(self):
+        self.client.get(reverse('login'))
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+        self.client.force_login(User.objects.create_user('ops', is_staff=True))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('studygenie_http_request_seconds_count{view="login",method="GET",status="200"}',
+                      response.content.decode())
+
+    def test_log_records_carry_the_request_id(self):
+        record = logging.LogRecord('studygenie.metrics', logging.INFO, '', 0, 'extracted', (), None)
+        record.duration_ms = 12.5
+        token = metrics.request_id_var.set('req-1')
+        try:
+            metrics.RequestIdFilter().filter(record)
+        finally:
+            metrics.request_id_var.reset(token)
+        data = json.loads(metrics.JsonFormatter().format(record))
+        self.assertEqual((data['request_id'], data['message'], data['duration_ms']), ('req-1', 'extracted', 12.5))
+
+    def test_jobs_run_under_their_own_id(self):
+        job = Job.objects.create(kind='test_request_id')
+        run_job(job)
+        self.assertEqual(seen_ids[-1], f"job-{job.pk}")
+        self.assertEqual(metrics.request_id_var.get(), '-')
@@ -5,6 +5,8 @@ from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 from django.shortcuts import redirect
 
+from .metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', lambda request: redirect('dashboard')),
@@ -13,6 +15,7 @@ urlpatterns = [
     path('flashcards/', include('flashcards.urls')),
     path('dashboard/', include('dashboard.urls')),
     path('auth/', include('authentication.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
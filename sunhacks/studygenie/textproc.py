@@ -0,0 +1,168 @@
+"""
+Shared text processing
+Stop-word sets, regexes and the word tokenizer used by the keyword extractors
+(ai_services.py, youtube_services.py), the document analysis and the tutor's
+passage index. Everything is built once at import time.
+
+A text is tokenized once: token_stream() keeps the last few TokenStreams,
+so every extractor run on the same text reads the same word lists. Each list
+(words as written, lowercase, hyphen-split parts) is one regex pass in C,
+made on first use; the extractors then classify each distinct word once
+rather than every occurrence. Iterating a stream, or tokens(), yields
+Token(text, lower, start) for callers that need offsets.
+"""
+
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+WORD_RE = re.compile(r'[\w\-]+')  # Words: letters, digits, underscores and hyphens
+PART_RE = re.compile(r'\w+')  # The same words with hyphenated words split into their parts
+ASCII_WORD_RE = re.compile(r'[A-Za-z0-9_\-]+')  # Technical terms: ASCII letters, digits, underscores and hyphens
+# Index terms of the tutor's passage index: words in any script. \w alone would cut Devanagari words at
+# their vowel signs and viramas (and decomposed accents), so those combining marks count as letters too
+SEARCH_TOKEN_RE = re.compile(r'[\w\u0300-\u036f\u0900-\u0963\u0966-\u097f]+')
+DEVANAGARI_RE = re.compile(r'[\u0900-\u097F]')  # Hindi and Marathi script
+DIGIT_RE = re.compile(r'\d')
+LETTER_RE = re.compile(r'[^\W\d_]')
+
+Token = namedtuple('Token', 'text lower start')
+
+# Function words common to every extractor
+BASIC_STOP_WORDS = frozenset("""
+the a an and or but in on at to for of with by is are was were be been being have has had do does did
+will would could should may might can this that these those
+""".split())
+
+KEY_TERM_STOP_WORDS = BASIC_STOP_WORDS | frozenset("""
+document content material information text chapter section page
+""".split())
+
+TECHNICAL_STOP_WORDS = BASIC_STOP_WORDS | frozenset("""
+document summary content material information text study learning chapter section page book pdf file
+contains includes covers discusses explains describes shows presents provides important key main basic
+essential fundamental concept concepts topic topics
+""".split())
+
+# Any of these inside a two-word phrase (even within a word) disqualifies it as a technical phrase
+TECHNICAL_STOP_RE = re.compile('|'.join(sorted(TECHNICAL_STOP_WORDS, key=len, reverse=True)))
+
+VIDEO_STOP_WORDS = BASIC_STOP_WORDS | frozenset("""
+from as if when where why how what which who document covers includes provides explains discusses
+material content information
+""".split())
+
+SUMMARY_STOP_WORDS = BASIC_STOP_WORDS | frozenset("""
+document covers includes provides explains discusses material content information key points main
+important essential basic fundamental
+""".split())
+
+SEARCH_STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have
+having he her here hers herself him himself his how i if in into is it its itself just me more most my
+myself no nor not now of off on once only or other our ours ourselves out over own same she should so
+some such than that the their theirs them themselves then there these they this those through to too
+under until up very was we were what when where which while who whom why will with would you your
+yours yourself yourselves document explain tell describe please give
+""".split())
+
+SUFFIXES = ('ational', 'ations', 'ation', 'ments', 'ment', 'ness', 'ings', 'ing', 'ies', 'ied', 'edly',
+            'ed', 'es', 'ly', 's')
+
+
+def tokens(text):
+    """Yield a Token(text, lower, start) for every word of the text, in order"""
+    if not text:
+        return
+    lower = text.lower()
+    if len(lower) != len(text):  # A few characters change length when lowercased; offsets would drift
+        for match in WORD_RE.finditer(text):
+            yield Token(match.group(), match.group().lower(), match.start())
+        return
+    for match in WORD_RE.finditer(text):
+        start, end = match.span()
+        yield Token(match.group(), lower[start:end], start)
+
+
+class TokenStream:
+    """The words of one text; each list is found on first use and kept"""
+
+    def __init__(self, text):
+        self.text = text
+        self._folded = self._words = self._lower = self._parts = self._ascii_words = None
+
+    @property
+    def folded(self):
+        """The text lowercased"""
+        if self._folded is None:
+            self._folded = self.text.lower()
+        return self._folded
+
+    @property
+    def words(self):
+        """Words as written"""
+        if self._words is None:
+            self._words = WORD_RE.findall(self.text)
+        return self._words
+
+    @property
+    def lower(self):
+        """Lowercase words"""
+        if self._lower is None:
+            self._lower = WORD_RE.findall(self.folded)
+        return self._lower
+
+    @property
+    def parts(self):
+        """Lowercase words with hyphenated words split into their parts"""
+        if self._parts is None:
+            self._parts = PART_RE.findall(self.folded)
+        return self._parts
+
+    @property
+    def ascii_words(self):
+        """Words as written, with any character outside ASCII letters, digits, '_' and '-' as a separator"""
+        if self._ascii_words is None:
+            self._ascii_words = self.words if self.text.isascii() else ASCII_WORD_RE.findall(self.text)
+        return self._ascii_words
+
+    def __iter__(self):
+        return tokens(self.text)
+
+
+@lru_cache(maxsize=16)
+def token_stream(text):
+    """TokenStream of a text, shared by every extractor reading the same text"""
+    return TokenStream(text or '')
+
+
+def stem(word):
+    """Light suffix stripping, enough to match 'transistors' with 'transistor'"""
+    if len(word) <= 4 or word.endswith(('ss', 'us', 'is')):
+        return word
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            return word + 'y' if suffix in ('ies', 'ied') else word
+    return word
+
+
+def search_terms(text):
+    """Index terms of a passage or question: casefolded words, single letters dropped; English
+    (ASCII) words are also stemmed and their stop words dropped"""
+    terms = []
+    for token in SEARCH_TOKEN_RE.findall(text.casefold()):
+        if len(token) <= 1:
+            continue
+        if token.isascii():
+            if token in SEARCH_STOP_WORDS:
+                continue
+            token = stem(token)
+        terms.append(token)
+    return terms
+
+
+def script_counts(text):
+    """(Devanagari characters, letters) in the text"""
+    return len(DEVANAGARI_RE.findall(text)), len(LETTER_RE.findall(text))
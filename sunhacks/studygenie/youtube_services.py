@@ -1,101 +1,23 @@
 import os
 import requests
 import logging
-import re
 from collections import Counter
 from dotenv import load_dotenv
 
+from studygenie.metrics import YOUTUBE_SECONDS, timed
+from textproc import SUMMARY_STOP_WORDS, VIDEO_STOP_WORDS, token_stream
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
-def extract_keywords(text, top_n=5):
-    """Extract document-specific keywords for highly relevant YouTube recommendations"""
-    if not text:
-        return []
-    
-    # Clean and normalize text
-    text = text.lower()
-    # Remove special characters and keep only alphanumeric and spaces
-    text = re.sub(r'[^a-zA-Z0-9\s]', ' ', text)
-    
-    # Enhanced stop words to filter out generic terms
-    stop_words = {
-        'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did',
-        'will', 'would', 'could', 'should', 'may', 'might', 'can', 'this', 'that', 'these', 'those',
-        'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them', 'my', 'your',
-        'his', 'her', 'its', 'our', 'their', 'from', 'up', 'about', 'into', 'through', 'during',
-        'before', 'after', 'above', 'below', 'between', 'among', 'all', 'any', 'both', 'each',
-        'few', 'more', 'most', 'other', 'some', 'such', 'no', 'nor', 'not', 'only', 'own', 'same',
-        'so', 'than', 'too', 'very', 'just', 'now', 'here', 'there', 'when', 'where', 'why', 'how',
-        'also', 'example', 'used', 'using', 'use', 'one', 'two', 'three', 'first', 'second', 'third',
-        'page', 'document', 'text', 'content', 'information', 'data', 'file', 'pdf', 'image', 'covers',
-        'includes', 'provides', 'explains', 'discusses', 'material', 'points', 'key'
-    }
-    
-    # Extract meaningful technical phrases
-    phrases = []
-    sentences = text.split('.')
-    
-    for sentence in sentences[:15]:  # Check more sentences
-        sentence = sentence.strip()
-        if len(sentence) > 20:  # Meaningful sentences
-            # Look for technical terms, proper nouns, and key concepts
-            words = sentence.split()
-            for i in range(len(words) - 1):
-                if (len(words[i]) > 3 and len(words[i+1]) > 3 and
-                    words[i] not in stop_words and words[i+1] not in stop_words):
-                    phrase = f"{words[i]} {words[i+1]}"
-                    phrases.append(phrase)
-    
-    # Extract single important words
-    words = [word for word in text.split() if len(word) > 3 and word not in stop_words]
-    
-    # Prioritize technical and educational terms with expanded list
-    priority_terms = []
-    educational_indicators = [
-        'programming', 'algorithm', 'function', 'method', 'class', 'variable', 'loop', 'condition', 
-        'statement', 'syntax', 'code', 'software', 'computer', 'science', 'mathematics', 'physics', 
-        'chemistry', 'biology', 'history', 'literature', 'language', 'theory', 'concept', 'principle', 
-        'analysis', 'database', 'system', 'design', 'structure', 'process', 'implementation',
-        'architecture', 'model', 'framework', 'development', 'engineering', 'technical', 'digital',
-        'network', 'security', 'management', 'application', 'interface', 'protocol', 'standard'
-    ]
-    
-    for word in words:
-        if any(indicator in word for indicator in educational_indicators):
-            priority_terms.append(word)
-    
-    # Count frequencies with better weighting
-    word_counts = Counter(words)
-    phrase_counts = Counter(phrases)
-    
-    # Combine and prioritize results with better logic
-    all_keywords = []
-    
-    # Add priority terms first (technical/educational)
-    all_keywords.extend(priority_terms[:3])
-    
-    # Add top technical phrases
-    top_phrases = [phrase for phrase, count in phrase_counts.most_common(3) 
-                  if count > 1 and any(term in phrase for term in educational_indicators)]
-    all_keywords.extend(top_phrases[:2])
-    
-    # Add top frequent words that aren't already included
-    top_words = [word for word, count in word_counts.most_common(top_n*2) 
-                if word not in all_keywords and count > 1]
-    all_keywords.extend(top_words[:3])
-    
-    # Remove duplicates while preserving order
-    seen = set()
-    unique_keywords = []
-    for keyword in all_keywords:
-        clean_keyword = keyword.lower().strip()
-        if clean_keyword not in seen and len(clean_keyword) > 2:
-            seen.add(clean_keyword)
-            unique_keywords.append(keyword)
-    
-    return unique_keywords[:top_n]
+# Words that mark educational content in a text
+EDUCATIONAL_WORDS = frozenset([
+    'algorithm', 'programming', 'function', 'method', 'class', 'variable',
+    'concept', 'principle', 'theory', 'definition', 'explanation',
+    'tutorial', 'guide', 'introduction', 'basics', 'fundamentals',
+    'example', 'application', 'implementation', 'practice',
+    'analysis', 'design', 'development', 'structure',
+])
 
 def fetch_youtube_videos(query, max_results=5):
     """Fetch YouTube videos using YouTube Data API v3"""
@@ -107,7 +29,8 @@ def fetch_youtube_videos(query, max_results=5):
         
         print(f"Searching YouTube for: {query}")
         
-        url = "https://www.googleapis.com/youtube/v3/search"
+        # YOUTUBE_API_BASE can point at the local stand-in (manage.py fake_youtube)
+        url = os.getenv('YOUTUBE_API_BASE', 'https://www.googleapis.com/youtube/v3').rstrip('/') + "/search"
         params = {
             'part': 'snippet',
             'q': f"{query} lecture tutorial",
@@ -118,7 +41,9 @@ def fetch_youtube_videos(query, max_results=5):
             'safeSearch': 'strict'
         }
         
-        response = requests.get(url, params=params, timeout=15)
+        with timed(YOUTUBE_SECONDS, status='error') as timer:
+            response = requests.get(url, params=params, timeout=15)
+            timer.labels['status'] = response.status_code
         
         if response.status_code == 200:
             data = response.json()
@@ -231,55 +156,27 @@ def extract_keywords_from_summary(summary_text):
     if not summary_text:
         return []
     
-    # Remove bullet points and clean text
-    text = summary_text.replace('•', '').replace('\n', ' ').lower()
-    
-    # Stop words to filter out
-    stop_words = {
-        'this', 'that', 'these', 'those', 'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by',
-        'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could',
-        'should', 'may', 'might', 'can', 'document', 'covers', 'includes', 'provides', 'explains', 'discusses', 'material',
-        'content', 'information', 'key', 'points', 'main', 'important', 'essential', 'basic', 'fundamental'
-    }
-    
-    # Extract words longer than 3 characters
-    words = [word.strip('.,!?;:()[]{}"') for word in text.split() if len(word) > 3 and word not in stop_words]
-    
-    # Count word frequency
-    word_freq = {}
-    for word in words:
-        word_freq[word] = word_freq.get(word, 0) + 1
+    # Words longer than 3 characters, bullets and punctuation left out
+    word_freq = Counter({word: count for word, count in Counter(token_stream(summary_text).lower).items()
+                         if len(word) > 3 and word not in SUMMARY_STOP_WORDS})
     
     # Get top 5 most frequent words
-    top_keywords = sorted(word_freq.items(), key=lambda x: x[1], reverse=True)[:5]
+    top_keywords = word_freq.most_common(5)
     keywords = [keyword for keyword, count in top_keywords if count > 1 or len(top_keywords) < 3]
     
     return keywords[:5]
 
 def extract_keywords(text, top_n=5):
-    """Extract keywords from document text using NLP approach"""
-    import re
-    from collections import Counter
-    
+    """Extract keywords from document text"""
     if not text:
         return []
     
-    # Clean text and extract words
-    words = re.findall(r'\w+', text.lower())
-    
-    # Enhanced stopwords
-    stopwords = {
-        'the', 'is', 'and', 'of', 'in', 'a', 'to', 'for', 'with', 'on', 'at', 'by', 'from', 'as', 'an', 'are', 'was', 'were',
-        'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might',
-        'can', 'this', 'that', 'these', 'those', 'but', 'or', 'if', 'when', 'where', 'why', 'how', 'what', 'which', 'who',
-        'document', 'covers', 'includes', 'provides', 'explains', 'discusses', 'material', 'content', 'information'
-    }
-    
-    # Filter words
-    filtered = [w for w in words if w not in stopwords and len(w) > 3]
+    # Hyphenated words count as their parts
+    filtered = Counter({word: count for word, count in Counter(token_stream(text).parts).items()
+                        if len(word) > 3 and word not in VIDEO_STOP_WORDS})
     
     # Get most common words
-    common = Counter(filtered).most_common(top_n)
+    common = filtered.most_common(top_n)
     return [word for word, _ in common]
 
 def get_video_recommendations_from_summary(summary_text, fallback_title=""):
@@ -314,26 +211,8 @@ def extract_educational_keywords(text):
     if not text:
         return []
     
-    import re
-    
-    # Educational patterns to look for
-    educational_patterns = [
-        r'\b(algorithm|programming|function|method|class|variable)\b',
-        r'\b(concept|principle|theory|definition|explanation)\b',
-        r'\b(tutorial|guide|introduction|basics|fundamentals)\b',
-        r'\b(example|application|implementation|practice)\b',
-        r'\b(analysis|design|development|structure)\b'
-    ]
-    
-    educational_keywords = []
-    text_lower = text.lower()
-    
-    for pattern in educational_patterns:
-        matches = re.findall(pattern, text_lower)
-        educational_keywords.extend(matches)
-    
-    # Remove duplicates and return top keywords
-    unique_keywords = list(set(educational_keywords))
+    # Unique educational words found in the text
+    unique_keywords = list(EDUCATIONAL_WORDS.intersection(token_stream(text).parts))
     return unique_keywords[:5]
 
 def generate_comprehensive_search_strategies(keywords, doc_type):